@@ -6,14 +6,11 @@
 # accompanying the software ("License").  This software is distributed "AS IS"
 # as set forth in the License.
 
-import csv
 import sys
-import string
 import optparse
-from collections import defaultdict
 
 from steelscript.netprofiler.core.app import NetProfilerApp
-from steelscript.netprofiler.core.hostgroup import HostGroupType, HostGroup
+from steelscript.netprofiler.core.hostgroup import HostGroupType, read_config
 from steelscript.commands.steel import prompt_yn
 from steelscript.common.exceptions import RvbdException
 
@@ -65,34 +62,19 @@ class HostGroupImport(NetProfilerApp):
             self.parser.error('Hostgroup name is required, specify with '
                               '"--hostgroup"')
 
-    def validate(self, name):
-        valid = set(string.ascii_letters + string.digits + '.-_')
-        return all(c in valid for c in name)
-
     def import_file(self):
-        """Process the input file and load into dict."""
-        groups = defaultdict(list)
-
-        with open(self.options.input_file, 'rt') as f:
-            dialect = csv.Sniffer().sniff(f.read(1024))
-            f.seek(0)
-            reader = csv.reader(f, dialect)
-            header = next(reader)
-            if header != ['subnet', 'SiteName']:
-                print(EXAMPLE_WARN)
-
-            for i, row in enumerate(reader):
-                cidr, group = row
-                if not self.validate(group):
-                    print('Invalid group name on line {0}: {1}'
-                          ''.format(i+2, group))
-                    sys.exit()
-                groups[group].append(cidr)
-
-        return groups
-
-    def update_hostgroups(self, groups):
-        """Replace existing HostGroupType with contents of groups dict."""
+        """Read and validate the input file."""
+        result = read_config(self.options.input_file, format='csv')
+        if result.errors:
+            for line, message in result.errors:
+                print('Invalid entry on line {0}: {1}'.format(line, message))
+            print(EXAMPLE_WARN)
+            sys.exit()
+
+        return result.config
+
+    def update_hostgroups(self, config):
+        """Replace existing HostGroupType with contents of config."""
         # First find any existing HostGroupType
         try:
             hgtype = HostGroupType.find_by_name(self.netprofiler,
@@ -108,9 +90,7 @@ class HostGroupImport(NetProfilerApp):
                                           self.options.hostgroup)
 
         # Add new values
-        for group, cidrs in groups.items():
-            hg = HostGroup(hgtype, group)
-            hg.add(cidrs)
+        hgtype.add_many(config)
 
         # Save to NetProfiler
         hgtype.save()
@@ -127,8 +107,8 @@ class HostGroupImport(NetProfilerApp):
             print('Okay, aborting.')
             sys.exit()
 
-        groups = self.import_file()
-        self.update_hostgroups(groups)
+        config = self.import_file()
+        self.update_hostgroups(config)
         print('Successfully updated {0} on {1}'.format(self.options.hostgroup,
                                                        self.netprofiler.host))
 
@@ -11,6 +11,7 @@ import json
 import types
 import logging
 import datetime
+import weakref
 import threading
 from collections import namedtuple
 
@@ -37,7 +38,34 @@ from steelscript.netprofiler.core.hostgroup import HostGroupType
 from steelscript.appfwk.apps.jobs import QueryComplete, QueryError
 
 logger = logging.getLogger(__name__)
-lock = threading.Lock()
+
+# Connections kept open to each NetProfiler device, override with
+# NETPROFILER_CONNECTION_POOL_SIZE to match the number of job threads
+DEFAULT_CONNECTION_POOL_SIZE = 32
+
+_pooled_devices = weakref.WeakSet()
+_pooled_lock = threading.Lock()
+
+
+def get_netprofiler_device(device_id):
+    """Return the NetProfiler for `device_id`, ready for concurrent jobs.
+
+    DeviceManager hands out one NetProfiler instance per device, shared
+    by every job running against it.  Report objects are per job and
+    the column catalog has its own lock, so the only shared state is the
+    HTTP session.  Its connection pool is sized here once per instance,
+    and logging in again when the session expires is serialized by the
+    NetProfiler itself.
+    """
+    profiler = DeviceManager.get_device(device_id)
+    if profiler not in _pooled_devices:
+        with _pooled_lock:
+            if profiler not in _pooled_devices:
+                size = getattr(settings, 'NETPROFILER_CONNECTION_POOL_SIZE',
+                               DEFAULT_CONNECTION_POOL_SIZE)
+                profiler.set_connection_pool_size(size)
+                _pooled_devices.add(profiler)
+    return profiler
 
 
 def _post_process_combine_filterexprs(form, id, criteria, params):
@@ -411,7 +439,7 @@ class NetProfilerQuery(TableQueryBase):
             self.job.mark_error("No NetProfiler Device Selected")
             return False
 
-        args.profiler = DeviceManager.get_device(criteria.netprofiler_device)
+        args.profiler = get_netprofiler_device(criteria.netprofiler_device)
 
         args.columns = [col.name for col
                         in self.table.get_columns(synthetic=False)]
@@ -463,8 +491,7 @@ class NetProfilerQuery(TableQueryBase):
         logger.info("Waiting for report to complete")
         while not done:
             time.sleep(0.5)
-            with lock:
-                s = report.status()
+            s = report.status()
 
             logger.debug('Status: XXX %s' % str(s))
             pct = int(float(s['percent']) * ((maxpct - minpct)/100.0) + minpct)
@@ -472,18 +499,17 @@ class NetProfilerQuery(TableQueryBase):
             done = (s['status'] == 'completed')
 
         # Retrieve the data
-        with lock:
-            data = report.get_data()
-
-            tz = criteria.starttime.tzinfo
-            # Update criteria
-            query = report.get_query_by_index(0)
-            criteria.starttime = (datetime.datetime
-                                  .utcfromtimestamp(query.actual_t0)
-                                  .replace(tzinfo=tz))
-            criteria.endtime = (datetime.datetime
-                                .utcfromtimestamp(query.actual_t1)
-                                .replace(tzinfo=tz))
+        data = report.get_data()
+
+        tz = criteria.starttime.tzinfo
+        # Update criteria
+        query = report.get_query_by_index(0)
+        criteria.starttime = (datetime.datetime
+                              .utcfromtimestamp(query.actual_t0)
+                              .replace(tzinfo=tz))
+        criteria.endtime = (datetime.datetime
+                            .utcfromtimestamp(query.actual_t1)
+                            .replace(tzinfo=tz))
 
         self.job.safe_update(actual_criteria=criteria)
         return data
@@ -493,21 +519,20 @@ class NetProfilerQuery(TableQueryBase):
         """
         args = self._prepare_report_args()
 
-        with lock:
-            report = SingleQueryReport(args.profiler)
-            report.run(
-                realm=self.table.options.realm,
-                groupby=args.profiler.groupbys[self.table.options.groupby],
-                centricity=args.centricity,
-                columns=args.columns,
-                timefilter=args.timefilter,
-                trafficexpr=args.trafficexpr,
-                data_filter=args.datafilter,
-                resolution=args.resolution,
-                sort_col=args.sortcol,
-                sync=False,
-                limit=args.limit
-            )
+        report = SingleQueryReport(args.profiler)
+        report.run(
+            realm=self.table.options.realm,
+            groupby=args.profiler.groupbys[self.table.options.groupby],
+            centricity=args.centricity,
+            columns=args.columns,
+            timefilter=args.timefilter,
+            trafficexpr=args.trafficexpr,
+            data_filter=args.datafilter,
+            resolution=args.resolution,
+            sort_col=args.sortcol,
+            sync=False,
+            limit=args.limit
+        )
 
         data = self._wait_for_data(report)
 
@@ -538,12 +563,11 @@ class NetProfilerTemplateQuery(NetProfilerQuery):
         """ Main execution method. """
         args = self._prepare_report_args()
 
-        with lock:
-            report = MultiQueryReport(args.profiler)
-            report.run(template_id=self.table.options.template_id,
-                       timefilter=args.timefilter,
-                       trafficexpr=args.trafficexpr,
-                       resolution=args.resolution)
+        report = MultiQueryReport(args.profiler)
+        report.run(template_id=self.table.options.template_id,
+                   timefilter=args.timefilter,
+                   trafficexpr=args.trafficexpr,
+                   resolution=args.resolution)
 
         data = self._wait_for_data(report)
         headers = report.get_legend()
@@ -687,19 +711,18 @@ class NetProfilerTrafficTimeSeriesQuery(NetProfilerQuery):
     # on to the TrafficTimeSeriesReport query_columns argument
     def run_top_n(self, config, args, base_col, minpct, maxpct):
         columns = config.columns + [base_col.name]
-        with lock:
-            report = SingleQueryReport(args.profiler)
-            report.run(
-                realm='traffic_summary',
-                centricity=args.centricity,
-                groupby=args.profiler.groupbys[self.table.options.groupby],
-                columns=columns,
-                timefilter=args.timefilter,
-                trafficexpr=args.trafficexpr,
-                resolution=args.resolution,
-                sort_col=base_col.name,
-                sync=False
-                )
+        report = SingleQueryReport(args.profiler)
+        report.run(
+            realm='traffic_summary',
+            centricity=args.centricity,
+            groupby=args.profiler.groupbys[self.table.options.groupby],
+            columns=columns,
+            timefilter=args.timefilter,
+            trafficexpr=args.trafficexpr,
+            resolution=args.resolution,
+            sort_col=base_col.name,
+            sync=False
+            )
 
         rows = self._wait_for_data(report, minpct=minpct, maxpct=maxpct)
 
@@ -768,27 +791,26 @@ class NetProfilerTrafficTimeSeriesQuery(NetProfilerQuery):
             logger.error(msg)
             return QueryError(msg)
 
-        with lock:
-            report = TrafficTimeSeriesReport(args.profiler)
-            columns = [args.columns[0], base_col.name]
-            logger.info("Query Columns: %s" % str(query_columns))
+        report = TrafficTimeSeriesReport(args.profiler)
+        columns = [args.columns[0], base_col.name]
+        logger.info("Query Columns: %s" % str(query_columns))
 
-            if self.table.options.groupby == 'host_group':
-                host_group_type = 'ByLocation'
-            else:
-                host_group_type = None
-
-            report.run(
-                centricity=args.centricity,
-                columns=columns,
-                timefilter=args.timefilter,
-                trafficexpr=args.trafficexpr,
-                resolution=args.resolution,
-                sync=False,
-                host_group_type=host_group_type,
-                query_columns_groupby=config.groupby,
-                query_columns=query_columns
-            )
+        if self.table.options.groupby == 'host_group':
+            host_group_type = 'ByLocation'
+        else:
+            host_group_type = None
+
+        report.run(
+            centricity=args.centricity,
+            columns=columns,
+            timefilter=args.timefilter,
+            trafficexpr=args.trafficexpr,
+            resolution=args.resolution,
+            sync=False,
+            host_group_type=host_group_type,
+            query_columns_groupby=config.groupby,
+            query_columns=query_columns
+        )
 
         data = self._wait_for_data(report,
                                    minpct=cur_report * (100/num_reports),
@@ -810,18 +832,17 @@ class NetProfilerTrafficTimeSeriesQuery(NetProfilerQuery):
             # Run a separate timeseries query with no column filters
             # to get "totals" then use that to compute an "other" column
 
-            with lock:
-                report = SingleQueryReport(args.profiler)
-                report.run(
-                    realm='traffic_overall_time_series',
-                    centricity=args.centricity,
-                    groupby=args.profiler.groupbys['time'],
-                    columns=columns,
-                    timefilter=args.timefilter,
-                    trafficexpr=args.trafficexpr,
-                    resolution=args.resolution,
-                    sync=False
-                )
+            report = SingleQueryReport(args.profiler)
+            report.run(
+                realm='traffic_overall_time_series',
+                centricity=args.centricity,
+                groupby=args.profiler.groupbys['time'],
+                columns=columns,
+                timefilter=args.timefilter,
+                trafficexpr=args.trafficexpr,
+                resolution=args.resolution,
+                sync=False
+            )
 
             totals = self._wait_for_data(report,
                                          minpct=cur_report * (100/num_reports),
@@ -893,7 +914,7 @@ class NetProfilerServiceByLocQuery(TableQueryBase):
             self.job.mark_error("No NetProfiler Device Selected")
             return False
 
-        profiler = DeviceManager.get_device(criteria.netprofiler_device)
+        profiler = get_netprofiler_device(criteria.netprofiler_device)
         report = ServiceLocationReport(profiler)
 
         tf = TimeFilter(start=criteria.starttime,
@@ -903,32 +924,29 @@ class NetProfilerServiceByLocQuery(TableQueryBase):
             'Running NetProfilerServiceByLocTable %d report for timeframe %s' %
             (self.table.id, str(tf)))
 
-        with lock:
-            report.run(timefilter=tf, sync=False)
+        report.run(timefilter=tf, sync=False)
 
         done = False
         logger.info("Waiting for report to complete")
         while not done:
             time.sleep(0.5)
-            with lock:
-                s = report.status()
+            s = report.status()
 
             self.job.mark_progress(progress=int(s['percent']))
             done = (s['status'] == 'completed')
 
         # Retrieve the data
-        with lock:
-            data = report.get_data()
-            query = report.get_query_by_index(0)
-
-            tz = criteria.starttime.tzinfo
-            # Update criteria
-            criteria.starttime = (datetime.datetime
-                                  .utcfromtimestamp(query.actual_t0)
-                                  .replace(tzinfo=tz))
-            criteria.endtime = (datetime.datetime
-                                .utcfromtimestamp(query.actual_t1)
-                                .replace(tzinfo=tz))
+        data = report.get_data()
+        query = report.get_query_by_index(0)
+
+        tz = criteria.starttime.tzinfo
+        # Update criteria
+        criteria.starttime = (datetime.datetime
+                              .utcfromtimestamp(query.actual_t0)
+                              .replace(tzinfo=tz))
+        criteria.endtime = (datetime.datetime
+                            .utcfromtimestamp(query.actual_t1)
+                            .replace(tzinfo=tz))
 
         self.job.safe_update(actual_criteria=criteria)
 
@@ -985,21 +1003,20 @@ class NetProfilerHostPairPortQuery(NetProfilerQuery):
         """
         args = self._prepare_report_args()
 
-        with lock:
-            report = SingleQueryReport(args.profiler)
-            report.run(
-                realm=self.table.options.realm,
-                groupby=args.profiler.groupbys[self.table.options.groupby],
-                centricity=args.centricity,
-                columns=args.columns,
-                timefilter=args.timefilter,
-                trafficexpr=args.trafficexpr,
-                data_filter=args.datafilter,
-                resolution=args.resolution,
-                sort_col=self.table.options.sort_col,
-                sync=False,
-                limit=args.limit
-            )
+        report = SingleQueryReport(args.profiler)
+        report.run(
+            realm=self.table.options.realm,
+            groupby=args.profiler.groupbys[self.table.options.groupby],
+            centricity=args.centricity,
+            columns=args.columns,
+            timefilter=args.timefilter,
+            trafficexpr=args.trafficexpr,
+            data_filter=args.datafilter,
+            resolution=args.resolution,
+            sort_col=self.table.options.sort_col,
+            sync=False,
+            limit=args.limit
+        )
 
         data = self._wait_for_data(report)
 
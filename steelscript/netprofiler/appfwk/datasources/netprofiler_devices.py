@@ -12,10 +12,10 @@ import pandas
 
 from steelscript.appfwk.apps.datasource.models import \
     DatasourceTable, TableQueryBase
-from steelscript.appfwk.apps.devices.devicemanager import DeviceManager
 from steelscript.appfwk.apps.devices.forms import fields_add_device_selection
 from steelscript.appfwk.libs.fields import Function
-from steelscript.netprofiler.appfwk.datasources.netprofiler import lock
+from steelscript.netprofiler.appfwk.datasources.netprofiler import \
+    get_netprofiler_device
 
 
 logger = logging.getLogger(__name__)
@@ -58,15 +58,14 @@ class NetProfilerDeviceQuery(TableQueryBase):
             self.job.mark_error("No NetProfiler Device Selected")
             return False
 
-        profiler = DeviceManager.get_device(criteria.netprofiler_device)
+        profiler = get_netprofiler_device(criteria.netprofiler_device)
 
         columns = [col.name for col in self.table.get_columns(synthetic=False)]
 
         # This returns an array of rows, one row per device
         # Each row is a dict containing elements such as:
         #      id, ipaddr, name, type, type_id, and version
-        with lock:
-            devicedata = profiler.api.devices.get_all()
+        devicedata = profiler.api.devices.get_all()
 
         # Convert to a DataFrame to make it easier to work with
         df = pandas.DataFrame(devicedata)
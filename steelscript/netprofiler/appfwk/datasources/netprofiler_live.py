@@ -148,16 +148,16 @@ class NetProfilerLiveQuery(TableQueryBase):
             cols = [profiler.columns[98]] + cols
 
         for col in cols:
-            if (col.json['type'] == 'float' or
-                    col.json['type'] == 'reltime' or
-                    col.json['rate'] == 'opt'):
+            if (col.type == 'float' or
+                    col.type == 'reltime' or
+                    col.rate == 'opt'):
 
                 data_type = 'float'
 
-            elif col.json['type'] == 'time':
+            elif col.type == 'time':
                 data_type = 'time'
 
-            elif col.json['type'] == 'int':
+            elif col.type == 'int':
                 data_type = 'integer'
 
             else:
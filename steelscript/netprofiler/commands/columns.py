@@ -84,7 +84,7 @@ class Command(NetProfilerApp):
                     self.options.filter.lower() not in c.label.lower()):
                 continue
 
-            item = (c.key, c.label, c.id, c.json['type'])
+            item = (c.key, c.label, c.id, c.type)
 
             if c.iskey:
                 keys.append(item)
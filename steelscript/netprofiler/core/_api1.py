@@ -5,7 +5,24 @@
 # as set forth in the License.
 
 
+import re
+import time
+
 from steelscript.common.api_helpers import APIVersion
+from steelscript.common.exceptions import RvbdHTTPException
+from steelscript.netprofiler.core.instrumentation import PhaseEvent
+
+# error ids of requests that need to log in again
+_AUTH_ERRORS = ('AUTH_REQUIRED', 'AUTH_INVALID_SESSION', 'AUTH_EXPIRED_TOKEN',
+                'AUTH_INVALID_CREDENTIALS')
+
+# path segments holding ids, such as report, query or host group ids
+_ID_SEGMENT_RE = re.compile(r'/\d[^/]*?(?=\.json$|/|$)')
+
+
+def _endpoint(uri_prefix, urlpath):
+    """Return the path of a request with ids replaced by placeholders."""
+    return uri_prefix + _ID_SEGMENT_RE.sub('/{id}', urlpath)
 
 
 class APIGroup(object):
@@ -17,13 +34,74 @@ class APIGroup(object):
 
 
 class API1Group(APIGroup):
+    def _conn_json_request(self, method, path, body, params, raw_response):
+        service = self.service
+        generation = getattr(service, '_auth_generation', None)
+        try:
+            return service.conn.json_request(method, path, body=body,
+                                             params=params,
+                                             raw_response=raw_response)
+        except RvbdHTTPException as e:
+            if generation is None or e.error_id not in _AUTH_ERRORS:
+                raise
+            # The connection only lets one thread at a time log in
+            # again, others fail while it does.  Wait for that login
+            # and retry if one completed since this request was made.
+            with service._auth_lock:
+                if service._auth_generation == generation:
+                    raise
+            return service.conn.json_request(method, path, body=body,
+                                             params=params,
+                                             raw_response=raw_response)
+
     def _json_request(self, urlpath, method='GET', data=None, params=None,
                       raw_response=False):
         """Issue the given API request via JSON
         """
-        return self.service.conn.json_request(method, self.uri_prefix + urlpath,
-                                              body=data, params=params,
-                                              raw_response=raw_response)
+        instrumentation = getattr(self.service, 'instrumentation', None)
+        if instrumentation is None:
+            return self._conn_json_request(method, self.uri_prefix + urlpath,
+                                           data, params, raw_response)
+
+        with instrumentation.phase('request', method=method,
+                                   endpoint=_endpoint(self.uri_prefix,
+                                                      urlpath)) as event:
+            res, r = self._conn_json_request(method,
+                                             self.uri_prefix + urlpath,
+                                             data, params, True)
+            event.bytes = len(r.content)
+        if raw_response:
+            return res, r
+        return res
+
+    def _stream_request(self, urlpath, method='GET', params=None,
+                        chunk_size=65536):
+        """Issue the given API request and iterate over the raw response body
+        """
+        instrumentation = getattr(self.service, 'instrumentation', None)
+        if instrumentation is not None:
+            # the request lasts until the body is read, which is driven
+            # by the caller, so the event is not nested in other phases
+            event = PhaseEvent('request', method=method, bytes=0,
+                               endpoint=_endpoint(self.uri_prefix, urlpath))
+            event.start = time.time()
+            start = time.perf_counter()
+
+        r = self.service.conn._request(method, self.uri_prefix + urlpath,
+                                       params=params,
+                                       extra_headers={'Accept':
+                                                      'application/json'},
+                                       stream=True)
+        try:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                if instrumentation is not None:
+                    event.bytes += len(chunk)
+                yield chunk
+        finally:
+            r.close()
+            if instrumentation is not None:
+                event.duration = time.perf_counter() - start
+                instrumentation.emit(event)
 
 
 class Common(API1Group):
@@ -91,6 +169,11 @@ class Report(API1Group):
         uri += '.json'
         return self._json_request(uri, params=params)
 
+    def queries_stream(self, rid, qid, params=None):
+        """Iterate over the raw JSON body of the data for one query."""
+        uri = '/reports/{0}/queries/{1}.json'.format(rid, qid)
+        return self._stream_request(uri, params=params)
+
     def delete(self, rid):
         return self._json_request('/reports/{0}.json'.format(rid),
                                   method='DELETE')
@@ -0,0 +1,218 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+This module implements the on-disk column catalog used to cache the
+column definitions of a NetProfiler across processes.
+
+The file is laid out so it can be memory-mapped and shared by many
+processes without unpickling the whole catalog in each of them:
+
+    magic | header length | header (json) | column records (json)
+
+The header holds the cache version, the index of triplet hash to
+column ordinals and the byte offset of each column record.  A column
+record is only decoded the first time a triplet referencing it is read.
+"""
+
+import os
+import json
+import mmap
+import struct
+import logging
+import tempfile
+from collections.abc import MutableMapping
+
+from steelscript.netprofiler.core._types import Column
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NPCOLCAT'
+FORMAT = 1
+
+# magic followed by the length of the json header
+_PREAMBLE = struct.Struct('<8sQ')
+
+
+class CatalogData(MutableMapping):
+    """Mapping of triplet hash to list of Column objects.
+
+    Entries read from a catalog file are held as tuples of column
+    ordinals and only turned into Column objects on first access.
+    Each ordinal is decoded once, so columns shared between triplets
+    remain shared objects.
+    """
+    def __init__(self, entries=None, reader=None):
+        self._entries = dict(entries or {})
+        self._reader = reader
+        self._decoded = dict()
+
+    def _column(self, ordinal):
+        try:
+            return self._decoded[ordinal]
+        except KeyError:
+            col = self._reader.column(ordinal)
+            self._decoded[ordinal] = col
+            return col
+
+    def __getitem__(self, key):
+        value = self._entries[key]
+        if isinstance(value, tuple):
+            value = [self._column(i) for i in value]
+            self._entries[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._entries[key] = list(value)
+
+    def __delitem__(self, key):
+        del self._entries[key]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _CatalogReader(object):
+    """Read-only, memory-mapped view of a catalog file."""
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            self._file.close()
+            raise
+
+        try:
+            magic, length = _PREAMBLE.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError('not a column catalog file')
+            start = _PREAMBLE.size
+            self.header = json.loads(self._mmap[start:start + length])
+            if self.header['format'] != FORMAT:
+                raise ValueError('unsupported catalog format %s'
+                                 % self.header['format'])
+        except Exception:
+            self.close()
+            raise
+
+        self._base = start + length
+        self._offsets = self.header['offsets']
+
+    def column(self, ordinal):
+        start = self._base + self._offsets[ordinal]
+        end = self._base + self._offsets[ordinal + 1]
+        record = json.loads(self._mmap[start:end])
+        col = Column.from_json(record['json'])
+        if 'baseid' in record:
+            col.baseid = record['baseid']
+        return col
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+class ColumnCatalogFile(object):
+    """Column catalog stored in `filename`.
+
+    Exposes the same ``data``, ``version`` and ``write()`` interface as
+    the SteelScriptDir data files.  ``data`` is None if the file does
+    not exist or could not be read.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.data = None
+        self.version = None
+        self._reader = None
+        self.read()
+
+    def read(self):
+        """(Re)load the catalog index from disk."""
+        self.close()
+        self.data = None
+        self.version = None
+        if not os.path.exists(self.filename):
+            return
+
+        try:
+            reader = _CatalogReader(self.filename)
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.warning('Ignoring unreadable column catalog %s: %s'
+                           % (self.filename, e))
+            return
+
+        self._reader = reader
+        self.version = reader.header['cache_version']
+        self.data = CatalogData(
+            ((k, tuple(v)) for k, v in reader.header['index'].items()),
+            reader)
+
+    def write(self):
+        """Atomically replace the catalog file with the current data."""
+        ordinals = dict()
+        records = []
+        index = dict()
+        for key in self.data:
+            ids = []
+            for col in self.data[key]:
+                # columns are de-duplicated by identity, mirroring how
+                # shared objects were stored by pickle
+                ordinal = ordinals.get(id(col))
+                if ordinal is None:
+                    ordinal = len(records)
+                    ordinals[id(col)] = ordinal
+                    record = {'json': col.json}
+                    if col.baseid != col.id:
+                        record['baseid'] = col.baseid
+                    records.append(json.dumps(record).encode('utf8'))
+                ids.append(ordinal)
+            index[key] = ids
+
+        offsets = [0]
+        for record in records:
+            offsets.append(offsets[-1] + len(record))
+
+        header = json.dumps({'format': FORMAT,
+                             'cache_version': self.version,
+                             'index': index,
+                             'offsets': offsets}).encode('utf8')
+
+        dirname, basename = os.path.split(self.filename)
+        fd, tmpname = tempfile.mkstemp(prefix='.' + basename, dir=dirname)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_PREAMBLE.pack(MAGIC, len(header)))
+                f.write(header)
+                for record in records:
+                    f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # every entry has been decoded above, the old mapping can
+            # be released before the file is replaced
+            self.close()
+            os.replace(tmpname, self.filename)
+        except Exception:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+
+    def close(self):
+        if self._reader is not None:
+            if isinstance(self.data, CatalogData):
+                self.data._reader = None
+            self._reader.close()
+            self._reader = None
@@ -12,6 +12,10 @@ CACHE_VERSION = 1.1
 # columns, they are given an id greater than or equal to 200000
 EPHEMERAL_COLID = 200000
 
+# Default number of concurrent requests used when discovering column
+# definitions for missing realm/centricity/groupby triplets
+COLUMN_FETCH_WORKERS = 8
+
 realms = ['traffic_summary',
           'traffic_overall_time_series',
           'hosts_time_series',
@@ -0,0 +1,147 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+Incremental decoding of large JSON objects.
+
+Report query results are a single JSON object whose ``data`` member
+can hold up to a million rows.  :func:`iter_array_member` walks the
+top level of such an object as chunks arrive, yielding the elements of
+one array member one by one while the remaining (small) members are
+collected into a dict.  :func:`iter_array` does the same for a
+top-level array.  Only the current chunk and the row being decoded
+are held in memory.
+"""
+
+import json
+import codecs
+
+_decoder = json.JSONDecoder()
+_WS = ' \t\n\r'
+
+
+class _Buffer(object):
+    """Text buffer filled on demand from an iterator of byte chunks."""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk, return False once the input is exhausted."""
+        if self.eof:
+            return False
+        # drop what has already been consumed
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.text += self._utf8.decode(chunk)
+                return True
+        self.text += self._utf8.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def skip(self, chars=_WS):
+        """Skip `chars` and return the next character, '' at the end."""
+        while True:
+            text = self.text
+            pos = self.pos
+            while pos < len(text) and text[pos] in chars:
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.skip() != char:
+            raise ValueError('Invalid JSON, expected %r at offset %d'
+                             % (char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        """Decode and return the next complete JSON value."""
+        self.skip()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # a number at the end of the buffer may still be incomplete
+            if end == len(self.text) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_elements(buf):
+    # yield the elements of the array starting at the current position
+    buf.expect('[')
+    if buf.skip() == ']':
+        buf.pos += 1
+        return
+    while True:
+        yield buf.value()
+        c = buf.skip()
+        buf.pos += 1
+        if c == ']':
+            return
+        if c != ',':
+            raise ValueError('Invalid JSON, expected "," or "]" '
+                             'at offset %d' % (buf.pos - 1))
+
+
+def iter_array(chunks):
+    """Yield the elements of a JSON array.
+
+    :param chunks: iterable of bytes making up one JSON array
+    """
+    buf = _Buffer(chunks)
+    for value in _iter_elements(buf):
+        yield value
+    if buf.skip() != '':
+        raise ValueError('Invalid JSON, extra data at offset %d' % buf.pos)
+
+
+def iter_array_member(chunks, name, members=None):
+    """Yield the elements of array member `name` of a JSON object.
+
+    :param chunks: iterable of bytes making up one JSON object
+    :param str name: name of the top-level array member to stream
+    :param dict members: if given, updated with all other top-level
+        members of the object as they are decoded
+    """
+    buf = _Buffer(chunks)
+    buf.expect('{')
+    if buf.skip() == '}':
+        return
+
+    while True:
+        key = buf.value()
+        buf.expect(':')
+        if key == name and buf.skip() == '[':
+            for value in _iter_elements(buf):
+                yield value
+        else:
+            value = buf.value()
+            if members is not None:
+                members[key] = value
+
+        c = buf.skip()
+        buf.pos += 1
+        if c == '}':
+            return
+        if c != ',':
+            raise ValueError('Invalid JSON, expected "," or "}" '
+                             'at offset %d' % (buf.pos - 1))
@@ -5,6 +5,8 @@
 # as set forth in the License.
 
 
+import json as _json
+
 from steelscript.netprofiler.core import _constants
 
 
@@ -20,6 +22,14 @@ class Container(object):
 
 class Column(object):
     """A column object represents a single data column in Profiler terms"""
+
+    # Thousands of columns are held per appliance, so keep instances
+    # compact: the fields used when decoding data are stored as
+    # attributes, and the raw definition is kept as a compact string
+    # that is only decoded when `json` is read.
+    __slots__ = ('id', 'key', 'label', 'baseid', 'ephemeral', 'iskey',
+                 'type', 'rate', 'category', '_json', '_hash')
+
     def __init__(self, cid, key, label, json, baseid=None, ephemeral=False):
         # Numeric column id.  This may be ephemeral -- meaning
         # its a really big number like 100000+.  For a given report
@@ -38,9 +48,22 @@ class Column(object):
         self.key = key
         self.label = label
         self.json = json
-        self.iskey = json['category'] != 'data'
         self.baseid = (baseid or cid)
         self.ephemeral = ephemeral
+        self._hash = hash((cid, key))
+
+    @property
+    def json(self):
+        """The column definition as returned by NetProfiler."""
+        return _json.loads(self._json)
+
+    @json.setter
+    def json(self, value):
+        self.category = value['category']
+        self.type = value.get('type')
+        self.rate = value.get('rate')
+        self.iskey = self.category != 'data'
+        self._json = _json.dumps(value, separators=(',', ':'))
 
     @classmethod
     def from_json(cls, json):
@@ -80,7 +103,7 @@ class Column(object):
         return self.key >= self._get_cmp_val(other)
 
     def __hash__(self):
-        return hash(tuple(self.json.values()))
+        return self._hash
 
     def __repr__(self):
         if self.baseid and self.baseid != self.id:
@@ -0,0 +1,441 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+This module provides asyncio counterparts of the NetProfiler reporting
+interfaces, so many reports across many appliances can run on a single
+event loop without a thread per report.
+
+Connecting, authentication and the column catalog are handled by a
+regular :class:`NetProfiler <steelscript.netprofiler.core.NetProfiler>`,
+which is wrapped by :class:`AsyncNetProfiler`.  All report traffic then
+goes through an `aiohttp <https://docs.aiohttp.org>`_ session, which must
+be installed separately.  Example::
+
+    >>> p = await AsyncNetProfiler.create(host, auth=auth)
+    >>> report = AsyncTrafficSummaryReport(p)
+    >>> await report.run(groupby='hos', columns=['host_ip', 'avg_bytes'])
+    >>> async for row in (await report.get_query_by_index()).aiter_data():
+    ...     print(row)
+    >>> await report.delete()
+    >>> await p.close()
+
+"""
+
+import json
+import time
+import asyncio
+import logging
+
+from steelscript.netprofiler.core.netprofiler import NetProfiler
+from steelscript.netprofiler.core.report import (Query, PollBackoff,
+                                                 TrafficSummaryReport,
+                                                 TrafficOverallTimeSeriesReport,
+                                                 TrafficTimeSeriesReport,
+                                                 TrafficFlowListReport,
+                                                 HostTimeSeriesReport,
+                                                 IdentityReport)
+from steelscript.netprofiler.core._exceptions import ProfilerHTTPException
+
+__all__ = ['AsyncNetProfiler',
+           'AsyncTrafficSummaryReport',
+           'AsyncTrafficOverallTimeSeriesReport',
+           'AsyncTrafficTimeSeriesReport',
+           'AsyncTrafficFlowListReport',
+           'AsyncHostTimeSeriesReport',
+           'AsyncIdentityReport']
+
+logger = logging.getLogger(__name__)
+
+
+# error ids of requests that need to log in again
+_AUTH_ERRORS = ('AUTH_REQUIRED', 'AUTH_INVALID_SESSION', 'AUTH_EXPIRED_TOKEN',
+                'AUTH_INVALID_CREDENTIALS')
+
+
+class AsyncConnection(object):
+    """aiohttp based connection reusing the credentials of a NetProfiler.
+
+    When the session expires, the wrapped NetProfiler logs in again and
+    the failed request is retried with the new credentials.
+    """
+
+    def __init__(self, profiler, max_connections=100):
+        import aiohttp  # noqa: F401, fail early if missing
+
+        self.profiler = profiler
+        self._verify = profiler.conn.conn.verify
+        self._max_connections = max_connections
+        self._session = None
+        # serializes logins, created in the running loop
+        self._login_lock = None
+        # incremented each time the credentials are reloaded
+        self._generation = 0
+        self._load_credentials()
+
+    def _load_credentials(self):
+        # the requests session of the blocking connection holds
+        # whatever basic or OAuth credentials and session cookies were
+        # set up when the NetProfiler last authenticated
+        import aiohttp
+
+        session = self.profiler.conn.conn
+        self._headers = dict(session.headers)
+        self._headers['Accept'] = 'application/json'
+        if isinstance(session.auth, tuple):
+            self._auth = aiohttp.BasicAuth(*session.auth)
+        else:
+            self._auth = None
+        cookies = dict(session.cookies.items())
+        if getattr(self.profiler.conn, 'cookies', None):
+            cookies.update(self.profiler.conn.cookies.items())
+        self._cookies = cookies
+        self._generation += 1
+
+    def _get_session(self):
+        if self._session is None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self._max_connections,
+                                             ssl=None if self._verify else
+                                             False)
+            # credentials are passed with each request, so that requests
+            # made after logging in again use the new ones
+            self._session = aiohttp.ClientSession(
+                connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+        return self._session
+
+    async def _request(self, method, path, body, params):
+        session = self._get_session()
+        # urls are built like those of the blocking connection
+        url = self.profiler.conn.get_url(path)
+        async with session.request(method, url,
+                                   json=body, params=params,
+                                   headers=self._headers, auth=self._auth,
+                                   cookies=self._cookies) as r:
+            return r.status, await r.text()
+
+    @staticmethod
+    def _auth_failed(status, text):
+        if status == 401:
+            return True
+        if status < 400:
+            return False
+        try:
+            return json.loads(text).get('error_id') in _AUTH_ERRORS
+        except (ValueError, AttributeError):
+            return False
+
+    async def _reauthenticate(self, generation):
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+        async with self._login_lock:
+            if generation != self._generation:
+                # another request already logged in again
+                return
+            logger.debug('session timed out -- reauthenticating')
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.profiler.reauthenticate)
+            self._load_credentials()
+
+    async def json_request(self, method, path, body=None, params=None):
+        """Issue the given API request and return the decoded JSON."""
+        generation = self._generation
+        status, text = await self._request(method, path, body, params)
+        if self._auth_failed(status, text):
+            await self._reauthenticate(generation)
+            logger.debug('session reauthentication succeeded -- retrying')
+            status, text = await self._request(method, path, body, params)
+
+        if status >= 400:
+            raise ProfilerHTTPException(
+                '%s %s returned status %d: %s'
+                % (method, path, status, text))
+        if not text:
+            return None
+        return json.loads(text)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncAPIGroup(object):
+    """Async wrapper for API functions"""
+    def __init__(self, uri_prefix, conn):
+        self.uri_prefix = uri_prefix
+        self.conn = conn
+
+    def _json_request(self, urlpath, method='GET', data=None, params=None):
+        return self.conn.json_request(method, self.uri_prefix + urlpath,
+                                      body=data, params=params)
+
+
+class AsyncReportAPI(AsyncAPIGroup):
+
+    def reports(self, data, params=None):
+        return self._json_request('/reports', method='POST',
+                                  data=data, params=params)
+
+    def status(self, rid):
+        return self._json_request('/reports/{0}.json'.format(rid))
+
+    def queries(self, rid, qid=None, params=None):
+        uri = '/reports/{0}/queries'.format(rid)
+        if qid is not None:
+            uri += '/' + str(qid)
+        uri += '.json'
+        return self._json_request(uri, params=params)
+
+    def delete(self, rid):
+        return self._json_request('/reports/{0}.json'.format(rid),
+                                  method='DELETE')
+
+
+class AsyncHandler(object):
+    def __init__(self, conn):
+        self.report = AsyncReportAPI('/api/profiler/1.0/reporting', conn)
+
+
+class AsyncNetProfiler(object):
+    """Asyncio interface to a NetProfiler appliance.
+
+    Wraps a connected :class:`NetProfiler` and replaces its ``api``
+    with coroutine based equivalents for reporting.  Everything else,
+    such as columns and get_columns(), is delegated to the wrapped
+    instance.
+    """
+    def __init__(self, profiler, max_connections=100, conn=None):
+        """
+        :param profiler: connected :class:`NetProfiler` instance
+
+        :param int max_connections: maximum number of concurrent
+            connections to the appliance
+
+        :param conn: connection to use instead of a new
+            :class:`AsyncConnection`
+        """
+        self.profiler = profiler
+        self.conn = conn or AsyncConnection(profiler, max_connections)
+        self.api = AsyncHandler(self.conn)
+
+    @classmethod
+    async def create(cls, *args, max_connections=100, **kwargs):
+        """Connect a new :class:`NetProfiler` without blocking the loop.
+
+        Arguments are passed to :class:`NetProfiler`.
+        """
+        loop = asyncio.get_running_loop()
+        profiler = await loop.run_in_executor(
+            None, lambda: NetProfiler(*args, **kwargs))
+        return cls(profiler, max_connections)
+
+    def __getattr__(self, name):
+        return getattr(self.profiler, name)
+
+    async def close(self):
+        await self.conn.close()
+
+
+class AsyncQuery(Query):
+    """Query of an asynchronous report."""
+
+    async def _aget_querydata(self, columns=None, limit=None):
+        columns = self.get_legend(columns)
+
+        # if we already got this data do not get it again
+        if (self.data_selected_columns == columns and
+                self._column_limit == limit):
+            return
+
+        params = self._query_params(columns, limit)
+        self.querydata = await self.report.profiler.api.report.queries(
+            self.report.id, self.id, params=params)
+        self.data = self.querydata.get('data', [])
+        self.data_selected_columns = columns
+        self._column_limit = limit
+
+    async def aiter_data(self, columns=None, limit=None, page_size=None):
+        """Asynchronously iterate over the query data.
+
+        :param int page_size: if set, retrieve the data in windows of
+            this many rows instead of all at once, rows are then not
+            cached on the query
+        """
+        if page_size is None:
+            await self._aget_querydata(columns, limit)
+            decode = self._row_decoder(self.data_selected_columns)
+            for row in self.data:
+                yield decode(row)
+            return
+
+        columns = self.get_legend(columns)
+        decode = self._row_decoder(columns)
+        offset = 0
+        while limit is None or offset < limit:
+            size = page_size if limit is None else min(page_size,
+                                                       limit - offset)
+            params = self._query_params(columns, size, offset)
+            querydata = await self.report.profiler.api.report.queries(
+                self.report.id, self.id, params=params)
+            data = querydata.get('data', [])
+            for row in data:
+                yield decode(row)
+            if len(data) < size:
+                break
+            offset += size
+
+    async def get_data(self, columns=None, limit=None):
+        return [row async for row in self.aiter_data(columns, limit)]
+
+    async def get_totals(self, columns=None):
+        # totals do not depend on the row limit, reuse what was retrieved
+        await self._aget_querydata(columns, self._column_limit)
+        decode = self._row_decoder(self.data_selected_columns)
+        return decode(self.querydata['totals'])
+
+
+class AsyncReportMixin(object):
+    """Turns a single query report class into its asyncio counterpart.
+
+    ``run`` builds the report criteria exactly like the blocking class
+    and returns a coroutine that posts it and, if `sync`, waits for the
+    report to complete.
+    """
+
+    def _run_chunked(self, *args, **kwargs):
+        # sub-reports would be blocking reports on the async profiler
+        raise ValueError("Chunked reports are not supported by asyncio "
+                         "reports, run the sub-ranges as separate reports")
+
+    async def _post(self, to_post, sync):
+        response = await self.profiler.api.report.reports(data=to_post)
+        self._set_id(response)
+
+        if sync:
+            await self.wait_for_complete()
+
+    async def status(self):
+        """Query for the status of report, see :meth:`Report.status`."""
+        if not self.id:
+            return None
+
+        self.last_status = await self.profiler.api.report.status(self.id)
+        return self.last_status
+
+    async def wait_for_complete(self, interval=None, timeout=600,
+                                callback=None, backoff=None):
+        """Poll report status until complete, see
+        :meth:`Report.wait_for_complete`."""
+        if interval is None and backoff is None:
+            backoff = PollBackoff()
+
+        deadline = time.monotonic() + timeout
+        while True:
+            s = await self.status()
+            if callback is not None:
+                callback(s)
+
+            if s['status'] == 'completed':
+                logger.info("Report %d complete" % self.id)
+                return True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("Timed out waiting for report %d to complete,"
+                               "last %s%% complete" % (self.id, s['percent']))
+                return False
+
+            if interval is not None:
+                delay = interval
+            else:
+                delay = backoff.next_delay(s)
+            await asyncio.sleep(min(delay, remaining))
+
+    async def _load_queries(self, columns=None):
+        if not self.id:
+            raise ValueError("No id set, must run a report"
+                             "or attach to an existing report first")
+
+        data = await self.profiler.api.report.queries(self.id)
+        for query_json in data:
+            self.queries.append(AsyncQuery(self, query_json, columns))
+
+        logger.debug("Report %d: loaded %d queries"
+                     % (self.id, len(data)))
+
+    async def get_query_by_index(self, index=0):
+        """Returns the :class:`AsyncQuery` at `index`, defaults to 0."""
+        if not self.id:
+            raise ValueError("No id set, must run a report"
+                             "or attach to an existing report first")
+
+        if len(self.queries) == 0:
+            await self._load_queries(self.columns)
+
+        return self.queries[index]
+
+    async def get_legend(self, columns=None):
+        query = await self.get_query_by_index()
+        return query.get_legend(columns)
+
+    async def aiter_data(self, columns=None, limit=None, page_size=None):
+        """Asynchronously iterate over the report data, see
+        :meth:`AsyncQuery.aiter_data`."""
+        query = await self.get_query_by_index()
+        async for row in query.aiter_data(columns, limit or self._limit,
+                                          page_size):
+            yield row
+
+    async def get_data(self, columns=None, limit=None):
+        query = await self.get_query_by_index()
+        return await query.get_data(columns, limit or self._limit)
+
+    async def get_totals(self, columns=None):
+        query = await self.get_query_by_index()
+        return await query.get_totals(columns)
+
+    async def delete(self):
+        """Delete this report from NetProfiler."""
+        try:
+            await self.profiler.api.report.delete(self.id)
+        except Exception:
+            pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, instype, value, traceback):
+        await self.delete()
+
+
+class AsyncTrafficSummaryReport(AsyncReportMixin, TrafficSummaryReport):
+    """Asyncio version of :class:`TrafficSummaryReport`."""
+
+
+class AsyncTrafficOverallTimeSeriesReport(AsyncReportMixin,
+                                          TrafficOverallTimeSeriesReport):
+    """Asyncio version of :class:`TrafficOverallTimeSeriesReport`.
+
+    Chunked runs with a `chunk_policy` are not supported.
+    """
+
+
+class AsyncTrafficTimeSeriesReport(AsyncReportMixin, TrafficTimeSeriesReport):
+    """Asyncio version of :class:`TrafficTimeSeriesReport`."""
+
+
+class AsyncTrafficFlowListReport(AsyncReportMixin, TrafficFlowListReport):
+    """Asyncio version of :class:`TrafficFlowListReport`."""
+
+
+class AsyncHostTimeSeriesReport(AsyncReportMixin, HostTimeSeriesReport):
+    """Asyncio version of :class:`HostTimeSeriesReport`."""
+
+
+class AsyncIdentityReport(AsyncReportMixin, IdentityReport):
+    """Asyncio version of :class:`IdentityReport`."""
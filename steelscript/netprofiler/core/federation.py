@@ -0,0 +1,274 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+This module runs the same report on several NetProfiler appliances at
+once and merges their results, for deployments where traffic is split
+between appliances, such as one NetProfiler per region.  Example::
+
+    >>> fed = NetProfilerFederation([p1, p2, p3])
+    >>> result = fed.run(TrafficSummaryReport, groupby='hos',
+    ...                  columns=['host_ip', 'avg_bytes', 'peak_bytes'],
+    ...                  sort_col='avg_bytes', top_n=10)
+    >>> result.data
+    >>> result.failures
+
+Rows are merged on their key columns.  Data columns are combined
+according to their NetProfiler definition, see :func:`merge_function`.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from steelscript.netprofiler.core._exceptions import ProfilerException
+
+__all__ = ['NetProfilerFederation', 'FederationResult', 'ApplianceResult',
+           'merge_function']
+
+logger = logging.getLogger(__name__)
+
+# rates of traffic seen by each appliance, which add up across them
+_ADDITIVE_RATES = ('persec', 'count')
+
+
+def _numbers(values):
+    return [v for v in values
+            if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+
+def _merge_sum(values):
+    numbers = _numbers(values)
+    return sum(numbers) if numbers else values[0]
+
+
+def _merge_avg(values):
+    numbers = _numbers(values)
+    return sum(numbers) / float(len(numbers)) if numbers else values[0]
+
+
+def _merge_max(values):
+    numbers = _numbers(values)
+    return max(numbers) if numbers else values[0]
+
+
+def _merge_min(values):
+    numbers = _numbers(values)
+    return min(numbers) if numbers else values[0]
+
+
+def _merge_first(values):
+    return values[0]
+
+
+def merge_function(column):
+    """Return the function combining the values of `column` across
+    appliances.
+
+    The function is chosen from the ``statistic`` and ``rate`` of the
+    column definition: peaks take the maximum and minimums the minimum.
+    Totals, and averages of per-second rates or counts, describe
+    distinct traffic on each appliance and are summed.  Other averages,
+    such as response times or percentages, are averaged.  Non numeric
+    columns keep the first value.
+    """
+    if column.iskey:
+        return _merge_first
+
+    json = column.json
+    statistic = json.get('statistic')
+    if statistic in ('peak', 'max'):
+        return _merge_max
+    if statistic == 'min':
+        return _merge_min
+    if statistic == 'total':
+        return _merge_sum
+    if statistic == 'avg':
+        if column.rate in _ADDITIVE_RATES:
+            return _merge_sum
+        return _merge_avg
+    if column.type in ('int', 'float'):
+        return _merge_sum
+    return _merge_first
+
+
+class ApplianceResult(object):
+    """Outcome of the report on one appliance."""
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.host = profiler.host
+        #: seconds from posting the report to retrieving its data
+        self.latency = None
+        #: exception raised by this appliance, None on success
+        self.error = None
+        self.legend = None
+        self.data = None
+        self.totals = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            state = '%d rows in %.2fs' % (len(self.data), self.latency)
+        else:
+            state = 'failed: %s' % self.error
+        return '<ApplianceResult %s %s>' % (self.host, state)
+
+
+class FederationResult(object):
+    """Merged results of a report run on several appliances."""
+    def __init__(self, legend, data, totals, appliances, latency):
+        #: list of columns, as returned by the first appliance
+        self.legend = legend
+        #: merged rows, in legend order
+        self.data = data
+        #: merged totals, None if not available from all appliances
+        self.totals = totals
+        #: list of :class:`ApplianceResult`, one per appliance
+        self.appliances = appliances
+        #: wall clock seconds for the whole run
+        self.latency = latency
+
+    @property
+    def failures(self):
+        """The :class:`ApplianceResult` of the appliances that failed."""
+        return [a for a in self.appliances if not a.ok]
+
+
+class NetProfilerFederation(object):
+    """Run reports on several NetProfilers concurrently and merge them."""
+
+    def __init__(self, profilers, max_workers=None):
+        """
+        :param profilers: list of connected
+            :class:`NetProfiler <steelscript.netprofiler.core.NetProfiler>`
+            instances
+
+        :param int max_workers: number of appliances queried at the
+            same time, defaults to all of them
+        """
+        if not profilers:
+            raise ValueError('at least one NetProfiler is required')
+        self.profilers = list(profilers)
+        self.max_workers = max_workers or len(self.profilers)
+
+    def _run_one(self, profiler, report_class, kwargs):
+        result = ApplianceResult(profiler)
+        start = time.monotonic()
+        try:
+            report = report_class(profiler)
+            report.run(**kwargs)
+            try:
+                result.legend = report.get_legend()
+                result.data = report.get_data()
+                try:
+                    result.totals = report.get_totals()
+                except KeyError:
+                    # not every realm returns totals
+                    result.totals = None
+            finally:
+                report.delete()
+        except Exception as e:
+            logger.warning('Report on %s failed: %s' % (profiler.host, e))
+            result.error = e
+        result.latency = time.monotonic() - start
+        return result
+
+    def run(self, report_class, merge=None, top_n=None, **kwargs):
+        """Run a report on every appliance and merge the results.
+
+        :param report_class: single query report class to run, such as
+            :class:`TrafficSummaryReport
+            <steelscript.netprofiler.core.report.TrafficSummaryReport>`
+
+        :param dict merge: functions taking the list of values of one
+            column across appliances, keyed by column key, overriding
+            :func:`merge_function`
+
+        :param int top_n: if set, only keep the first `top_n` merged
+            rows, in descending order of `sort_col`
+
+        Other keyword arguments are passed to ``report_class.run``.
+        Failures on some appliances do not fail the run, they are
+        reported in :attr:`FederationResult.failures`.  A
+        :class:`ProfilerException
+        <steelscript.netprofiler.core._exceptions.ProfilerException>`
+        is raised only if every appliance failed.
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            appliances = list(executor.map(
+                lambda p: self._run_one(p, report_class, kwargs),
+                self.profilers))
+
+        succeeded = [a for a in appliances if a.ok]
+        if not succeeded:
+            raise ProfilerException(
+                'Report failed on all appliances: %s'
+                % ', '.join('%s: %s' % (a.host, a.error) for a in appliances))
+
+        legend = succeeded[0].legend
+        keys = [col.key for col in legend]
+
+        # rows are reordered to the legend of the first appliance, the
+        # ones missing some of its columns are reported as failures
+        positions = dict()
+        for a in succeeded:
+            try:
+                positions[id(a)] = [[c.key for c in a.legend].index(k)
+                                    for k in keys]
+            except ValueError:
+                logger.warning('Report on %s returned different columns: %s'
+                               % (a.host, [c.key for c in a.legend]))
+                a.error = ProfilerException(
+                    'Legend %s does not match %s'
+                    % ([c.key for c in a.legend], keys))
+        succeeded = [a for a in succeeded if a.ok]
+
+        merge = merge or {}
+        functions = [merge.get(col.key) or merge_function(col)
+                     for col in legend]
+        key_index = [i for i, col in enumerate(legend) if col.iskey]
+
+        # group the rows of all appliances on their key columns
+        groups = dict()
+        order = []
+        totals = []
+        for a in succeeded:
+            for row in a.data:
+                row = [row[i] for i in positions[id(a)]]
+                group = tuple(row[i] for i in key_index)
+                if group not in groups:
+                    groups[group] = []
+                    order.append(group)
+                groups[group].append(row)
+            if a.totals is not None:
+                totals.append([a.totals[i] for i in positions[id(a)]])
+
+        data = []
+        for group in order:
+            rows = groups[group]
+            data.append([f([r[i] for r in rows])
+                         for i, f in enumerate(functions)])
+
+        sort_col = kwargs.get('sort_col')
+        if sort_col is not None:
+            index = keys.index(getattr(sort_col, 'key', sort_col))
+            data.sort(key=lambda row: _numbers([row[index]]) or [0],
+                      reverse=True)
+        if top_n is not None:
+            data = data[:top_n]
+
+        merged_totals = None
+        if totals and len(totals) == len(succeeded):
+            merged_totals = [f([t[i] for t in totals])
+                             for i, f in enumerate(functions)]
+
+        return FederationResult(legend, data, merged_totals, appliances,
+                                time.monotonic() - start)
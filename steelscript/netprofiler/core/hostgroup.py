@@ -9,7 +9,17 @@ The Host Group module provides an interface for manipulating host group types
 and their host groups and hosts.
 """
 
+import io
+import os
+import re
+import csv
+import socket
+import difflib
+import ipaddress
+from collections import OrderedDict
+
 from steelscript.common.exceptions import RvbdException, RvbdHTTPException
+from steelscript.netprofiler.core._jsonstream import iter_array
 import logging
 
 # Examples:
@@ -45,6 +55,112 @@ def clean_str_or_bytes(strings_or_bytes):
     return strings_or_bytes
 
 
+def _config_key(entry):
+    # (name, cidr) of a config entry given as a dict or a pair
+    if isinstance(entry, dict):
+        name, cidr = entry['name'], entry['cidr']
+    else:
+        name, cidr = entry
+    if isinstance(name, bytes):
+        name = name.decode('utf8')
+    if isinstance(cidr, bytes):
+        cidr = cidr.decode('utf8')
+    return name, cidr
+
+
+# IP version -> (address family, bits, bytes)
+_FAMILIES = {4: (socket.AF_INET, 32, 4),
+             6: (socket.AF_INET6, 128, 16)}
+
+
+def _parse_cidr(cidr):
+    """Return the IP version, network address as an integer and prefix
+    length of a config cidr.
+
+    Abbreviated IPv4 networks such as ``10.99.1/24`` and addresses
+    without a prefix length are accepted, host bits are cleared.
+    Raises ValueError if `cidr` is not valid.
+    """
+    if isinstance(cidr, bytes):
+        cidr = cidr.decode('utf8')
+    if not isinstance(cidr, str):
+        raise ValueError('Invalid cidr: {0!r}'.format(cidr))
+    address, sep, prefixlen = cidr.strip().partition('/')
+    version = 6 if ':' in address else 4
+    if sep and version == 4:
+        octets = address.split('.')
+        address = '.'.join(octets + ['0'] * (4 - len(octets)))
+    family, bits, _ = _FAMILIES[version]
+    try:
+        value = int.from_bytes(socket.inet_pton(family, address), 'big')
+        prefixlen = int(prefixlen) if sep else bits
+    except (OSError, ValueError):
+        raise ValueError('Invalid cidr: {0!r}'.format(cidr))
+    if not 0 <= prefixlen <= bits:
+        raise ValueError('Invalid cidr: {0!r}'.format(cidr))
+    shift = bits - prefixlen
+    return version, value >> shift << shift, prefixlen
+
+
+def _format_cidr(version, value, prefixlen):
+    # inverse of _parse_cidr, in the canonical text form
+    family, _, size = _FAMILIES[version]
+    return '{0}/{1}'.format(
+        socket.inet_ntop(family, value.to_bytes(size, 'big')), prefixlen)
+
+
+def _address_value(address):
+    # (IP version, integer value) of an address, integers are IPv4
+    if isinstance(address, bytes):
+        address = address.decode('utf8')
+    if isinstance(address, str):
+        try:
+            return 4, int.from_bytes(
+                socket.inet_pton(socket.AF_INET, address), 'big')
+        except OSError:
+            pass
+        try:
+            return 6, int.from_bytes(
+                socket.inet_pton(socket.AF_INET6, address), 'big')
+        except OSError:
+            raise ValueError('Invalid IP address: {0!r}'.format(address))
+    if isinstance(address, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return address.version, int(address)
+    return 4, int(address)
+
+
+class _ConfigIndex(object):
+    """Positions and cidrs of each host group in a config list."""
+
+    def __init__(self, config):
+        # the entries indexed, the config list may be changed in place
+        # by callers holding a reference to it
+        self.entries = list(config)
+        # name -> ascending positions of the entries of the group
+        self.positions = {}
+        # name -> set of cidrs of the group
+        self.cidrs = {}
+        positions = self.positions
+        cidrs = self.cidrs
+        for i, entry in enumerate(config):
+            name = entry['name']
+            if name in positions:
+                positions[name].append(i)
+                cidrs[name].add(entry['cidr'])
+            else:
+                positions[name] = [i]
+                cidrs[name] = {entry['cidr']}
+
+    def matches(self, config):
+        """Return True if `config` holds the entries indexed.
+
+        Entries are compared by identity first, so this is a quick
+        scan unless entries were replaced.  Entries changed in place
+        are not detected.
+        """
+        return self.entries == config
+
+
 class HostGroupType(object):
     """ Convenience class to allow easy access to host group types.
 
@@ -78,6 +194,12 @@ class HostGroupType(object):
         ['10.99.1/24', '10.99.2/24']
         >>> by_region.save()
 
+    Edits made with :class:`HostGroup` methods, :func:`add_many` and
+    :func:`remove_many` are queued and applied together, in one pass
+    over :attr:`config`, the next time the config is read.  Their
+    result, including the order of the entries, is the same as if they
+    had been applied one at a time, so large imports take linear time.
+
     """
 
     def __init__(self, netprofiler, id):
@@ -96,11 +218,40 @@ class HostGroupType(object):
         self.description = ""
 
         # Array of cidr/name config items
-        self.config = []
+        self._config = []
+        # _ConfigIndex of _config, None when it must be rebuilt
+        self._index = None
+
+        # Queued edits, either (name, entries) additions made with the
+        # same (prepend, keep_together) mode, or removals
+        self._pending_adds = []
+        self._pending_mode = None
+        self._pending_removes = set()
+        self._pending_clears = set()
 
         # Dictionary of HostGroup entries by name
         self.groups = {}
 
+        # Settings and (name, cidr) config keys as last loaded or saved,
+        # None if the type is not on the NetProfiler yet
+        self._synced = None
+
+    @property
+    def config(self):
+        """List of cidr/name config items, in order of precedence.
+
+        The list may be modified in place or replaced.
+        """
+        self._flush()
+        return self._config
+
+    @config.setter
+    def config(self, config):
+        # queued edits applied to the replaced config
+        self._discard_pending()
+        self._config = config
+        self._index = None
+
     @classmethod
     def find_by_name(cls, netprofiler, name):
         """Find and load a host group type by name."""
@@ -165,10 +316,20 @@ class HostGroupType(object):
                 # property
                 HostGroup(self, entry['name'])
 
-    def save(self):
+        self._snapshot()
+
+    def save(self, force=False):
         """Save settings and groups.
 
         If this is a new host group type, it will be created.
+
+        Only what changed since the last :func:`load` or :func:`save`
+        is sent: nothing if there are no changes, only the config if
+        the settings are unchanged.
+
+        :param bool force: if True, save settings and config even if
+            they have not changed, for instance to overwrite changes
+            made on the NetProfiler since this type was loaded
         """
 
         # If this is a new HostGroupType, then create it
@@ -178,11 +339,74 @@ class HostGroupType(object):
             self.id = type_info['id']
             logger.debug("New HostGroupType created with Name: {0} and ID: {1}"
                          .format(self.name, self.id))
+            self._snapshot()
+            return
+
+        synced = self._synced
+        if (force or synced is None or
+                self._settings() != synced['settings']):
+            # The API only updates the settings together with the config
+            self.netprofiler.api.host_group_types.set(self.id, self.name,
+                                                      self.description,
+                                                      self.favorite,
+                                                      self.config)
+        elif self._config_keys() != synced['config']:
+            self.netprofiler.api.host_group_types.set_config(self.id,
+                                                             self.config)
+        else:
+            logger.debug('HostGroupType {0} unchanged, not saved'
+                         .format(self.name))
             return
-        # Otherwise just set the preexisting HostGroupType with the new info
-        self.netprofiler.api.host_group_types.set(self.id, self.name,
-                                                  self.description,
-                                                  self.favorite, self.config)
+        self._snapshot()
+
+    def diff(self):
+        """Return the changes made to the config since the last
+        :func:`load` or :func:`save`.
+
+        Changes are returned in config order as a list of ``(tag,
+        position, removed, added)`` tuples, where `tag` is one of
+        ``'insert'``, ``'delete'`` or ``'replace'``, `position` is the
+        index in :attr:`config` of the change, and `removed` and
+        `added` are the lists of config entries removed and added
+        there.  For a type not yet saved, all entries are added.
+        """
+        old = self._synced['config'] if self._synced is not None else []
+        new = self._config_keys()
+
+        # difflib is slow on long sequences, leave out the common prefix
+        # and suffix first
+        start = 0
+        size = min(len(old), len(new))
+        while start < size and old[start] == new[start]:
+            start += 1
+        end = 0
+        while end < size - start and old[-1 - end] == new[-1 - end]:
+            end += 1
+        old = old[start:len(old) - end]
+        new = new[start:len(new) - end]
+
+        changes = []
+        matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            changes.append((tag, start + j1,
+                            [{'cidr': cidr, 'name': name}
+                             for name, cidr in old[i1:i2]],
+                            [{'cidr': cidr, 'name': name}
+                             for name, cidr in new[j1:j2]]))
+        return changes
+
+    def _settings(self):
+        return (self.name, self.favorite, self.description)
+
+    def _config_keys(self):
+        return [_config_key(entry) for entry in self.config]
+
+    def _snapshot(self):
+        # remember what the NetProfiler holds
+        self._synced = {'settings': self._settings(),
+                        'config': self._config_keys()}
 
     def delete(self):
         """Delete this host group type and all groups."""
@@ -193,6 +417,202 @@ class HostGroupType(object):
                                 .format(self.name))
         self.netprofiler.api.host_group_types.delete(self.id)
         self.id = None
+        self._synced = None
+
+    def add_many(self, entries, prepend=False, keep_together=True):
+        """Add config entries to several host groups at once.
+
+        :param entries: iterable of ``{'name': ..., 'cidr': ...}`` dicts
+            or of ``(name, cidr)`` pairs
+
+        :param bool prepend: if True, prepend instead of append
+
+        :param bool keep_together: if True, place new entries near the
+            other entries of their host group
+
+        Entries are added as if :func:`HostGroup.add` was called once
+        for each host group, in the order the groups first appear in
+        `entries`, with the cidrs of that group.  Host groups that do
+        not exist yet are created.
+        """
+        calls = OrderedDict()
+        for entry in entries:
+            name, cidr = _config_key(entry)
+            calls.setdefault(name, []).append({'cidr': cidr, 'name': name})
+        for name, new_entries in calls.items():
+            if name not in self.groups:
+                HostGroup(self, name)
+            self._queue_add(name, new_entries, prepend, keep_together)
+
+    def remove_many(self, entries):
+        """Remove config entries from several host groups at once.
+
+        :param entries: iterable of ``{'name': ..., 'cidr': ...}`` dicts
+            or of ``(name, cidr)`` pairs
+
+        All entries of a host group matching a given cidr are removed.
+        """
+        self._queue_remove(pairs=[_config_key(entry) for entry in entries])
+
+    def import_config(self, source, format=None, replace=True,
+                      collapse=True, ignore_errors=False):
+        """Import host group entries from a CSV or JSON file.
+
+        :param source: file name or file object, see :func:`read_config`
+        :param str format: ``'csv'`` or ``'json'``, see :func:`read_config`
+
+        :param bool replace: if True, the imported entries replace the
+            config and groups of this type, otherwise they are added
+            with :func:`add_many`
+
+        :param bool collapse: if True, entries covered by an earlier
+            entry of the same group are left out
+
+        :param bool ignore_errors: if True, invalid lines are skipped,
+            otherwise an RvbdException is raised and nothing is imported
+
+        Returns the :class:`ConfigImport` of `source`.
+        """
+        result = read_config(source, format, collapse)
+        if result.errors and not ignore_errors:
+            line, message = result.errors[0]
+            raise RvbdException('{0} invalid entries, first on line {1}: '
+                                '{2}'.format(len(result.errors), line,
+                                             message))
+
+        if replace:
+            self.config = result.config
+            self.groups = {}
+            for entry in result.config:
+                if entry['name'] not in self.groups:
+                    HostGroup(self, entry['name'])
+        else:
+            self.add_many(result.config)
+        return result
+
+    def resolver(self, longest_prefix=False):
+        """Return a :class:`HostGroupResolver` of the current config."""
+        return HostGroupResolver(self.config, longest_prefix)
+
+    def _get_index(self):
+        # index of the config with all queued edits applied
+        self._flush()
+        return self._build_index()
+
+    def _valid_index(self):
+        # the index, if any and the config was not changed behind it
+        if self._index is not None and not self._index.matches(self._config):
+            self._index = None
+        return self._index
+
+    def _build_index(self):
+        if self._valid_index() is None:
+            self._index = _ConfigIndex(self._config)
+        return self._index
+
+    def _queue_add(self, name, entries, prepend, keep_together):
+        if not entries:
+            return
+        mode = (bool(prepend), bool(keep_together))
+        if (self._pending_removes or self._pending_clears or
+                (self._pending_adds and self._pending_mode != mode)):
+            self._flush()
+        self._pending_mode = mode
+        self._pending_adds.append((name, entries))
+
+    def _queue_remove(self, pairs=(), names=()):
+        if self._pending_adds:
+            self._flush()
+        self._pending_removes.update(pairs)
+        self._pending_clears.update(names)
+
+    def _discard_pending(self):
+        self._pending_adds = []
+        self._pending_removes = set()
+        self._pending_clears = set()
+
+    def _flush(self):
+        if self._pending_adds:
+            self._apply_adds()
+        elif self._pending_removes or self._pending_clears:
+            self._apply_removes()
+
+    def _apply_adds(self):
+        # Apply the queued additions in one pass.  Each addition goes
+        # either next to the existing entries of its group, which can
+        # only be known from the config before the additions, or to
+        # the front or back of the whole config.
+        calls = self._pending_adds
+        prepend, keep_together = self._pending_mode
+        self._pending_adds = []
+        config = self._config
+
+        inserts = []
+        if keep_together:
+            positions = self._build_index().positions
+            groups = OrderedDict()
+            for name, entries in calls:
+                groups.setdefault(name, []).append(entries)
+
+            calls = []
+            for name, parts in groups.items():
+                # prepending places later additions before earlier ones
+                if prepend:
+                    parts.reverse()
+                entries = [entry for part in parts for entry in part]
+                where = positions.get(name)
+                if where is None:
+                    calls.append((name, entries))
+                elif prepend:
+                    inserts.append((where[0], entries))
+                else:
+                    inserts.append((where[-1] + 1, entries))
+
+        if prepend:
+            calls.reverse()
+        outside = [entry for _, entries in calls for entry in entries]
+
+        if not inserts and not prepend:
+            index = self._valid_index()
+            config.extend(outside)
+            if index is not None:
+                # appending leaves the positions of the index valid
+                index.entries.extend(outside)
+                for i, entry in enumerate(outside, len(config) - len(outside)):
+                    name = entry['name']
+                    index.positions.setdefault(name, []).append(i)
+                    index.cidrs.setdefault(name, set()).add(entry['cidr'])
+            return
+
+        result = outside if prepend else []
+        start = 0
+        inserts.sort(key=lambda insert: insert[0])
+        for pos, entries in inserts:
+            result.extend(config[start:pos])
+            result.extend(entries)
+            start = pos
+        result.extend(config[start:])
+        if not prepend:
+            result.extend(outside)
+        config[:] = result
+        self._index = None
+
+    def _apply_removes(self):
+        pairs, names = self._pending_removes, self._pending_clears
+        self._pending_removes = set()
+        self._pending_clears = set()
+
+        index = self._valid_index()
+        if index is not None:
+            if not (any(name in index.positions for name in names) or
+                    any(cidr in index.cidrs.get(name, ())
+                        for name, cidr in pairs)):
+                return
+
+        self._config[:] = [entry for entry in self._config
+                           if entry['name'] not in names and
+                           (entry['name'], entry['cidr']) not in pairs]
+        self._index = None
 
     def _add_host_group(self, new_host_group):
         """ Add a new host group to groups dictionary.
@@ -303,25 +723,12 @@ class HostGroup(object):
             self.clear()
 
         # Format the cidrs to be in the correct format for the config
-        old_config = self.host_group_type.config
         new_config = []
         for cidr in cidrs:
             new_config.append({'cidr': cidr, 'name': self.name})
 
-        # Add the new_config in the correct location
-        if keep_together and len(old_config) > 0:
-            index = [i for i, j in enumerate(old_config)
-                     if j['name'] == self.name]
-            if len(index) != 0:
-                if prepend:
-                    self.host_group_type.config[index[0]:index[0]] = new_config
-                else:
-                    self.host_group_type.config[index[-1]+1:index[-1]+1] = new_config
-                return
-        if prepend:
-            self.host_group_type.config[0:0] = new_config
-        else:
-            self.host_group_type.config.extend(new_config)
+        self.host_group_type._queue_add(self.name, new_config,
+                                        prepend, keep_together)
 
     def remove(self, cidrs):
         """Remove a CIDR from this host group.
@@ -332,16 +739,330 @@ class HostGroup(object):
         """
         cidrs = clean_str_or_bytes(cidrs)
 
-        self.host_group_type.config = list(filter(
-            lambda a: a['cidr'] not in cidrs or a['name'] != self.name,
-            self.host_group_type.config))
+        self.host_group_type._queue_remove(
+            pairs=[(self.name, cidr) for cidr in cidrs])
 
     def clear(self):
         """Clear all definitions for this host group."""
-        self.host_group_type.config = list(filter(lambda a: a['name'] != self.name,
-                                                  self.host_group_type.config))
+        self.host_group_type._queue_remove(names=[self.name])
 
     def get(self):
         """Return a list of CIDRs assigned to this host group."""
-        return [i['cidr'] for i in self.host_group_type.config
-                if i['name'] == self.name]
+        index = self.host_group_type._get_index()
+        config = self.host_group_type._config
+        return [config[i]['cidr'] for i in index.positions.get(self.name, ())]
+
+
+class HostGroupResolver(object):
+    """Map IP addresses to host groups without querying the NetProfiler.
+
+    The resolver is built from the config of a :class:`HostGroupType`
+    and does not follow later changes to it::
+
+        >>> resolver = byloc.resolver()
+        >>> resolver.resolve('10.99.1.20')
+        'sanfran'
+        >>> resolver.resolve_many(['10.99.1.20', '192.168.0.1'])
+        ['sanfran', None]
+
+    Config entries are kept in one table per prefix length, so a lookup
+    takes one dict lookup per distinct prefix length of the config.
+    """
+    def __init__(self, config, longest_prefix=False):
+        """
+        :param list config: cidr/name config items, in order of
+            precedence, such as :attr:`HostGroupType.config`
+
+        :param bool longest_prefix: if True, an address resolves to the
+            group of the longest matching prefix.  By default it
+            resolves to the group of the first matching entry of the
+            config.  Either way, ties go to the first entry.
+        """
+        self.longest_prefix = longest_prefix
+        # config position -> group name
+        self._names = []
+
+        tables = {4: {}, 6: {}}
+        for position, entry in enumerate(config):
+            name, cidr = _config_key(entry)
+            try:
+                version, value, prefixlen = _parse_cidr(cidr)
+            except ValueError:
+                raise ValueError('Invalid cidr {0!r} of host group {1!r}'
+                                 .format(cidr, name))
+            self._names.append(name)
+            shift = _FAMILIES[version][1] - prefixlen
+            table = tables[version].setdefault(shift, {})
+            table.setdefault(value >> shift, position)
+
+        # per version, (shift, {network >> shift: position}) tables from
+        # the longest prefix to the shortest
+        self._tables = dict((version, sorted(t.items()))
+                            for version, t in tables.items())
+        self._arrays = None
+
+    def __len__(self):
+        return len(self._names)
+
+    def _lookup(self, version, value):
+        # config position of the entry matching value, or None
+        best = None
+        for shift, table in self._tables[version]:
+            position = table.get(value >> shift)
+            if position is None:
+                continue
+            if self.longest_prefix:
+                return position
+            if best is None or position < best:
+                best = position
+        return best
+
+    def resolve(self, address):
+        """Return the name of the host group of `address`, None if it is
+        in none.
+
+        :param address: IPv4 or IPv6 address as a string, an
+            :mod:`ipaddress` address or an integer IPv4 address
+        """
+        position = self._lookup(*_address_value(address))
+        return None if position is None else self._names[position]
+
+    def resolve_many(self, addresses):
+        """Return the names of the host groups of `addresses`.
+
+        :param addresses: sequence of addresses as accepted by
+            :func:`resolve`, or a numpy array of integer IPv4 addresses
+
+        Returns a list, or a numpy object array if `addresses` is a
+        numpy array.  When numpy is installed, IPv4 addresses are
+        resolved with vectorized lookups.
+        """
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        is_array = numpy is not None and isinstance(addresses, numpy.ndarray)
+        if is_array and addresses.dtype.kind in 'iu':
+            return self._resolve_ipv4_array(numpy,
+                                            addresses.astype(numpy.int64))
+
+        values = [_address_value(address) for address in addresses]
+        if numpy is not None and all(v == 4 for v, _ in values):
+            res = self._resolve_ipv4_array(
+                numpy, numpy.fromiter((x for _, x in values),
+                                      dtype=numpy.int64, count=len(values)))
+            return res if is_array else res.tolist()
+
+        names = self._names
+        res = []
+        for version, value in values:
+            position = self._lookup(version, value)
+            res.append(None if position is None else names[position])
+        return numpy.array(res, dtype=object) if is_array else res
+
+    def _resolve_ipv4_array(self, numpy, values):
+        if self._arrays is None:
+            # sorted networks and their positions, per IPv4 table
+            self._arrays = []
+            for shift, table in self._tables[4]:
+                networks = numpy.array(sorted(table), dtype=numpy.int64)
+                positions = numpy.array([table[n] for n in networks.tolist()],
+                                        dtype=numpy.int64)
+                self._arrays.append((shift, networks, positions))
+            self._names_array = numpy.array(self._names + [None],
+                                            dtype=object)
+
+        # positions past the end of the config resolve to None
+        missing = len(self._names)
+        best = numpy.full(len(values), missing, dtype=numpy.int64)
+        for shift, networks, positions in self._arrays:
+            keys = values >> shift
+            idx = numpy.searchsorted(networks, keys)
+            idx[idx == len(networks)] = 0
+            found = networks[idx] == keys
+            if self.longest_prefix:
+                found &= best == missing
+                best[found] = positions[idx[found]]
+            else:
+                best = numpy.where(found,
+                                   numpy.minimum(best, positions[idx]), best)
+        return self._names_array[best]
+
+
+# Characters allowed in imported host group names
+_GROUP_NAME_RE = re.compile(r'^[A-Za-z0-9._-]+$')
+
+# Header fields recognized in CSV files
+_CIDR_FIELDS = ('cidr', 'subnet', 'network')
+_NAME_FIELDS = ('name', 'group', 'sitename', 'group_name', 'hostgroup')
+
+
+class ConfigImport(object):
+    """Host group config read by :func:`read_config`."""
+    def __init__(self):
+        #: list of cidr/name config items, in file order
+        self.config = []
+        #: list of (line, message) for each invalid entry
+        self.errors = []
+        #: number of entries left out as repeated in their group
+        self.duplicates = 0
+        #: number of entries left out as covered by an earlier entry
+        #: of their group
+        self.collapsed = 0
+
+    def __repr__(self):
+        return ('<ConfigImport {0} entries, {1} errors>'
+                .format(len(self.config), len(self.errors)))
+
+
+class _ConfigBuilder(object):
+    """Validate entries one at a time and build a ConfigImport."""
+
+    def __init__(self, collapse):
+        self.collapse = collapse
+        self.result = ConfigImport()
+        # (name, version) -> {host bits: set of network >> host bits}
+        self._networks = {}
+
+    def add(self, line, name, cidr):
+        result = self.result
+        if isinstance(name, bytes):
+            name = name.decode('utf8')
+        if not isinstance(name, str) or not _GROUP_NAME_RE.match(name):
+            result.errors.append((line, 'Invalid group name: {0!r}'
+                                  .format(name)))
+            return
+        try:
+            version, value, prefixlen = _parse_cidr(cidr)
+        except ValueError as e:
+            result.errors.append((line, str(e)))
+            return
+
+        shift = _FAMILIES[version][1] - prefixlen
+        networks = self._networks.setdefault((name, version), {})
+        if value >> shift in networks.get(shift, ()):
+            result.duplicates += 1
+            return
+        if self.collapse:
+            for other, keys in networks.items():
+                if other > shift and value >> other in keys:
+                    result.collapsed += 1
+                    return
+        networks.setdefault(shift, set()).add(value >> shift)
+        result.config.append({'cidr': _format_cidr(version, value, prefixlen),
+                              'name': name})
+
+
+def _iter_csv(f):
+    # yield (line, name, cidr) of the rows of a CSV file, or (line,
+    # None, message) for malformed rows
+    dialect = 'excel'
+    if getattr(f, 'seekable', None) and f.seekable():
+        start = f.tell()
+        sample = f.read(4096)
+        f.seek(start)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t ')
+        except csv.Error:
+            pass
+
+    reader = csv.reader(f, dialect)
+    # repeated spaces delimit empty fields
+    spaces = reader.dialect.delimiter == ' '
+    cidr_index, name_index = 0, 1
+    first = True
+    for row in reader:
+        row = [field.strip() for field in row]
+        if spaces:
+            row = [field for field in row if field]
+        if not any(row) or row[0].startswith('#'):
+            continue
+        if first:
+            first = False
+            fields = [field.lower() for field in row]
+            cidr_fields = [i for i, field in enumerate(fields)
+                           if field in _CIDR_FIELDS]
+            name_fields = [i for i, field in enumerate(fields)
+                           if field in _NAME_FIELDS]
+            if cidr_fields and name_fields:
+                # header line
+                cidr_index, name_index = cidr_fields[0], name_fields[0]
+                continue
+        try:
+            yield reader.line_num, row[name_index], row[cidr_index]
+        except IndexError:
+            yield reader.line_num, None, ('Expected a cidr and a name, got '
+                                          '{0!r}'.format(row))
+
+
+def _iter_json(f):
+    # yield (entry number, name, cidr) of the entries of a JSON array
+    def chunks():
+        while True:
+            chunk = f.read(65536)
+            if not chunk:
+                return
+            yield chunk.encode('utf8') if isinstance(chunk, str) else chunk
+
+    i = 0
+    try:
+        for i, entry in enumerate(iter_array(chunks()), 1):
+            try:
+                yield i, entry['name'], entry['cidr']
+            except (KeyError, TypeError):
+                yield i, None, ('Expected an object with cidr and name, '
+                                'got {0!r}'.format(entry))
+    except ValueError:
+        # the rest of the file cannot be read
+        yield i + 1, None, 'Invalid JSON'
+
+
+def read_config(source, format=None, collapse=True):
+    """Read a host group config from a CSV or JSON file.
+
+    :param source: file name or file object.  Files are read one line
+        or chunk at a time, so large files are never held in memory.
+
+    :param str format: ``'csv'`` for rows of cidr and group name, in
+        that order unless a header line names the columns, such as
+        ``subnet,SiteName``.  The delimiter is detected.  ``'json'``
+        for an array of ``{"cidr": ..., "name": ...}`` objects, the
+        format returned by the NetProfiler.  Defaults to the extension
+        of the file name, or to ``'csv'``.
+
+    :param bool collapse: if True, entries covered by an earlier entry
+        of the same group are left out, which does not change the hosts
+        of any group
+
+    Returns a :class:`ConfigImport`.  Its config holds the valid
+    entries in file order, with cidrs normalized to the network address
+    and prefix length.  Repeated entries of a group are left out.
+    Invalid entries are reported in its errors by line number, or by
+    entry number for JSON.
+    """
+    if isinstance(source, str):
+        if format is None:
+            format = os.path.splitext(source)[1][1:].lower() or None
+        mode = 'rb' if format == 'json' else 'rt'
+        with open(source, mode, newline=None if mode == 'rb' else '') as f:
+            return read_config(f, format or 'csv', collapse)
+
+    format = format or 'csv'
+    if format == 'csv':
+        if isinstance(source, (io.RawIOBase, io.BufferedIOBase)):
+            source = io.TextIOWrapper(source, encoding='utf8', newline='')
+        entries = _iter_csv(source)
+    elif format == 'json':
+        entries = _iter_json(source)
+    else:
+        raise RvbdException('Unknown host group file format: {0}'
+                            .format(format))
+
+    builder = _ConfigBuilder(collapse)
+    for line, name, cidr in entries:
+        if name is None:
+            builder.result.errors.append((line, cidr))
+        else:
+            builder.add(line, name, cidr)
+    return builder.result
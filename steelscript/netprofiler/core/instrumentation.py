@@ -0,0 +1,300 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+This module provides timing of the REST calls and report phases of a
+NetProfiler.
+
+Instrumentation is disabled by default.  It is enabled by attaching an
+:class:`Instrumentation` to a :class:`NetProfiler
+<steelscript.netprofiler.core.NetProfiler>`, which then reports a
+:class:`PhaseEvent` to each of its listeners every time a phase
+completes::
+
+    >>> latency = LatencyAggregator()
+    >>> p = NetProfiler(host, auth=auth,
+    ...                 instrumentation=Instrumentation(latency))
+    >>> report = TrafficSummaryReport(p)
+    >>> report.run(...)
+    >>> report.get_data()
+    >>> print(latency.format())
+
+The phases are:
+
+- ``request``: one REST call to the NetProfiler API
+- ``post``: creation of a report
+- ``poll``: waiting for a report to complete
+- ``fetch``: retrieval of query data
+- ``decode``: conversion of query data to native types
+
+Report phases carry the report id, realm and groupby.  Phases that
+issue REST calls also carry the number of bytes received by these
+calls.  Listeners are any callable taking a :class:`PhaseEvent`.
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import deque
+
+__all__ = ['Instrumentation', 'PhaseEvent', 'LatencyAggregator']
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseEvent(object):
+    """Timing of one phase."""
+
+    __slots__ = ('phase', 'endpoint', 'method', 'report_id', 'query_id',
+                 'realm', 'groupby', 'rows', 'bytes', 'start', 'duration',
+                 'error')
+
+    def __init__(self, phase, endpoint=None, method=None, report_id=None,
+                 query_id=None, realm=None, groupby=None, rows=None,
+                 bytes=None):
+        #: one of request, post, poll, fetch or decode
+        self.phase = phase
+        #: REST path of requests, with ids replaced by placeholders
+        self.endpoint = endpoint
+        #: HTTP method of requests
+        self.method = method
+        self.report_id = report_id
+        self.query_id = query_id
+        self.realm = realm
+        self.groupby = groupby
+        #: number of rows retrieved or decoded
+        self.rows = rows
+        #: number of bytes received
+        self.bytes = bytes
+        #: time.time() when the phase started
+        self.start = None
+        #: seconds the phase took
+        self.duration = None
+        #: name of the exception that ended the phase, None on success
+        self.error = None
+
+    @property
+    def name(self):
+        """Name the phase is aggregated under, the endpoint of requests
+        and the realm of report phases."""
+        return self.endpoint or self.realm or ''
+
+    def __repr__(self):
+        return '<PhaseEvent %s %s %.6fs>' % (self.phase, self.name,
+                                             self.duration or 0)
+
+
+class _Phase(object):
+    """Context manager timing a phase and emitting its event."""
+
+    __slots__ = ('instrumentation', 'event', '_start', '_parent')
+
+    def __init__(self, instrumentation, event):
+        self.instrumentation = instrumentation
+        self.event = event
+
+    def __enter__(self):
+        stack = self.instrumentation._stack()
+        self._parent = stack[-1] if stack else None
+        stack.append(self.event)
+        self.event.start = time.time()
+        self._start = time.perf_counter()
+        return self.event
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event = self.event
+        event.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            event.error = exc_type.__name__
+        self.instrumentation._stack().pop()
+        if event.bytes and self._parent is not None:
+            # bytes received by requests count for the enclosing phase
+            self._parent.bytes = (self._parent.bytes or 0) + event.bytes
+        self.instrumentation.emit(event)
+
+
+class _NoPhase(object):
+    """Context manager used when instrumentation is disabled."""
+
+    __slots__ = ('event',)
+
+    def __init__(self):
+        self.event = PhaseEvent(None)
+
+    def __enter__(self):
+        # the event is shared and never emitted, fields set on it are lost
+        return self.event
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(profiler, name, **fields):
+    """Return a context manager timing phase `name` of `profiler`.
+
+    The context manager yields the :class:`PhaseEvent`, so fields only
+    known at the end of the phase can be set.  If `profiler` has no
+    instrumentation, nothing is timed.
+    """
+    instrumentation = getattr(profiler, 'instrumentation', None)
+    if instrumentation is None:
+        return _NO_PHASE
+    return instrumentation.phase(name, **fields)
+
+
+def decode_rows(profiler, rows, decode, **fields):
+    """Return an iterator over `rows` converted by `decode`.
+
+    With instrumentation, the conversion is timed as a decode phase.
+    Only the time spent in `decode` is measured, not the time the
+    caller spends between rows.  The event is emitted once iteration
+    ends, with the number of rows decoded.
+    """
+    instrumentation = getattr(profiler, 'instrumentation', None)
+    if instrumentation is None:
+        return map(decode, rows)
+    return _timed_decode(instrumentation, rows, decode, fields)
+
+
+def _timed_decode(instrumentation, rows, decode, fields):
+    event = PhaseEvent('decode', rows=0, **fields)
+    event.start = time.time()
+    elapsed = 0.0
+    clock = time.perf_counter
+    try:
+        for row in rows:
+            start = clock()
+            row = decode(row)
+            elapsed += clock() - start
+            event.rows += 1
+            yield row
+    finally:
+        event.duration = elapsed
+        instrumentation.emit(event)
+
+
+class Instrumentation(object):
+    """Dispatch the timing of phases to listeners."""
+
+    def __init__(self, *listeners):
+        """
+        :param listeners: callables called with each completed
+            :class:`PhaseEvent`, such as a :class:`LatencyAggregator`
+        """
+        self.listeners = list(listeners)
+        self._local = threading.local()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def phase(self, name, **fields):
+        """Return a context manager timing the phase `name`.
+
+        Keyword arguments set the fields of the :class:`PhaseEvent`,
+        which is emitted when the context exits.
+        """
+        return _Phase(self, PhaseEvent(name, **fields))
+
+    def emit(self, event):
+        """Send a completed `event` to all listeners.
+
+        Errors raised by listeners are logged and otherwise ignored.
+        """
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception('Instrumentation listener %s failed'
+                                 % listener)
+
+
+def _percentile(ordered, percent):
+    # nearest-rank percentile of a sorted list
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class LatencyAggregator(object):
+    """In-process aggregation of phase durations.
+
+    Durations are kept per phase and name, see :attr:`PhaseEvent.name`,
+    so requests are aggregated per endpoint and report phases per realm.
+    Percentiles are computed over the most recent `maxsamples` events of
+    each.
+    """
+    def __init__(self, maxsamples=10000):
+        self.maxsamples = maxsamples
+        self._stats = dict()
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        key = (event.phase, event.name)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'durations': deque(maxlen=self.maxsamples),
+                    'count': 0, 'errors': 0, 'total': 0.0,
+                    'rows': 0, 'bytes': 0}
+            stats['durations'].append(event.duration)
+            stats['count'] += 1
+            stats['total'] += event.duration
+            stats['rows'] += event.rows or 0
+            stats['bytes'] += event.bytes or 0
+            if event.error is not None:
+                stats['errors'] += 1
+
+    def summary(self):
+        """Return statistics keyed by ``(phase, name)``.
+
+        Each value is a dict with the `count` of events, the number of
+        `errors`, the `total`, `p50`, `p95`, `p99` and `max` durations
+        in seconds, and the total `rows` and `bytes`.
+        """
+        res = dict()
+        with self._lock:
+            for key, stats in self._stats.items():
+                ordered = sorted(stats['durations'])
+                res[key] = {'count': stats['count'],
+                            'errors': stats['errors'],
+                            'total': stats['total'],
+                            'p50': _percentile(ordered, 50),
+                            'p95': _percentile(ordered, 95),
+                            'p99': _percentile(ordered, 99),
+                            'max': ordered[-1],
+                            'rows': stats['rows'],
+                            'bytes': stats['bytes']}
+        return res
+
+    def format(self):
+        """Return the summary as a text table."""
+        lines = ['%-8s %-60s %7s %10s %10s %10s %12s' %
+                 ('phase', 'name', 'count', 'p50', 'p95', 'p99', 'bytes')]
+        for (phase, name), s in sorted(self.summary().items()):
+            lines.append('%-8s %-60s %7d %10.4f %10.4f %10.4f %12d' %
+                         (phase, name, s['count'], s['p50'], s['p95'],
+                          s['p99'], s['bytes']))
+        return '\n'.join(lines)
+
+    def reset(self):
+        """Discard all collected durations."""
+        with self._lock:
+            self._stats.clear()
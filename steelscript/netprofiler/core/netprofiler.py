@@ -11,8 +11,13 @@ the state of the NetProfiler, modifying its settings and performing operations
 like creating running reports.
 """
 
+import os
 import logging
 import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests.adapters
 
 from steelscript.common.datastructures import DictObject
 from steelscript.common.api_helpers import APIVersion
@@ -21,6 +26,8 @@ from steelscript.netprofiler.core import _constants
 from steelscript.common._fs import SteelScriptDir
 from steelscript.netprofiler.core._types import (Column, AreaContainer,
                                                  ColumnContainer)
+from steelscript.netprofiler.core._catalog import (ColumnCatalogFile,
+                                                   CatalogData)
 from steelscript.common.exceptions import RvbdException, RvbdHTTPException
 
 import steelscript.common.service
@@ -34,12 +41,86 @@ def make_hash(realm, centricity, groupby):
     return str(realm) + str(centricity) + str(groupby)
 
 
+class _ColumnIndex(object):
+    """Inverted index over the cached column data.
+
+    Each known realm, centricity and groupby maps to the set of cached
+    triplets it takes part in, so a search is an intersection of those
+    sets followed by a union of the frozen column-id sets of the
+    matching triplets.  Column-id sets are computed the first time a
+    triplet is searched, leaving the rest of the catalog undecoded.
+    """
+    def __init__(self, data, realms, centricities, groupbys):
+        self._data = data
+        self._by_realm = dict()
+        self._by_centricity = dict()
+        self._by_groupby = dict()
+        self._all = set()
+        for triplet in itertools.product(realms, centricities, groupbys):
+            if make_hash(*triplet) not in data:
+                continue
+            realm, centricity, groupby = triplet
+            self._by_realm.setdefault(realm, set()).add(triplet)
+            self._by_centricity.setdefault(centricity, set()).add(triplet)
+            self._by_groupby.setdefault(groupby, set()).add(triplet)
+            self._all.add(triplet)
+
+        self._triplet_ids = dict()
+        self._columns = dict()
+        self._searches = dict()
+
+    @staticmethod
+    def _lookup(index, values):
+        res = set()
+        for v in values:
+            res.update(index.get(v, ()))
+        return res
+
+    def _ids(self, triplet):
+        try:
+            return self._triplet_ids[triplet]
+        except KeyError:
+            pass
+        ids = []
+        for c in self._data[make_hash(*triplet)]:
+            self._columns.setdefault(c.id, c)
+            ids.append(c.id)
+        ids = frozenset(ids)
+        self._triplet_ids[triplet] = ids
+        return ids
+
+    def search(self, realms=None, centricities=None, groupbys=None):
+        """Return a (ids, keys) pair of frozensets for the search."""
+        args = tuple(None if v is None else frozenset(v)
+                     for v in (realms, centricities, groupbys))
+        try:
+            return self._searches[args]
+        except KeyError:
+            pass
+
+        triplets = self._all
+        for index, values in zip((self._by_realm, self._by_centricity,
+                                  self._by_groupby), args):
+            if values is not None:
+                triplets = triplets & self._lookup(index, values)
+
+        ids = frozenset().union(*[self._ids(t) for t in triplets])
+        keys = frozenset(self._columns[i].key for i in ids)
+        self._searches[args] = (ids, keys)
+        return ids, keys
+
+    def column(self, cid):
+        return self._columns[cid]
+
+
 class NetProfiler(steelscript.common.service.Service):
     """The NetProfiler class is the main interface to interact with a
     NetProfiler appliance.  Primarily this provides an interface to reporting.
     """
 
-    def __init__(self, host, port=None, auth=None):
+    def __init__(self, host, port=None, auth=None, max_workers=None,
+                 lazy_columns=False, result_cache=None, session_cache=None,
+                 instrumentation=None):
         """Establishes a connection to a NetProfiler appliance.
 
         :param str host: name or IP address of the NetProfiler to
@@ -58,9 +139,54 @@ class NetProfiler(steelscript.common.service.Service):
             if unspecified, this will use the latest version supported by both
             this implementation and the NetProfiler appliance.
 
+        :param int max_workers: number of concurrent requests used to
+            discover column definitions missing from the local cache.
+            Defaults to ``COLUMN_FETCH_WORKERS``, use 1 to fetch serially.
+
+        :param bool lazy_columns: if True, column definitions are not
+            verified when connecting.  Each realm/centricity/groupby
+            triplet is fetched and cached the first time it is needed by
+            :py:meth:`search_columns` or :py:meth:`get_columns`, and the
+            full catalog only when :py:attr:`columns` or
+            :py:attr:`colnames` are accessed.
+
+        :param result_cache: optional
+            :py:class:`ResultCache<steelscript.netprofiler.core.resultcache.ResultCache>`
+            used to return the results of reports identical to ones
+            already run without querying the NetProfiler again.
+
+        :param session_cache: optional
+            :py:class:`SessionCache<steelscript.netprofiler.core.sessioncache.SessionCache>`
+            used to reuse the authenticated session, and supported API
+            versions, of a recent connection with the same credentials.
+
+        :param instrumentation: optional
+            :py:class:`Instrumentation<steelscript.netprofiler.core.instrumentation.Instrumentation>`
+            receiving the timing of REST calls and report phases.  It
+            can also be set or removed later through the
+            ``instrumentation`` attribute.
+
         See the base :py:class:`Service<steelscript.common.service.Service>` class
         for more information about additional functionality supported.
         """
+        self.instrumentation = instrumentation
+
+        # logins after the session expired are serialized, threads
+        # sharing this instance log in once, see reauthenticate
+        self._auth_lock = threading.RLock()
+        self._auth_generation = 0
+        self._pool_size = None
+
+        # the cached session is used by check_api_versions and
+        # authenticate, which are called while connecting
+        self._session_cache = session_cache
+        self._session_key = None
+        self._session_entry = None
+        if session_cache is not None:
+            self._session_key = session_cache.make_key('profiler', host,
+                                                       port, auth)
+            self._session_entry = session_cache.get(self._session_key)
+
         super(NetProfiler, self).__init__("profiler", host, port,
                                           auth=auth,
                                           enable_auth_detection = False,
@@ -75,6 +201,26 @@ class NetProfiler(steelscript.common.service.Service):
         self.groupbys = DictObject.create_from_dict(_constants.groupbys)
 
         self._info = None
+        if session_cache is not None:
+            # the info request validates a restored session, logging
+            # in again if it expired
+            self._fetch_info()
+            self._save_session()
+
+        self._max_workers = (max_workers or
+                             _constants.COLUMN_FETCH_WORKERS)
+        self._lazy_columns = lazy_columns
+        self.result_cache = result_cache
+
+        # column catalog state, see the columns property
+        self._columns = None
+        # columns retrieved so far, see _base_column
+        self._known_columns = None
+        self._colnames = None
+        self._column_index = None
+        self._catalog_complete = False
+        self._failed_triplets = set()
+        self._columns_lock = threading.RLock()
 
         # checking if the profiler supports 1.2
         # if yes, then use column dsc
@@ -87,26 +233,93 @@ class NetProfiler(steelscript.common.service.Service):
         self.groupbys[_key] = _value
 
         self._load_file_caches()
-        self.columns = ColumnContainer(self._unique_columns())
-        self.colnames = set(c.key for c in self.columns)
+        if not self._lazy_columns:
+            self._verify_cache()
 
         self.areas = AreaContainer(self._areas_dict.items())   
 
+    def check_api_versions(self, api_versions):
+        if self._session_entry is None:
+            return super(NetProfiler, self).check_api_versions(api_versions)
+
+        versions = self._session_entry['supported_versions']
+        if versions is None:
+            self.supported_versions = None
+        else:
+            self.supported_versions = [APIVersion(v) for v in versions]
+        return self.supported_versions is not None
+
+    def authenticate(self, auth):
+        entry = self._session_entry
+        if entry is None:
+            super(NetProfiler, self).authenticate(auth)
+            if (self._session_key is not None and
+                    getattr(self, 'api', None) is not None):
+                # logged in again after the session expired
+                self._save_session()
+            return
+
+        # restore the cached session once, if it is no longer valid
+        # the connection calls back here to log in for real
+        self._session_entry = None
+        self.auth = auth
+        session = self.conn.conn
+        session.headers.update(entry['headers'])
+        session.cookies.update(entry['cookies'])
+        if entry['basic']:
+            session.auth = (auth.username, auth.password)
+        logger.debug('Restored cached session for %s' % self.host)
+
+    def _save_session(self):
+        """Store the current session in the session cache.
+
+        Only OAuth tokens and cookies are stored.  Sessions using a
+        basic Authorization header, which encodes the password, are
+        not cached.
+        """
+        session = self.conn.conn
+        headers = dict()
+        if 'Authorization' in session.headers:
+            authorization = session.headers['Authorization']
+            if authorization.lower().startswith('basic '):
+                logger.debug('Not caching the basic auth session for %s'
+                             % self.host)
+                self._session_cache.remove(self._session_key)
+                return
+            headers['Authorization'] = authorization
+        cookies = dict(session.cookies.items())
+        if getattr(self.conn, 'cookies', None):
+            cookies.update(self.conn.cookies.items())
+
+        versions = None
+        if self.supported_versions is not None:
+            versions = [str(v) for v in self.supported_versions]
+
+        self._session_cache.put(self._session_key, {
+            'headers': headers,
+            'cookies': cookies,
+            'basic': isinstance(session.auth, tuple),
+            'supported_versions': versions})
+
     def _load_file_caches(self):
         """Load and unroll locally cached files
 
         We want to avoid making any calls for column data here
-        and just load what has been stored locally for now
+        and just load what has been stored locally for now, the
+        column cache is verified separately by _verify_cache
         """
         self._fs_data = SteelScriptDir('NetProfiler', 'data')
 
-        columns_filename = 'columns-' + self.version + '.pcl'
-        self._columns_file = self._fs_data.get_data(columns_filename)
+        # the column catalog is memory-mapped and shared between
+        # processes, see _catalog for the file layout
+        columns_filename = 'columns-' + self.version + '.cat'
+        self._columns_file = ColumnCatalogFile(
+            os.path.join(self._fs_data.basedir, columns_filename))
         if (self._columns_file.data is None or
                 self._columns_file.version < _constants.CACHE_VERSION):
             # if CACHE_VERSION older than our config,
             # we must have an *old* version, and need to recreate cache
-            self._columns_file.data = dict()
+            self._columns_file.data = CatalogData()
 
         areas_filename = 'areas-' + self.version + '.json'
         self._areas_file = self._fs_data.get_config(areas_filename)
@@ -114,24 +327,14 @@ class NetProfiler(steelscript.common.service.Service):
             self._areas_file.data = self.api.report.areas()
             self._areas_file.write()
 
-        self._verify_cache()
         self._areas_dict = dict(self._genareas(self._areas_file.data))
 
-    def _verify_cache(self, refetch=False):
-        """Retrieve all the possible combinations of
-        groupby, centricity and realm using the rule shown under
-        the search_columns method.
-
-        By default, all these permutations will be checked against
-        the current local cache file, and any missing keys will be
-        retrieved from the server.
+    def _column_triplets(self):
+        """Yield every valid (realm, centricity, groupby) triplet.
 
-        :param bool refetch: will force an api refresh call from the
-            machine even if the data can be found in local cache.
+        The combinations follow the rules shown under the
+        search_columns method.
         """
-        columns = list()
-        write = False
-        have_exception = False
         for realm in self.realms:
             if realm == 'traffic_flow_list' or realm == 'identity_list':
                 centricities = ['hos']
@@ -154,42 +357,50 @@ class NetProfiler(steelscript.common.service.Service):
                     groupbys = ['hos']
 
                 for groupby in groupbys:
-                    _hash = make_hash(realm, centricity, groupby)
-                    if refetch or _hash not in self._columns_file.data:
-                        logger.debug('Requesting columns for triplet: '
-                                     '%s, %s, %s' % (realm,
-                                                     centricity,
-                                                     groupby))
-
-                        # TODO: fix properly and remove the patch
-                        # Patch to avoid /api/profiler/1.0/reporting/columns.json returned status 400 (Bad Request)
-                        if realm =="msq" and centricity == "hos" and groupby == "slm":
-                            continue
-
-                        try:
-                            api_call = self.api.report.columns(realm,centricity,groupby)
-                        except RvbdHTTPException as e:
-                            logger.warning(f"Exception raised fetching columns for triplet( realm:{realm}, centricity:{centricity}, groupby:{groupby} with message {e.message}")
-                            have_exception = True
-                            continue
-
-                        # generate Column objects from json
-                        api_columns = self._gencolumns(api_call)
-                        # compare against objects we've already retrieved
-                        existing = [c for c in columns if c in api_columns]
-                        new_columns = [c for c in api_columns
-                                       if c not in existing]
-                        columns.extend(new_columns)
-
-                        # add them to data, preserving existing objects
-                        self._columns_file.data[_hash] = (existing +
-                                                          new_columns)
-                        write = True
-
-        if write:
-            self._columns_file.version = _constants.CACHE_VERSION
-            self._columns_file.write()
-        elif have_exception:
+                    # TODO: fix properly and remove the patch
+                    # Patch to avoid /api/profiler/1.0/reporting/columns.json
+                    # returned status 400 (Bad Request)
+                    if (realm == "msq" and centricity == "hos" and
+                            groupby == "slm"):
+                        continue
+                    yield realm, centricity, groupby
+
+    def _fetch_columns(self, triplet):
+        """Fetch the column json for one triplet, None on HTTP failure."""
+        realm, centricity, groupby = triplet
+        logger.debug('Requesting columns for triplet: '
+                     '%s, %s, %s' % (realm, centricity, groupby))
+        try:
+            return self.api.report.columns(realm, centricity, groupby)
+        except RvbdHTTPException as e:
+            logger.warning(f"Exception raised fetching columns for triplet( "
+                           f"realm:{realm}, centricity:{centricity}, "
+                           f"groupby:{groupby} with message {e.message}")
+            return None
+
+    def _verify_cache(self, refetch=False, max_workers=None):
+        """Retrieve all the possible combinations of
+        groupby, centricity and realm using the rule shown under
+        the search_columns method.
+
+        By default, all these permutations will be checked against
+        the current local cache file, and any missing keys will be
+        retrieved from the server.
+
+        :param bool refetch: will force an api refresh call from the
+            machine even if the data can be found in local cache.
+
+        :param int max_workers: number of concurrent requests used to
+            fetch missing triplets, defaults to the value given when
+            creating this NetProfiler.  Use 1 to fetch serially.
+        """
+        with self._columns_lock:
+            have_exception = self._ensure_triplets(self._column_triplets(),
+                                                   refetch=refetch,
+                                                   max_workers=max_workers)
+            self._catalog_complete = True
+
+        if have_exception:
             logger.warning('_verify_cache: Some realm, centricity, '
                            'and groupby triplets failed.')
 
@@ -198,6 +409,94 @@ class NetProfiler(steelscript.common.service.Service):
                                 "cached and live data. Please check"
                                 "NetProfiler health")
 
+    def _ensure_triplets(self, triplets, refetch=False, max_workers=None):
+        """Make sure column data for each of `triplets` is cached.
+
+        Triplets missing from the local cache file are retrieved from
+        the server, merged into the cache and written back.  Triplets
+        that previously failed are not requested again unless `refetch`
+        is True.
+
+        Returns True if any of the requests failed.
+        """
+        if max_workers is None:
+            max_workers = self._max_workers
+
+        with self._columns_lock:
+            data = self._columns_file.data
+            missing = [t for t in triplets
+                       if refetch or (make_hash(*t) not in data and
+                                      t not in self._failed_triplets)]
+            if not missing:
+                return False
+
+            if max_workers <= 1 or len(missing) == 1:
+                results = [self._fetch_columns(t) for t in missing]
+            else:
+                workers = min(max_workers, len(missing))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    # map() preserves submission order, so merging below
+                    # is deterministic regardless of completion order
+                    results = list(executor.map(self._fetch_columns,
+                                                missing))
+
+            # start from what we already know so columns shared across
+            # triplets are stored as a single object
+            columns = self._unique_columns()
+            write = False
+            have_exception = False
+            for triplet, api_call in zip(missing, results):
+                if api_call is None:
+                    self._failed_triplets.add(triplet)
+                    have_exception = True
+                    continue
+                self._failed_triplets.discard(triplet)
+
+                # generate Column objects from json
+                api_columns = self._gencolumns(api_call)
+                # compare against objects we've already retrieved
+                existing = [c for c in columns if c in api_columns]
+                new_columns = [c for c in api_columns
+                               if c not in existing]
+                columns.extend(new_columns)
+
+                # add them to data, preserving existing objects
+                data[make_hash(*triplet)] = existing + new_columns
+                write = True
+
+            if write:
+                self._columns_file.version = _constants.CACHE_VERSION
+                self._columns_file.write()
+                # rebuilt on next access
+                self._columns = None
+                self._known_columns = None
+                self._colnames = None
+                self._column_index = None
+
+        return have_exception
+
+    @property
+    def columns(self):
+        """:py:class:`ColumnContainer` of all known columns.
+
+        In lazy mode the first access verifies the complete column
+        catalog against the NetProfiler.
+        """
+        if self._columns is None:
+            with self._columns_lock:
+                if not self._catalog_complete:
+                    self._verify_cache()
+                if self._columns is None:
+                    self._columns = ColumnContainer(self._unique_columns())
+        return self._columns
+
+    @property
+    def colnames(self):
+        """Set of the keys of all known columns."""
+        if self._colnames is None:
+            self._colnames = set(c.key for c in self.columns)
+        return self._colnames
+
     def _unique_columns(self):
         """Pull unique columns from _columns_file (a dict of lists). """
         def unique(seq):
@@ -231,16 +530,35 @@ class NetProfiler(steelscript.common.service.Service):
         res = []
         for c in columns:
             col = Column.from_json(c)
-            if col.ephemeral and hasattr(self, 'columns'):
-                try:
-                    baseid = self.columns[col.key].id
-                    col.baseid = baseid
-                except KeyError:
-                    pass
+            if col.ephemeral:
+                base = self._base_column(col.key)
+                if base is not None:
+                    col.baseid = base.id
 
             res.append(col)
         return res
 
+    def _base_column(self, key):
+        """Return the known column with `key`, None if there is none.
+
+        Only the column data cached so far is searched, so in lazy mode
+        this does not retrieve the complete catalog.  Reports resolve
+        their columns against the triplets of their groupby first.
+        """
+        with self._columns_lock:
+            known = self._columns
+            if known is None:
+                known = self._known_columns
+            if known is None:
+                if getattr(self, '_columns_file', None) is None:
+                    return None
+                known = ColumnContainer(self._unique_columns())
+                self._known_columns = known
+        try:
+            return known[key]
+        except KeyError:
+            return None
+
     def _genareas(self, areas):
         res = list()
         for area in areas:
@@ -264,6 +582,41 @@ class NetProfiler(steelscript.common.service.Service):
             return True
         return version in self.supported_versions
 
+    def set_connection_pool_size(self, maxsize):
+        """Keep up to `maxsize` connections open to the NetProfiler.
+
+        The underlying requests session may be shared by many threads,
+        each running its own reports.  By default only a handful of
+        connections are kept alive and any extra ones are closed after
+        each request, call this to size the pool to the number of
+        threads expected to use this instance.  New adapters with the
+        larger pool are mounted on the session, the pool is never
+        shrunk.
+        """
+        if self._pool_size is not None and self._pool_size >= maxsize:
+            return
+        session = self.conn.conn
+        for prefix in ('https://', 'http://'):
+            retries = session.get_adapter(prefix).max_retries
+            session.mount(prefix, requests.adapters.HTTPAdapter(
+                pool_connections=maxsize, pool_maxsize=maxsize,
+                max_retries=retries))
+        self._pool_size = maxsize
+
+    def reauthenticate(self):
+        """Log in again after the session expired.
+
+        Threads sharing this instance whose requests failed while
+        another one was logging in do not log in again themselves.
+        """
+        generation = self._auth_generation
+        with self._auth_lock:
+            if generation != self._auth_generation:
+                # logged in by another thread while this one waited
+                return
+            super(NetProfiler, self).reauthenticate()
+            self._auth_generation += 1
+
     def get_columns(self, columns, groupby=None, strict=True):
         """Return valid Column objects for list of columns
 
@@ -284,11 +637,18 @@ class NetProfiler(steelscript.common.service.Service):
         """
         res = list()
         if groupby:
-            groupby_cols = self.search_columns(groupbys=[groupby])
+            groupby_ids, groupby_keys = self._search(groupbys=[groupby])
         else:
-            groupby_cols = None
-
-        colnames = self.colnames
+            groupby_ids, groupby_keys = None, None
+
+        if groupby_ids and not self._catalog_complete:
+            # lazy mode, try to resolve against the groupby triplets
+            # before falling back to the complete catalog
+            index = self._column_index
+            groupby_map = dict((index.column(i).key, index.column(i))
+                               for i in groupby_ids)
+        else:
+            groupby_map = {}
 
         for column in columns:
             if isinstance(column, (str,)):
@@ -310,10 +670,14 @@ class NetProfiler(steelscript.common.service.Service):
                 strid = column['strid']
                 cname = strid.lower()[3:]
 
-            if cname not in colnames:
+            if cname in groupby_map:
+                res.append(groupby_map[cname])
+                continue
+
+            if cname not in self.colnames:
                 raise RvbdException('{0} is not a valid column '
                                     'for this netprofiler'.format(column))
-            if groupby_cols and cname not in groupby_cols:
+            if groupby_keys and cname not in groupby_keys:
                 raise RvbdException('{0} is not a valid column '
                                     'for groupby {1}'.format(column, groupby))
             res.append(self.columns[cname])
@@ -347,24 +711,29 @@ class NetProfiler(steelscript.common.service.Service):
         ============================= ============ ==================
 
         """
-        result = set()
-
-        if realms is None:
-            realms = self.realms
-        if centricities is None:
-            centricities = self.centricities
-        if groupbys is None:
-            groupbys = list(self.groupbys.values())
+        ids, _ = self._search(realms, centricities, groupbys)
+        return [self._column_index.column(i) for i in ids]
 
-        datakeys = list(self._columns_file.data.keys())
-        search_keys = [make_hash(*p) for p in itertools.product(realms,
-                                                                centricities,
-                                                                groupbys)]
+    def _search(self, realms=None, centricities=None, groupbys=None):
+        """Return (ids, keys) frozensets of the columns matching the search.
 
-        keys = [k for k in datakeys if k in search_keys]
-        for key in keys:
-            result.update(x for x in self._columns_file.data[key])
-        return list(result)
+        See :py:meth:`search_columns` for the meaning of the arguments.
+        """
+        if not self._catalog_complete:
+            requested = set(itertools.product(
+                self.realms if realms is None else realms,
+                self.centricities if centricities is None else centricities,
+                (self.groupbys.values() if groupbys is None else groupbys)))
+            self._ensure_triplets([t for t in self._column_triplets()
+                                   if t in requested])
+
+        index = self._column_index
+        if index is None:
+            index = _ColumnIndex(self._columns_file.data, self.realms,
+                                 self.centricities,
+                                 list(self.groupbys.values()))
+            self._column_index = index
+        return index.search(realms, centricities, groupbys)
 
     def logout(self):
         """ Issue logout command to netprofiler machine. """
@@ -373,4 +742,6 @@ class NetProfiler(steelscript.common.service.Service):
                 self.api.common.logout()
             except AttributeError:
                 pass
+            if self._session_key is not None:
+                self._session_cache.remove(self._session_key)
             super(NetProfiler, self).logout()
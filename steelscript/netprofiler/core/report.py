@@ -10,32 +10,51 @@ This module defines NetProfiler Report and Query objects which provide
 access to running reports and retrieving data from a NetProfiler.
 """
 
+import json
 import logging
 import time
+import random
+import datetime
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 # import types
 from io import StringIO
 
 from steelscript.common.api_helpers import APIVersion
 from steelscript.common.timeutils import (parse_timedelta, datetime_to_seconds,
-                                          timedelta_total_seconds)
+                                          timedelta_total_seconds,
+                                          sec_string_to_datetime)
 from steelscript.common.datastructures import RecursiveUpdateDict
 from steelscript.common.exceptions import RvbdException, RvbdHTTPException
 
 from steelscript.netprofiler.core.filters import TimeFilter, TrafficFilter
 from steelscript.netprofiler.core._exceptions import ProfilerException
 from steelscript.netprofiler.core._types import Column, ColumnContainer
+from steelscript.netprofiler.core._jsonstream import iter_array_member
+from steelscript.netprofiler.core.instrumentation import phase, decode_rows
 
 __all__ = ['TrafficSummaryReport',
            'TrafficOverallTimeSeriesReport',
            'TrafficTimeSeriesReport',
            'TrafficFlowListReport',
            'HostTimeSeriesReport',
+           'IncrementalTimeSeries',
+           'ChunkPolicy',
            'WANSummaryReport',
            'WANTimeSeriesReport',
-           'IdentityReport']
+           'IdentityReport',
+           'ReportBatch']
 
 logger = logging.getLogger(__name__)
 
+# Default number of rows retrieved per request by QueryPager
+DEFAULT_PAGE_SIZE = 10000
+
+
+def _params_key(params):
+    """Return a string identifying query data request `params`."""
+    return json.dumps(params, sort_keys=True)
+
 
 class Query(object):
     """This class represents a netprofiler query instance.
@@ -54,8 +73,15 @@ class Query(object):
         # find the columns in json which indicate they are 'available'
         # or have been computed as part of the request
         strict = report.strict_columns
-        self.available_columns = self.report.profiler.get_columns(acols,
-                                                                  strict=strict)
+        profiler = self.report.profiler
+        try:
+            # with the groupby, lazy catalogs only fetch its triplets
+            self.available_columns = profiler.get_columns(
+                acols, groupby=json.get('group_by'), strict=strict)
+        except RvbdException:
+            # NetProfiler may list columns outside of the groupby
+            self.available_columns = profiler.get_columns(acols,
+                                                          strict=strict)
         if self.columns is None:
             self.columns = self.available_columns
 
@@ -63,6 +89,16 @@ class Query(object):
         self.data = None
         self.data_selected_columns = None
 
+        # raw values and totals retrieved so far, by column id
+        self._column_values = dict()
+        self._column_totals = dict()
+        # key column values of each row in the store, used to match the
+        # rows of later retrievals; None if rows cannot be matched
+        self._row_keys = None
+        self._column_limit = None
+        self._column_members = dict()
+        self._lock = threading.RLock()
+
     def _select_columns(self, columns, ephemeral=True):
         """Return a set of column objects representing the requested columns."""
 
@@ -166,33 +202,44 @@ class Query(object):
         else:
             return self._select_columns(self.columns)
 
-    def _to_native(self, row, columns):
-        legend = self.get_legend(columns)
-        for i, x in enumerate(row):
-            try:
-                if (legend[i].json['type'] == 'float' or
-                    legend[i].json['type'] in 'reltime' or
-                    legend[i].json['rate'] == 'opt'):
-                    row[i] = float(x)
-                elif legend[i].json['type'] == 'int':
-                    row[i] = int(x)
-            except ValueError:
-                # netprofiler bug, %reduct columns labeled as ints
-                # hostgroup "123:10" lableled as ints
-                pass
-
-        return row
-
-    def _get_querydata(self, columns=None, limit=None):
-        """Get the query data."""
-        columns = self.get_legend(columns)
-
-        # if we already got this data do not get it again
-        changed = (self.data_selected_columns is None or
-                   self.data_selected_columns != columns)
-        if not changed:
-            return
+    @staticmethod
+    def _row_decoder(legend):
+        """Return a function converting raw rows of `legend` to native types.
 
+        The type of each column is resolved once here, so decoding a
+        row only touches the cells that need converting.
+        """
+        converters = []
+        for i, col in enumerate(legend):
+            if (col.type == 'float' or
+                    col.type == 'time' or
+                    col.type == 'reltime' or
+                    col.rate == 'opt'):
+                converters.append((i, float))
+            elif col.type == 'int':
+                converters.append((i, int))
+
+        def decode(row):
+            # rows may be shorter than the legend, converters are in
+            # column order so stop at the end of the row
+            n = len(row)
+            for i, convert in converters:
+                if i >= n:
+                    break
+                try:
+                    row[i] = convert(row[i])
+                except ValueError:
+                    # netprofiler bug, %reduct columns labeled as ints
+                    # hostgroup "123:10" lableled as ints
+                    pass
+            return row
+
+        return decode
+
+    def _to_native(self, row, columns=None):
+        return self._row_decoder(self.get_legend(columns))(row)
+
+    def _query_params(self, columns, limit, offset=None):
         params = {}
 
         if columns:
@@ -201,35 +248,268 @@ class Query(object):
         if limit:
             params['limit'] = limit
 
-        if not params:
-            params = None
-        self.querydata = self.report.profiler.api.report.queries(self.report.id,
-                                                                 self.id,
-                                                                 params=params)
-        if 'data' in self.querydata:
-            self.data = self.querydata['data']
+        if offset:
+            params['offset'] = offset
+
+        return params or None
+
+    def _clear_columns(self):
+        self._column_values.clear()
+        self._column_totals.clear()
+        self._row_keys = None
+
+    def _key_columns(self):
+        """Return the key columns identifying the rows of this query."""
+        return [col for col in self.get_legend() if col.iskey]
+
+    def _match_rows(self, row_keys):
+        """Return the positions in `row_keys` of the rows of the store.
+
+        None if the rows are not the same, or cannot be told apart.
+        """
+        if row_keys is None or self._row_keys is None:
+            return None
+        if len(row_keys) != len(self._row_keys):
+            return None
+        positions = dict()
+        for i, key in enumerate(row_keys):
+            positions.setdefault(key, i)
+        try:
+            return [positions[key] for key in self._row_keys]
+        except KeyError:
+            return None
+
+    def _fetch_columns(self, columns, limit):
+        """Retrieve `columns` and add their values to the column store.
+
+        The key columns are retrieved along with `columns`, rows are
+        matched on them with the rows already in the store.  Returns
+        False, leaving the store as is, if they do not match.
+        """
+        keys = self._key_columns()
+        ids = set(col.id for col in columns)
+        columns = list(columns) + [col for col in keys if col.id not in ids]
+
+        params = self._query_params(columns, limit)
+        querydata = self.report._cached_querydata(self, params)
+        if querydata is None:
+            with phase(self.report.profiler, 'fetch', query_id=self.id,
+                       **self.report._phase_fields()) as event:
+                querydata = self.report.profiler.api.report.queries(
+                    self.report.id, self.id, params=params)
+                event.rows = len(querydata.get('data') or [])
+            self.report._cache_querydata(self, params, querydata)
+
+        rows = querydata.get('data') or []
+        if rows:
+            values = list(zip(*rows))
         else:
-            self.data = []
-            
-        self.data_selected_columns = columns
+            values = [()] * len(columns)
+
+        fetched = [col.id for col in columns]
+        key_index = [fetched.index(col.id) for col in keys]
+        row_keys = None
+        if key_index:
+            row_keys = list(zip(*[values[i] for i in key_index]))
+            if len(set(row_keys)) != len(row_keys):
+                # rows cannot be told apart by their keys
+                row_keys = None
+
+        if self._column_values:
+            order = self._match_rows(row_keys)
+            if order is None:
+                return False
+            values = [tuple(v[i] for i in order) for v in values]
+        else:
+            self._row_keys = row_keys
+
+        totals = querydata.get('totals')
+        for i, col in enumerate(columns):
+            self._column_values[col.id] = values[i]
+            if totals is not None:
+                self._column_totals[col.id] = totals[i]
+        self._column_members = dict((k, v) for k, v in querydata.items()
+                                    if k not in ('data', 'totals'))
         logger.debug(
             'Retrieved query data for '
             'query id {0} and column {1}'.format(self.id, columns))
+        return True
+
+    def _get_querydata(self, columns=None, limit=None):
+        """Get the query data, returning the legend and query data.
+
+        Raw values are kept per column id, so requesting a different
+        set of columns only retrieves the columns not seen before, along
+        with the key columns their rows are matched on.
+        """
+        columns = self.get_legend(columns)
+
+        with self._lock:
+            # if we already got this data do not get it again
+            if (self.data_selected_columns == columns and
+                    self._column_limit == limit):
+                return columns, self.querydata
+
+            if limit != self._column_limit:
+                self._clear_columns()
+                self._column_limit = limit
+
+            missing = [col for col in columns
+                       if col.id not in self._column_values]
+            if missing and not self._fetch_columns(missing, limit):
+                # the rows changed since other columns were retrieved,
+                # or cannot be matched, retrieve the whole selection
+                self._clear_columns()
+                self._fetch_columns(columns, limit)
+
+            querydata = dict(self._column_members)
+            querydata['data'] = [
+                list(row) for row in
+                zip(*[self._column_values[col.id] for col in columns])]
+            if all(col.id in self._column_totals for col in columns):
+                querydata['totals'] = [self._column_totals[col.id]
+                                       for col in columns]
+
+            self.querydata = querydata
+            self.data = querydata['data']
+            self.data_selected_columns = columns
+            return columns, querydata
+
+    def _stream_querydata(self, columns=None, limit=None):
+        """Iterate over decoded rows as they are read off the response.
+
+        Rows are not kept on the query; once all rows have been read,
+        the remaining members of the response (such as totals) are
+        stored in `querydata`.
+        """
+        columns = self.get_legend(columns)
+        params = self._query_params(columns, limit)
+        self.report._ensure_live()
+        chunks = self.report.profiler.api.report.queries_stream(
+            self.report.id, self.id, params=params)
+
+        # drop any previously fetched data, it is not kept when streaming
+        self.data = None
+        self.data_selected_columns = None
+
+        decode = self._row_decoder(columns)
+        members = {}
+        yield from decode_rows(self.report.profiler,
+                               iter_array_member(chunks, 'data', members),
+                               decode, query_id=self.id,
+                               **self.report._phase_fields())
+
+        self.querydata = members
+        logger.debug(
+            'Streamed query data for '
+            'query id {0} and column {1}'.format(self.id, columns))
 
-    def get_iterdata(self, columns=None, limit=None):
-        """Iterate over the query data."""
-        self._get_querydata(columns, limit)
-        for row in self.data:
-            yield self._to_native(row, columns)
+    def get_iterdata(self, columns=None, limit=None, stream=False):
+        """Iterate over the query data.
+
+        :param bool stream: if True, rows are decoded incrementally
+            from the response as it is received instead of loading the
+            full result first.  Streamed rows are not cached on the query.
+        """
+        if stream:
+            return self._stream_querydata(columns, limit)
+        return self._iter_querydata(columns, limit)
+
+    def _iter_querydata(self, columns=None, limit=None):
+        legend, querydata = self._get_querydata(columns, limit)
+        # resolve the legend once for the whole result
+        decode = self._row_decoder(legend)
+        yield from decode_rows(self.report.profiler, querydata['data'],
+                               decode, query_id=self.id,
+                               **self.report._phase_fields())
 
     def get_data(self, columns=None, limit=None):
         """Generate list from get_iterdata."""
         return list(self.get_iterdata(columns, limit))
 
+    def get_pages(self, columns=None, page_size=DEFAULT_PAGE_SIZE,
+                  prefetch=True, limit=None):
+        """Return a :class:`QueryPager` over the query data.
+
+        :param int page_size: number of rows requested per page
+
+        :param bool prefetch: if True, request the next page in the
+            background while the current one is being consumed
+
+        :param integer limit: Upper limit of rows to retrieve in total.
+        """
+        return QueryPager(self, columns, page_size, prefetch, limit)
+
+    @staticmethod
+    def _column_array(values, col):
+        """Convert the raw `values` of `col` into a typed numpy array."""
+        import numpy
+
+        if (col.type == 'float' or
+                col.type == 'time' or
+                col.type == 'reltime' or
+                col.rate == 'opt'):
+            dtype = numpy.float64
+        elif col.type == 'int':
+            dtype = numpy.int64
+        else:
+            return values.astype(object)
+
+        try:
+            return values.astype(dtype)
+        except ValueError:
+            # netprofiler bug, %reduct columns labeled as ints
+            # hostgroup "123:10" lableled as ints, fall back to
+            # converting what we can and keeping the rest as returned
+            res = numpy.empty(len(values), dtype=object)
+            for i, x in enumerate(values.tolist()):
+                try:
+                    res[i] = dtype(x).item()
+                except ValueError:
+                    res[i] = x
+            return res
+
+    def get_columnar(self, columns=None, limit=None):
+        """Return the query data as a dict of numpy arrays, one per column.
+
+        Arrays are keyed by column key (or label for ephemeral columns)
+        in legend order.  Float and int columns are decoded straight
+        into float64 and int64 arrays without building a Python object
+        per cell, other columns are returned as object arrays.
+        """
+        import numpy
+
+        legend, querydata = self._get_querydata(columns, limit)
+
+        with phase(self.report.profiler, 'decode', query_id=self.id,
+                   rows=len(querydata['data']),
+                   **self.report._phase_fields()):
+            if querydata['data']:
+                raw = numpy.asarray(querydata['data'], dtype=str)
+            else:
+                raw = numpy.empty((0, len(legend)), dtype=str)
+
+            res = dict()
+            for i, col in enumerate(legend):
+                name = col.label if col.ephemeral else col.key
+                res[name] = self._column_array(raw[:, i], col)
+        return res
+
+    def get_dataframe(self, columns=None, limit=None):
+        """Return the query data as a pandas DataFrame.
+
+        See :py:meth:`get_columnar` for how columns are named and typed.
+        """
+        import pandas
+
+        return pandas.DataFrame(self.get_columnar(columns, limit))
+
     def get_totals(self, columns=None):
         """Return the totals associated with the requested columns."""
-        self._get_querydata(columns)
-        return self._to_native(self.querydata['totals'])
+        # totals do not depend on the row limit, reuse what was retrieved
+        legend, querydata = self._get_querydata(columns, self._column_limit)
+        decode = self._row_decoder(legend)
+        return decode(list(querydata['totals']))
 
     def all_columns(self):
         """Returns all the columns available for this query.
@@ -243,6 +523,132 @@ class Query(object):
         return self.available_columns
 
 
+class PollBackoff(object):
+    """Delays between report status polls.
+
+    Polling starts quickly so short reports return early and backs off
+    exponentially, up to `maximum` seconds, for long running ones.  If
+    the appliance estimates more time remaining than the current delay,
+    that estimate is used instead (still capped at `maximum`).  Each
+    delay is randomized by +/- `jitter` so many reports started at once
+    do not poll in lock step.
+    """
+    def __init__(self, initial=0.2, maximum=10, factor=1.5, jitter=0.1):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self._delay = initial
+
+    def reset(self):
+        self._delay = self.initial
+
+    def next_delay(self, status=None):
+        """Return the number of seconds to wait before the next poll.
+
+        :param dict status: last status returned by the appliance
+        """
+        delay = self._delay
+        self._delay = min(self._delay * self.factor, self.maximum)
+
+        if status and status.get('remaining_seconds'):
+            delay = max(delay, float(status['remaining_seconds']))
+        delay = min(delay, self.maximum)
+
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+
+class QueryPager(object):
+    """Iterate over the data of a query one page at a time.
+
+    Each page is a list of decoded rows retrieved with a separate
+    offset/limit request, so only one page (two when prefetching) is
+    held in memory.  Iterating yields pages, :py:meth:`rows` yields
+    individual rows.  `totals` is set from the first page retrieved.
+    """
+    def __init__(self, query, columns=None, page_size=DEFAULT_PAGE_SIZE,
+                 prefetch=True, limit=None):
+        if page_size <= 0:
+            raise ValueError('page_size must be a positive integer')
+        self.query = query
+        self.columns = query.get_legend(columns)
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.limit = limit
+        self.totals = None
+        self._decode = query._row_decoder(self.columns)
+
+    def _fetch(self, offset, size):
+        query = self.query
+        params = query._query_params(self.columns, size, offset)
+        query.report._ensure_live()
+        with phase(query.report.profiler, 'fetch', query_id=query.id,
+                   **query.report._phase_fields()) as event:
+            querydata = query.report.profiler.api.report.queries(
+                query.report.id, query.id, params=params)
+            event.rows = len(querydata.get('data') or [])
+        logger.debug('Retrieved page of query id {0} at offset {1}, '
+                     '{2} rows'.format(query.id, offset,
+                                       len(querydata.get('data', []))))
+        return querydata
+
+    def _windows(self):
+        offset = 0
+        while self.limit is None or offset < self.limit:
+            size = self.page_size
+            if self.limit is not None:
+                size = min(size, self.limit - offset)
+            yield offset, size
+            offset += size
+
+    def __iter__(self):
+        windows = self._windows()
+        executor = None
+        if self.prefetch:
+            executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            offset, size = next(windows)
+            pending = None
+            first = True
+            current = self._fetch(offset, size)
+            while True:
+                data = current.get('data', [])
+                last = len(data) < size
+                if not last:
+                    try:
+                        offset, size = next(windows)
+                    except StopIteration:
+                        last = True
+                if not last and executor is not None:
+                    # overlap the next request with the caller
+                    pending = executor.submit(self._fetch, offset, size)
+
+                if self.totals is None and 'totals' in current:
+                    self.totals = self._decode(current['totals'])
+                if data or first:
+                    yield [self._decode(row) for row in data]
+                first = False
+
+                if last:
+                    return
+                if pending is not None:
+                    current = pending.result()
+                    pending = None
+                else:
+                    current = self._fetch(offset, size)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def rows(self):
+        """Iterate over all rows, page by page."""
+        for page in self:
+            for row in page:
+                yield row
+
+
 class Report(object):
     """Base class for all NetProfiler reports.
 
@@ -270,6 +676,9 @@ class Report(object):
 
         self.profiler = profiler
 
+        # set once the report is created on NetProfiler
+        self.id = None
+
         self.template_id = None
         self.timefilter = None
         self.resolution = None
@@ -281,11 +690,44 @@ class Report(object):
         self.query = None
         self.queries = list()
 
+        # result cache state, see _post
+        self._to_post = None
+        self._cache_key = None
+        self._cache_entry = None
+        self._cache_hit = False
+        self._queries_json = None
+
+        # consumers holding the report, see acquire()
+        self._holders = 0
+        self._holders_lock = threading.Lock()
+
     def __enter__(self):
-        return self
+        return self.acquire()
 
     def __exit__(self, instype, value, traceback):
-        self.delete()
+        self.release()
+
+    def acquire(self):
+        """Register a consumer of this report and return the report.
+
+        The report is kept on NetProfiler until every consumer has
+        called :py:meth:`release`, so several consumers can retrieve
+        different columns from the same report.  Using the report as a
+        context manager acquires it on entry and releases it on exit.
+        """
+        with self._holders_lock:
+            self._holders += 1
+        return self
+
+    def release(self):
+        """Release a consumer, deleting the report after the last one."""
+        with self._holders_lock:
+            if self._holders <= 0:
+                raise ValueError("Report released more times than acquired")
+            self._holders -= 1
+            last = (self._holders == 0)
+        if last:
+            self.delete()
 
     def run(self, template_id, timefilter=None, resolution="auto",
             query=None, trafficexpr=None, data_filter=None, sync=True,
@@ -327,6 +769,9 @@ class Report(object):
         self.id = None
         self.queries = list()
         self.last_status = None
+        self._cache_key = None
+        self._cache_entry = None
+        self._cache_hit = False
 
         if resolution not in ["auto", "1min", "15min", "hour",
                               "6hour", "day", "week", "month"]:
@@ -363,8 +808,51 @@ class Report(object):
 
         logger.debug("Posting JSON: %s" % to_post)
 
-        response = self.profiler.api.report.reports(data=to_post)
+        return self._post(to_post, sync)
 
+    def _post(self, to_post, sync):
+        """Create the report from `to_post` and optionally wait for it.
+
+        If the NetProfiler has a result cache holding a report with the
+        same criteria, nothing is posted and the cached results are used.
+        Reports whose time frame has not ended yet bypass the cache.
+        """
+        self._to_post = to_post
+        cache = getattr(self.profiler, 'result_cache', None)
+        if cache is not None and cache.cacheable(to_post):
+            self._cache_key = cache.make_key(to_post, self.profiler.host,
+                                             self.profiler.port)
+            entry = cache.get(self._cache_key)
+            if entry is not None:
+                logger.info("Using cached results of report %s"
+                            % entry['id'])
+                self.id = entry['id']
+                self._cache_entry = entry
+                self._cache_hit = True
+                self.last_status = self._cached_status()
+                return
+
+        with phase(self.profiler, 'post', **self._phase_fields()) as event:
+            response = self.profiler.api.report.reports(data=to_post)
+            self._set_id(response)
+            event.report_id = self.id
+
+        if sync:
+            self.wait_for_complete()
+
+    def _phase_fields(self):
+        """Return the report id, realm and groupby of instrumentation
+        events."""
+        query = None
+        if self._to_post is not None:
+            query = self._to_post.get('criteria', {}).get('query')
+        if not isinstance(query, dict):
+            query = {}
+        return {'report_id': getattr(self, 'id', None),
+                'realm': query.get('realm'),
+                'groupby': query.get('group_by')}
+
+    def _set_id(self, response):
         try:
             self.id = int(response['id'])
         except KeyError:
@@ -374,29 +862,53 @@ class Report(object):
 
         logger.info("Created report %d" % self.id)
 
-        if sync:
-            self.wait_for_complete()
-
-    def wait_for_complete(self, interval=1, timeout=600):
+    def wait_for_complete(self, interval=None, timeout=600, callback=None,
+                          backoff=None):
         """Periodically checks report status and returns when 100% complete.
-        """
-        complete = False
-        percent = 100
-        start = time.process_time()
-        while (time.process_time() - start) < timeout:
-            s = self.status()
 
-            if s['status'] == 'completed':
-                logger.info("Report %d complete" % self.id)
-                complete = True
-                break
+        :param float interval: if set, poll at this fixed interval in
+            seconds.  By default the interval adapts, see
+            :class:`PollBackoff`.
+
+        :param float timeout: wall clock seconds to wait before giving up
+
+        :param callback: optional function called with each status dict
+            as it is polled, useful to report progress
 
-            if int(s['percent']) != percent:
-                percent = s['percent']
-                logger.info("Report %d %d%% complete, remaining %d" %
-                            (self.id, percent, s['remaining_seconds']))
+        :param backoff: :class:`PollBackoff` instance to use instead of
+            the default adaptive policy
+        """
+        if interval is None and backoff is None:
+            backoff = PollBackoff()
 
-            time.sleep(interval)
+        complete = False
+        percent = 100
+        deadline = time.monotonic() + timeout
+        with phase(self.profiler, 'poll', **self._phase_fields()):
+            while True:
+                s = self.status()
+                if callback is not None:
+                    callback(s)
+
+                if s['status'] == 'completed':
+                    logger.info("Report %d complete" % self.id)
+                    complete = True
+                    break
+
+                if int(s['percent']) != percent:
+                    percent = s['percent']
+                    logger.info("Report %d %d%% complete, remaining %d" %
+                                (self.id, percent, s['remaining_seconds']))
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                if interval is not None:
+                    delay = interval
+                else:
+                    delay = backoff.next_delay(s)
+                time.sleep(min(delay, remaining))
 
         if not complete:
             logger.warning("Timed out waiting for report %d to complete,"
@@ -418,18 +930,81 @@ class Report(object):
         if not self.id:
             return None
 
+        if self._cache_hit:
+            return self._cached_status()
+
         self.last_status = self.profiler.api.report.status(self.id)
 
         return self.last_status
 
+    @staticmethod
+    def _cached_status():
+        return {'status': 'completed',
+                'percent': 100,
+                'remaining_seconds': 0}
+
+    def _ensure_live(self):
+        """Run the report on NetProfiler if its results came from cache.
+
+        Used when data that was not cached is requested.  The cached
+        queries are updated in place to point to the new report.
+        """
+        if not self._cache_hit:
+            return
+
+        logger.info("Cached results of report %s are incomplete, "
+                    "running it on NetProfiler" % self.id)
+        response = self.profiler.api.report.reports(data=self._to_post)
+        self._cache_hit = False
+        self._set_id(response)
+        self.wait_for_complete()
+
+        data = self.profiler.api.report.queries(self.id)
+        for query, query_json in zip(self.queries, data):
+            query.id = query_json['id']
+        # keep what was cached, later results are added to it
+        self._cache_entry = dict(self._cache_entry, id=self.id, queries=data)
+
+    def _cached_querydata(self, query, params):
+        """Return the cached query data for `params`, None if not cached."""
+        if self._cache_entry is None:
+            return None
+
+        index = self.queries.index(query)
+        querydata = self._cache_entry['data'][index].get(_params_key(params))
+        if querydata is None:
+            self._ensure_live()
+        return querydata
+
+    def _cache_querydata(self, query, params, querydata):
+        """Add the query data retrieved for `params` to the result cache."""
+        if (self._cache_key is None or self.last_status is None or
+                self.last_status['status'] != 'completed'):
+            # only complete results are worth keeping
+            return
+
+        if self._cache_entry is None:
+            self._cache_entry = {
+                'id': self.id,
+                'queries': self._queries_json,
+                'data': [dict() for _ in self._queries_json]}
+
+        index = self.queries.index(query)
+        self._cache_entry['data'][index][_params_key(params)] = querydata
+        self.profiler.result_cache.put(self._cache_key, self._cache_entry)
+
     def _load_queries(self, columns=None):
         if not self.id:
             raise ValueError("No id set, must run a report"
                              "or attach to an existing report first")
 
-        data = self.profiler.api.report.queries(self.id)
-        for json in data:
-            self.queries.append(Query(self, json, columns))
+        if self._cache_hit:
+            data = self._cache_entry['queries']
+        else:
+            data = self.profiler.api.report.queries(self.id)
+        self._queries_json = data
+        for query_json in data:
+            self.queries.append(Query(self, query_json, columns))
 
         logger.debug("Report %d: loaded %d queries"
                      % (self.id, len(data)))
@@ -459,16 +1034,19 @@ class Report(object):
         query = self.get_query_by_index(index)
         return query.get_legend(columns)
 
-    def get_iterdata(self, index=0, columns=None, limit=None):
+    def get_iterdata(self, index=0, columns=None, limit=None, stream=False):
         """Retrieve iterator for the result data.
 
         If `columns` is specified, restrict the legend to the list of
         requested columns.
 
         :param integer limit: Upper limit of rows of the result data.
+
+        :param bool stream: if True, decode rows incrementally from the
+            response instead of loading the whole result into memory.
         """
         query = self.get_query_by_index(index)
-        return query.get_iterdata(columns, limit)
+        return query.get_iterdata(columns, limit, stream)
 
     def get_data(self, index=0, columns=None, limit=None):
         """Retrieve data for this report.
@@ -481,6 +1059,35 @@ class Report(object):
         query = self.get_query_by_index(index)
         return query.get_data(columns, limit)
 
+    def get_pages(self, index=0, columns=None, page_size=DEFAULT_PAGE_SIZE,
+                  prefetch=True, limit=None):
+        """Retrieve a :class:`QueryPager` over the result data.
+
+        See :py:meth:`Query.get_pages`.
+        """
+        query = self.get_query_by_index(index)
+        return query.get_pages(columns, page_size, prefetch, limit)
+
+    def get_columnar(self, index=0, columns=None, limit=None):
+        """Retrieve data for this report as a dict of numpy arrays.
+
+        See :py:meth:`Query.get_columnar`.
+
+        :param integer limit: Upper limit of rows of the result data.
+        """
+        query = self.get_query_by_index(index)
+        return query.get_columnar(columns, limit)
+
+    def get_dataframe(self, index=0, columns=None, limit=None):
+        """Retrieve data for this report as a pandas DataFrame.
+
+        See :py:meth:`Query.get_columnar`.
+
+        :param integer limit: Upper limit of rows of the result data.
+        """
+        query = self.get_query_by_index(index)
+        return query.get_dataframe(columns, limit)
+
     def get_totals(self, index=0, columns=None):
         """Retrieve the totals for this report.
 
@@ -492,6 +1099,9 @@ class Report(object):
 
     def delete(self):
         """Issue a call to NetProfiler delete this report."""
+        if self._cache_hit:
+            # the report was never run on NetProfiler
+            return
         try:
             self.profiler.api.report.delete(self.id)
         except:
@@ -533,13 +1143,13 @@ class MultiQueryReport(Report):
         self.template_id = template_id
         self.columns = columns
 
-        super(MultiQueryReport, self).run(template_id,
-                                          timefilter=timefilter,
-                                          resolution="auto",
-                                          query=None,
-                                          trafficexpr=trafficexpr,
-                                          data_filter=data_filter,
-                                          sync=True)
+        return super(MultiQueryReport, self).run(template_id,
+                                                 timefilter=timefilter,
+                                                 resolution="auto",
+                                                 query=None,
+                                                 trafficexpr=trafficexpr,
+                                                 data_filter=data_filter,
+                                                 sync=True)
 
     def get_query_names(self):
         """Return full name of each query in report."""
@@ -679,14 +1289,14 @@ class SingleQueryReport(Report):
                                         "time series report")
 
             query['limit'] = limit
-        super(SingleQueryReport, self).run(template_id=184,
-                                           timefilter=timefilter,
-                                           resolution=resolution,
-                                           query=query,
-                                           trafficexpr=trafficexpr,
-                                           data_filter=data_filter,
-                                           sync=sync,
-                                           custom_criteria=custom_criteria)
+        return super(SingleQueryReport, self).run(template_id=184,
+                                                  timefilter=timefilter,
+                                                  resolution=resolution,
+                                                  query=query,
+                                                  trafficexpr=trafficexpr,
+                                                  data_filter=data_filter,
+                                                  sync=sync,
+                                                  custom_criteria=custom_criteria)
 
     def _load_queries(self, columns=None):
         super(SingleQueryReport, self)._load_queries(columns)
@@ -694,14 +1304,27 @@ class SingleQueryReport(Report):
     def get_legend(self, columns=None):
         return super(SingleQueryReport, self).get_legend(0, columns)
 
-    def get_iterdata(self, columns=None, limit=None):
+    def get_iterdata(self, columns=None, limit=None, stream=False):
         return super(SingleQueryReport, self).get_iterdata(
-            0, columns, limit or self._limit)
+            0, columns, limit or self._limit, stream)
 
     def get_data(self, columns=None, limit=None):
         return super(SingleQueryReport, self).get_data(
             0, columns, limit or self._limit)
 
+    def get_pages(self, columns=None, page_size=DEFAULT_PAGE_SIZE,
+                  prefetch=True, limit=None):
+        return super(SingleQueryReport, self).get_pages(
+            0, columns, page_size, prefetch, limit or self._limit)
+
+    def get_columnar(self, columns=None, limit=None):
+        return super(SingleQueryReport, self).get_columnar(
+            0, columns, limit or self._limit)
+
+    def get_dataframe(self, columns=None, limit=None):
+        return super(SingleQueryReport, self).get_dataframe(
+            0, columns, limit or self._limit)
+
 
 class TrafficSummaryReport(SingleQueryReport):
     """
@@ -728,22 +1351,92 @@ class TrafficSummaryReport(SingleQueryReport):
             centricity=centricity, area=area, sync=sync, limit=limit)
 
 
+class ChunkPolicy(object):
+    """Policy splitting a long time range into sub-ranges run in parallel.
+
+    Sub-ranges are aligned to the report resolution so no bucket
+    straddles two of them.  See :meth:`TrafficOverallTimeSeriesReport.run`.
+    """
+    def __init__(self, duration, max_workers=4):
+        """
+        :param duration: length of each sub-range, a timedelta or a
+            string such as '1 day', rounded down to a whole number of
+            resolution buckets
+
+        :param int max_workers: maximum number of sub-range reports
+            running at the same time
+        """
+        if not isinstance(duration, datetime.timedelta):
+            duration = parse_timedelta(duration)
+        self.seconds = int(timedelta_total_seconds(duration))
+        if self.seconds <= 0:
+            raise ValueError('duration must be positive')
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+        self.max_workers = max_workers
+
+    def split(self, timefilter, step=60):
+        """Return the list of TimeFilters covering `timefilter`.
+
+        As with :meth:`TimeFilter.profiler_minutes`, the range is first
+        rounded down to whole buckets of `step` seconds, a range shorter
+        than one bucket covering the bucket of its end.
+        """
+        start = datetime_to_seconds(timefilter.start) // step * step
+        end = datetime_to_seconds(timefilter.end) // step * step
+        if end <= start:
+            start, end = end, end + step
+
+        size = max(step, self.seconds // step * step)
+        res = []
+        t = start
+        while t < end:
+            res.append(TimeFilter(sec_string_to_datetime(t),
+                                  sec_string_to_datetime(min(t + size, end))))
+            t += size
+        return res
+
+
 class TrafficOverallTimeSeriesReport(SingleQueryReport):
     """
     """
     def __init__(self, profiler):
         """Create an overall time series report."""
         super(TrafficOverallTimeSeriesReport, self).__init__(profiler)
+        self._chunked_legend = None
+        self._chunked_data = None
 
     def run(self, columns,
             timefilter=None, trafficexpr=None,
-            resolution="auto", centricity="hos", area=None, sync=True):
+            resolution="auto", centricity="hos", area=None, sync=True,
+            chunk_policy=None):
         """See :meth:`SingleQueryReport.run` for a description of the keyword
         arguments.
 
+        :param chunk_policy: optional :class:`ChunkPolicy`.  If set, the
+            time range is split into sub-ranges, each run as a separate
+            report concurrently.  Their rows are merged in time order,
+            with duplicate buckets at sub-range edges dropped.  The
+            sub-reports are deleted and the merged data is held by this
+            report for :meth:`get_data` and :meth:`get_iterdata`, so
+            `sync` must be True.  Requires a fixed resolution and the
+            time column.
+
         Note that `sort_col`, `groupby`, and `host_group_type` are not
         applicable to this report type.
         """
+        self._chunked_legend = None
+        self._chunked_data = None
+        if chunk_policy is not None:
+            if not sync:
+                raise ValueError("Chunked reports can only run "
+                                 "synchronously")
+            return self._run_chunked(chunk_policy, columns,
+                                     timefilter=timefilter,
+                                     trafficexpr=trafficexpr,
+                                     resolution=resolution,
+                                     centricity=centricity, area=area)
+
         return super(TrafficOverallTimeSeriesReport, self).run(
             realm='traffic_overall_time_series',
             groupby='tim', columns=columns, sort_col=None,
@@ -751,6 +1444,104 @@ class TrafficOverallTimeSeriesReport(SingleQueryReport):
             host_group_type=None, resolution=resolution,
             centricity=centricity, area=area, sync=sync)
 
+    def _run_chunked(self, chunk_policy, columns, timefilter, resolution,
+                     **kwargs):
+        if resolution == 'auto':
+            raise ValueError("Chunked reports require a fixed resolution")
+        resolution, step = _resolution_seconds(resolution)
+
+        if timefilter is None:
+            timefilter = TimeFilter.parse_range("last 5 min")
+        self.timefilter = timefilter
+        self.resolution = resolution
+        self.trafficexpr = kwargs.get('trafficexpr')
+        self.columns = self.profiler.get_columns(columns, 'tim')
+        self.id = None
+        self.queries = list()
+
+        if 'time' not in [col.key for col in self.columns]:
+            raise ValueError("Chunked reports require the time column")
+
+        def run_chunk(tf):
+            report = TrafficOverallTimeSeriesReport(self.profiler)
+            report.run(columns, timefilter=tf, resolution=resolution,
+                       sync=True, **kwargs)
+            try:
+                return report.get_legend(), report.get_data()
+            finally:
+                report.delete()
+
+        ranges = chunk_policy.split(timefilter, step)
+        logger.info("Running overall time series report in %d chunks"
+                    % len(ranges))
+
+        rows = dict()
+        legend = None
+        with ThreadPoolExecutor(max_workers=chunk_policy.max_workers) as ex:
+            for chunk_legend, data in ex.map(run_chunk, ranges):
+                if legend is None:
+                    legend = chunk_legend
+                    index = [col.key for col in legend].index('time')
+                for row in data:
+                    # buckets on a boundary may come back in both chunks
+                    rows.setdefault(int(row[index]), row)
+
+        self._chunked_legend = legend
+        self._chunked_data = [rows[t] for t in sorted(rows)]
+
+    def get_query_by_index(self, index=0):
+        if self._chunked_data is not None:
+            raise ProfilerException("Chunked reports have no query on "
+                                    "NetProfiler, use get_data()")
+        return super(TrafficOverallTimeSeriesReport,
+                     self).get_query_by_index(index)
+
+    def _chunked_indexes(self, columns):
+        """Return the positions of `columns` in the chunked legend."""
+        keys = [col.key for col in self._chunked_legend]
+        res = []
+        for col in columns:
+            key = col.key if isinstance(col, Column) else col
+            try:
+                res.append(keys.index(key))
+            except ValueError:
+                raise ValueError(
+                    'Invalid column for this report: %s' % col)
+        return res
+
+    def _chunked_rows(self, columns, limit):
+        rows = self._chunked_data[:limit]
+        if not columns:
+            return rows
+        indexes = self._chunked_indexes(columns)
+        return [[row[i] for i in indexes] for row in rows]
+
+    def get_legend(self, columns=None):
+        if self._chunked_data is not None:
+            if not columns:
+                return self._chunked_legend
+            return [self._chunked_legend[i]
+                    for i in self._chunked_indexes(columns)]
+        return super(TrafficOverallTimeSeriesReport, self).get_legend(columns)
+
+    def get_iterdata(self, columns=None, limit=None, stream=False):
+        if self._chunked_data is not None:
+            return iter(self._chunked_rows(columns, limit))
+        return super(TrafficOverallTimeSeriesReport, self).get_iterdata(
+            columns, limit, stream)
+
+    def get_data(self, columns=None, limit=None):
+        if self._chunked_data is not None:
+            return self._chunked_rows(columns, limit)
+        return super(TrafficOverallTimeSeriesReport, self).get_data(
+            columns, limit)
+
+    def delete(self):
+        if self._chunked_data is not None:
+            # the sub-reports were deleted once their data was read
+            return
+        super(TrafficOverallTimeSeriesReport, self).delete()
+
 
 class TrafficTimeSeriesReport(SingleQueryReport):
     """
@@ -833,6 +1624,115 @@ class HostTimeSeriesReport(SingleQueryReport):
             sync=sync)
 
 
+def _resolution_seconds(resolution):
+    """Return the (name, seconds) pair of a fixed `resolution`."""
+    seconds = dict((v, k) for k, v in Report.RESOLUTION_MAP.items())
+    if resolution not in seconds:
+        rd = parse_timedelta(resolution)
+        resolution = Report.RESOLUTION_MAP[int(timedelta_total_seconds(rd))]
+    return resolution, seconds[resolution]
+
+
+class IncrementalTimeSeries(object):
+    """Rolling time series that only retrieves buckets not seen before.
+
+    Each call to :py:meth:`update` returns the rows of the requested
+    time range.  Rows retrieved by earlier calls are kept keyed by
+    their time, and only the range past what was covered so far is run
+    as a new report.  Sliding a one hour window forward by one minute
+    then costs a one minute report instead of a one hour one.
+    Example::
+
+        >>> series = IncrementalTimeSeries(
+        ...     TrafficOverallTimeSeriesReport(p), resolution='1min',
+        ...     columns=['time', 'avg_bytes'])
+        >>> while True:
+        ...     rows = series.update(TimeFilter.parse_range('last 1 hour'))
+        ...     time.sleep(60)
+
+    """
+    def __init__(self, report, resolution='1min', **kwargs):
+        """
+        :param report: time series report used to retrieve new data,
+            such as a :class:`TrafficOverallTimeSeriesReport` or
+            :class:`HostTimeSeriesReport`.  Its legend must include
+            the time column.
+
+        :param str resolution: data resolution, 'auto' is not allowed
+            as buckets must line up between reports
+
+        Other keyword arguments are passed to the ``run`` method of
+        `report` on every update.
+        """
+        if resolution == 'auto':
+            raise ValueError("IncrementalTimeSeries requires a fixed "
+                             "resolution")
+
+        self.report = report
+        self.resolution, self.step = _resolution_seconds(resolution)
+        self.run_kwargs = kwargs
+        self.reset()
+
+    def reset(self):
+        """Forget all retrieved rows."""
+        self._rows = dict()
+        # range covered by the retrieved rows, as reported by NetProfiler
+        self._t0 = None
+        self._t1 = None
+
+    def _fetch(self, start, end):
+        timefilter = TimeFilter(sec_string_to_datetime(start),
+                                sec_string_to_datetime(end))
+        logger.debug("Retrieving time series from %s to %s"
+                     % (start, end))
+        self.report.run(timefilter=timefilter, resolution=self.resolution,
+                        sync=True, **self.run_kwargs)
+        try:
+            legend = self.report.get_legend()
+            index = [i for i, col in enumerate(legend) if col.key == 'time']
+            if not index:
+                raise ValueError("IncrementalTimeSeries requires the time "
+                                 "column in the report legend")
+            index = index[0]
+            query = self.report.get_query_by_index(0)
+            for row in self.report.get_data():
+                self._rows[int(row[index])] = row
+        finally:
+            self.report.delete()
+
+        # NetProfiler reports the range it actually had data for, what
+        # is past it is requested again on the next update
+        actual_t1 = max(start, min(int(query.actual_t1), end))
+        if self._t0 is None:
+            self._t0 = start
+        self._t1 = max(self._t1 or start, actual_t1)
+
+    def update(self, timefilter):
+        """Return the rows within `timefilter`, retrieving only new data.
+
+        Times are aligned down to the resolution.  If the range starts
+        before the data already retrieved, or after its end, all of it
+        is retrieved again.
+        """
+        start = datetime_to_seconds(timefilter.start) // self.step * self.step
+        end = datetime_to_seconds(timefilter.end) // self.step * self.step
+
+        if self._t0 is None or start < self._t0 or start > self._t1:
+            self.reset()
+            fetch_from = start
+        else:
+            # drop the buckets that slid out of the window
+            for t in [t for t in self._rows if t < start]:
+                del self._rows[t]
+            self._t0 = start
+            fetch_from = self._t1
+
+        if end > fetch_from:
+            self._fetch(fetch_from, end)
+
+        return [self._rows[t] for t in sorted(self._rows) if start <= t < end]
+
+
 class TrafficFlowListReport(SingleQueryReport):
     """
     """
@@ -1224,7 +2124,7 @@ class IdentityReport(SingleQueryReport):
         else:
             data_filter = None
 
-        super(IdentityReport, self).run(
+        return super(IdentityReport, self).run(
             realm=self.id_realm,
             groupby=self.id_groupby,
             columns=self.id_columns,
@@ -1237,6 +2137,127 @@ class IdentityReport(SingleQueryReport):
         )
 
 
+class ReportBatch(object):
+    """Run many reports at once, polling them from one shared loop.
+
+    Reports are posted to NetProfiler with at most `max_concurrent`
+    running at any time.  The status of all running reports is checked
+    in a single loop, and each report's future resolves to the report
+    itself once it completes, ready for get_data() and friends.
+
+    Only reports whose ``run`` accepts ``sync`` can be batched, such as
+    the :class:`SingleQueryReport` subclasses.  Example::
+
+        >>> batch = ReportBatch(max_concurrent=4)
+        >>> hosts = batch.add(TrafficSummaryReport(p), groupby='hos',
+        ...                   columns=['host_ip', 'avg_bytes'])
+        >>> overall = batch.add(TrafficOverallTimeSeriesReport(p),
+        ...                     columns=['time', 'avg_bytes'])
+        >>> batch.run()
+        >>> hosts.result().get_data()
+
+    """
+    def __init__(self, max_concurrent=4, timeout=600, backoff=None):
+        """
+        :param int max_concurrent: maximum number of reports running
+            on the appliance at the same time
+
+        :param float timeout: wall clock seconds each report is given
+            to complete once posted
+
+        :param backoff: :class:`PollBackoff` used between polling rounds
+        """
+        if max_concurrent < 1:
+            raise ValueError('max_concurrent must be at least 1')
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.backoff = backoff or PollBackoff()
+        self._pending = []
+        self._futures = []
+
+    def add(self, report, **kwargs):
+        """Queue `report` to be run with keyword arguments `kwargs`.
+
+        Returns a :class:`concurrent.futures.Future` resolving to the
+        completed report.
+        """
+        future = Future()
+        self._pending.append((report, kwargs, future))
+        self._futures.append(future)
+        return future
+
+    def _start(self, report, kwargs, future):
+        if not future.set_running_or_notify_cancel():
+            return False
+        kwargs = dict(kwargs, sync=False)
+        try:
+            report.run(**kwargs)
+        except Exception as e:
+            self._fail(report, future, e)
+            return False
+        return True
+
+    @staticmethod
+    def _fail(report, future, error):
+        # delete the failed report so that it does not hold a report
+        # slot on the appliance, then record the error.  Reports that
+        # failed before being created have no id.
+        if getattr(report, 'id', None) is not None:
+            try:
+                report.delete()
+            except Exception:
+                logger.exception('Failed to delete report %s' % report.id)
+        future.set_exception(error)
+
+    def run(self):
+        """Run all queued reports, returning their futures once all
+        have completed or failed."""
+        running = []
+        while self._pending or running:
+            started = False
+            while self._pending and len(running) < self.max_concurrent:
+                report, kwargs, future = self._pending.pop(0)
+                if self._start(report, kwargs, future):
+                    deadline = time.monotonic() + self.timeout
+                    running.append((report, future, deadline))
+                    started = True
+            if started:
+                self.backoff.reset()
+
+            still_running = []
+            remaining = []
+            for report, future, deadline in running:
+                try:
+                    s = report.status()
+                except Exception as e:
+                    self._fail(report, future, e)
+                    continue
+
+                if s['status'] == 'completed':
+                    logger.info("Report %d complete" % report.id)
+                    future.set_result(report)
+                elif time.monotonic() >= deadline:
+                    self._fail(report, future, ProfilerException(
+                        'Timed out waiting for report %d to complete, '
+                        'last %s%% complete' % (report.id, s['percent'])))
+                else:
+                    still_running.append((report, future, deadline))
+                    remaining.append(s.get('remaining_seconds') or 0)
+            running = still_running
+
+            if running and not (self._pending and
+                                len(running) < self.max_concurrent):
+                # wait on the report expected to finish first
+                delay = self.backoff.next_delay(
+                    {'remaining_seconds': min(remaining)})
+                next_deadline = min(d for _, _, d in running)
+                time.sleep(max(0, min(delay,
+                                      next_deadline - time.monotonic())))
+
+        futures, self._futures = self._futures, []
+        return futures
+
+
 class LiveReport(MultiQueryReport):
     """Query class for one query in a dashboard report"""
 
@@ -0,0 +1,276 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+This module provides caches for the results of NetProfiler reports.
+
+When a cache is attached to a :class:`NetProfiler
+<steelscript.netprofiler.core.NetProfiler>`, running a report whose
+criteria match an earlier completed report returns the cached results
+without posting anything to the appliance.  Reports are matched on
+the appliance host and port and on their normalized criteria: the
+template id, the time frame rounded to the report resolution, the
+traffic expression and the query, including the column ids.  Example::
+
+    >>> cache = MemoryResultCache(maxsize=64, ttl=600)
+    >>> p = NetProfiler(host, auth=auth, result_cache=cache)
+
+Only data retrieved with ``get_data()`` and friends on completed
+reports is cached.  Streamed and paged retrieval always go to the
+appliance.  Reports whose time frame has not ended yet, such as
+``last 5 min`` reports, are never cached as later runs would return
+more data.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from steelscript.common._fs import SteelScriptDir
+
+__all__ = ['ResultCache', 'MemoryResultCache', 'FileResultCache']
+
+logger = logging.getLogger(__name__)
+
+# seconds per report resolution, time frames are rounded to these
+_RESOLUTION_SECONDS = {'1min': 60,
+                       '15min': 60 * 15,
+                       'hour': 60 * 60,
+                       '6hour': 60 * 60 * 6,
+                       'day': 60 * 60 * 24,
+                       'week': 60 * 60 * 24 * 7}
+
+# 'auto' and other resolutions are rounded to the finest one
+_DEFAULT_STEP = 60
+
+
+class ResultCache(object):
+    """Base class for report result caches.
+
+    Entries are JSON serializable dicts keyed by the string returned
+    from :py:meth:`make_key`.  Subclasses implement :py:meth:`get`,
+    :py:meth:`put`, :py:meth:`remove` and :py:meth:`clear`.
+    """
+    def __init__(self, maxsize=128, ttl=3600):
+        """
+        :param int maxsize: maximum number of reports kept, the least
+            recently used ones are evicted first
+
+        :param float ttl: seconds a cached report remains valid, or None
+            to keep entries until evicted
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    @staticmethod
+    def cacheable(to_post, now=None):
+        """Return True if the results of `to_post` can be cached.
+
+        The last interval of the time frame, at the report resolution,
+        must have ended before `now`, the appliance may still be adding
+        data to more recent ones.
+        """
+        time_frame = (to_post.get('criteria') or {}).get('time_frame') or {}
+        if time_frame.get('end') is None:
+            return False
+        step = _RESOLUTION_SECONDS.get(time_frame.get('resolution'),
+                                       _DEFAULT_STEP)
+        if now is None:
+            now = time.time()
+        return int(time_frame['end']) + step <= now
+
+    @staticmethod
+    def make_key(to_post, host=None, port=None):
+        """Return the cache key for the report definition `to_post`.
+
+        :param str host: appliance the report runs on, caches shared by
+            several NetProfiler instances keep their results apart
+
+        :param int port: port of the appliance
+        """
+        criteria = dict(to_post.get('criteria') or {})
+
+        time_frame = dict(criteria.get('time_frame') or {})
+        step = _RESOLUTION_SECONDS.get(time_frame.get('resolution'),
+                                       _DEFAULT_STEP)
+        for name in ('start', 'end'):
+            if name in time_frame:
+                time_frame[name] = int(time_frame[name]) // step * step
+        criteria['time_frame'] = time_frame
+
+        if criteria.get('traffic_expression') is not None:
+            criteria['traffic_expression'] = (
+                criteria['traffic_expression'].strip())
+
+        # column ids are left in order as they define the legend
+        normalized = {'host': host,
+                      'port': port,
+                      'template_id': to_post.get('template_id'),
+                      'criteria': criteria}
+        text = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf8')).hexdigest()
+
+    def _expired(self, stored):
+        return self.ttl is not None and time.time() - stored > self.ttl
+
+    def get(self, key):
+        """Return the entry stored under `key`, None if missing or stale."""
+        raise NotImplementedError()
+
+    def put(self, key, entry):
+        """Store `entry` under `key`, evicting old entries as needed."""
+        raise NotImplementedError()
+
+    def remove(self, key):
+        """Remove the entry stored under `key`, if any."""
+        raise NotImplementedError()
+
+    def clear(self):
+        """Remove all entries."""
+        raise NotImplementedError()
+
+
+class MemoryResultCache(ResultCache):
+    """In-memory least recently used result cache.
+
+    The cache is thread-safe and can be shared by several NetProfiler
+    instances.
+    """
+    def __init__(self, maxsize=128, ttl=3600):
+        super(MemoryResultCache, self).__init__(maxsize, ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                stored, entry = self._entries[key]
+            except KeyError:
+                return None
+            if self._expired(stored):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = (time.time(), entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def remove(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileResultCache(ResultCache):
+    """Result cache storing one JSON file per report in a directory.
+
+    The directory can be shared between processes.  Files are replaced
+    atomically and their modification time tracks the last use, which
+    drives both expiry and eviction.
+    """
+    def __init__(self, directory=None, maxsize=1024, ttl=3600):
+        """
+        :param str directory: where to store results, defaults to the
+            ``NetProfiler/results`` SteelScript data directory
+        """
+        super(FileResultCache, self).__init__(maxsize, ttl)
+        if directory is None:
+            directory = SteelScriptDir('NetProfiler', 'results').basedir
+        elif not os.path.exists(directory):
+            os.makedirs(directory)
+        self.directory = directory
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _files(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                yield os.path.join(self.directory, name)
+
+    def get(self, key):
+        filename = self._filename(key)
+        try:
+            # the modification time is when the entry was stored
+            if self._expired(os.path.getmtime(filename)):
+                os.remove(filename)
+                return None
+            with open(filename, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            if os.path.exists(filename):
+                logger.warning('Ignoring unreadable cached result %s: %s'
+                               % (filename, e))
+            return None
+
+        # the access time marks the last use for eviction
+        try:
+            os.utime(filename, (time.time(), os.path.getmtime(filename)))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        filename = self._filename(key)
+        fd, tmpname = tempfile.mkstemp(prefix='.' + key, dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmpname, filename)
+        except Exception:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            raise
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for filename in self._files():
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            if self._expired(st.st_mtime):
+                self._remove(filename)
+            else:
+                files.append((max(st.st_atime, st.st_mtime), filename))
+
+        files.sort()
+        for _, filename in files[:max(0, len(files) - self.maxsize)]:
+            self._remove(filename)
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def remove(self, key):
+        self._remove(self._filename(key))
+
+    def clear(self):
+        for filename in self._files():
+            self._remove(filename)
@@ -87,7 +87,7 @@ class ServiceLocationReport(SingleQueryReport):
             if l.id < _constants.EPHEMERAL_COLID:
                 pos[l.key] = i
             else:
-                pos['svc_health_ctxt'].append([i, l.json['name']])
+                pos['svc_health_ctxt'].append([i, l.label])
 
         rows = []
         for rawrow in raw:
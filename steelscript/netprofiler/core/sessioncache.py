@@ -0,0 +1,70 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+This module provides a cache of authenticated NetProfiler sessions
+shared between processes.
+
+Connecting a :class:`NetProfiler <steelscript.netprofiler.core.NetProfiler>`
+normally retrieves the supported API versions, detects the
+authentication methods and logs in.  With a session cache, a process
+connecting to a host with the same credentials as a recent one reuses
+that session and only issues the info request, which also validates
+the session.  If the session has expired on the appliance, the
+connection transparently logs in again and the cache is refreshed.
+Example::
+
+    >>> p = NetProfiler(host, auth=auth, session_cache=SessionCache())
+
+Entries hold session tokens and cookies but never passwords.  They are
+stored in files readable only by their owner.  Sessions authenticated
+with HTTP basic authentication are not cached, as their Authorization
+header encodes the password.
+"""
+
+import hashlib
+
+from steelscript.common._fs import SteelScriptDir
+from steelscript.netprofiler.core.resultcache import FileResultCache
+
+__all__ = ['SessionCache']
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode('utf8')).hexdigest()
+
+
+class SessionCache(FileResultCache):
+    """File based cache of NetProfiler sessions.
+
+    Sessions are keyed by host, port and credentials, a new password
+    or access code therefore never matches a cached session.
+    """
+    def __init__(self, directory=None, maxsize=256, ttl=600):
+        """
+        :param str directory: where to store sessions, defaults to the
+            ``NetProfiler/sessions`` SteelScript data directory
+
+        :param float ttl: seconds a session is reused for, keep this
+            below the session timeout configured on the appliances
+        """
+        if directory is None:
+            directory = SteelScriptDir('NetProfiler', 'sessions').basedir
+        super(SessionCache, self).__init__(directory, maxsize, ttl)
+
+    @staticmethod
+    def make_key(service, host, port, auth):
+        """Return the cache key of a session to `host` using `auth`."""
+        if auth is None:
+            credentials = ''
+        elif hasattr(auth, 'access_code'):
+            credentials = 'oauth:' + _digest(auth.access_code)
+        else:
+            credentials = 'user:%s:%s' % (auth.username,
+                                          _digest(auth.password))
+        return _digest('|'.join([service, str(host), str(port),
+                                 credentials]))
@@ -0,0 +1,848 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+"""
+Benchmarks for the NetProfiler reporting hot path.
+
+The benchmarks run against an in-process NetProfiler simulated at the
+HTTP transport, so the whole client stack, from the requests session
+to the native rows, is measured without network latency.  The
+simulated appliance replays the recorded responses found in the test
+cassettes, such as the services, login, info and areas resources and
+the column definitions of recorded report queries.  Large responses
+are synthetic and scaled: flow lists of 10k, 100k and 1M rows, a time
+series with hundreds of columns, a host group type with tens of
+thousands of entries and a service location report.  Synthetic data
+is generated from a fixed seed, so successive runs, and runs of
+different commits, see the same responses.
+
+Run all benchmarks and save the results::
+
+    $ python -m steelscript.netprofiler.core.test.benchmark -o base.json
+
+then, after a change, compare against them::
+
+    $ python -m steelscript.netprofiler.core.test.benchmark \\
+          --compare base.json --max-regression 0.1
+
+Each benchmark reports the minimum, median, mean and standard deviation
+of its samples in seconds.  Comparisons use the median.  Use
+``--filter`` and ``--exclude`` to run a subset of the benchmarks, for
+instance ``--exclude flowlist-1000000`` to skip the largest flow list.
+"""
+
+import gc
+import io
+import os
+import re
+import sys
+import json
+import glob
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import warnings
+import contextlib
+from unittest import mock
+from urllib.parse import urlsplit, parse_qs
+
+import yaml
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from steelscript.common.service import UserAuth
+from steelscript.netprofiler.core import NetProfiler
+from steelscript.netprofiler.core.hostgroup import (HostGroup, HostGroupType,
+                                                    read_config)
+from steelscript.netprofiler.core.services import ServiceLocationReport
+from steelscript.netprofiler.core.report import (TrafficFlowListReport,
+                                                 TrafficTimeSeriesReport)
+
+# Bump when the generated data or the benchmarks change in a way that
+# makes results incomparable with earlier ones
+BENCHMARK_VERSION = 1
+
+HOST = '10.38.131.150'
+CREDENTIALS = ('admin', 'admin')
+
+curdir = os.path.dirname(os.path.abspath(__file__))
+cassette_dir = os.path.join(curdir, 'cassettes')
+
+# Flow list sizes, in rows
+FLOW_LIST_ROWS = (10000, 100000, 1000000)
+
+# Columns of the flow lists, all defined in the recorded cassettes
+FLOW_LIST_COLUMNS = ['time', 'host_ip', 'host_dns', 'total_bytes',
+                     'total_pkts', 'avg_bytes', 'avg_pkts', 'network_rtt',
+                     'response_time', 'server_delay']
+
+# Wide time series, one day of one minute samples for each port
+TIME_SERIES_POINTS = 1440
+TIME_SERIES_PORTS = 200
+
+# Host group type configuration, GROUPS groups of CIDRS entries each
+HOSTGROUP_GROUPS = 1000
+HOSTGROUP_CIDRS = 50
+HOSTGROUP_OPERATIONS = 500
+
+# Service location report
+SERVICE_LOCATIONS = 500
+SERVICE_METRIC_CATEGORIES = 4
+SERVICES = 20
+
+# Columns of the service location report, these are not part of the
+# recorded column definitions
+_SERVICE_LOCATION_COLUMNS = [
+    (1700, 'ID_IDX', 'Index'),
+    (1701, 'ID_PARENT_ID', 'Parent Id'),
+    (1702, 'ID_TREE_KEY_CTXT', 'Tree Key Context'),
+    (1703, 'ID_TREE_KEY_ID', 'Tree Key Id'),
+    (1704, 'ID_TREE_KEY_TYPE', 'Tree Key Type'),
+    (1705, 'ID_HEALTH_CTXT', 'Health Context'),
+]
+
+EPHEMERAL_COLID = 200000
+
+
+def load_cassettes(directory=cassette_dir):
+    """Yield the recorded interactions of the cassettes in `directory`."""
+    for filename in sorted(glob.glob(os.path.join(directory, '*', '*'))):
+        with open(filename, 'r') as f:
+            cassette = yaml.safe_load(f)
+        for interaction in cassette['interactions']:
+            yield interaction
+
+
+def _coldef(cid, strid, name, ctype='string', category='info',
+            rate='none', statistic='none'):
+    return {'id': cid, 'strid': strid, 'name': name, 'type': ctype,
+            'category': category, 'rate': rate, 'statistic': statistic,
+            'unit': 'none', 'metric': 'none', 'area': 'none',
+            'role': 'none', 'cli_srv': 'none', 'direction': 'none',
+            'comparison': 'none', 'comparison_parameter': '',
+            'severity': 'none', 'internal': False, 'sortable': False,
+            'has_others': False, 'context': False, 'name_type': 'string',
+            'available': True}
+
+
+class Dataset(object):
+    """Synthetic result of a report query.
+
+    Rows are generated by `row` from their index and a random generator
+    seeded with `seed`, in legend order, as strings the way NetProfiler
+    returns them.
+    """
+    def __init__(self, legend, nrows, row, seed=0, group_by='hos'):
+        self.legend = legend
+        self.nrows = nrows
+        self.row = row
+        self.seed = seed
+        self.group_by = group_by
+
+    def rows(self, limit=None):
+        rng = random.Random(self.seed)
+        nrows = self.nrows if limit is None else min(limit, self.nrows)
+        for i in range(nrows):
+            yield self.row(i, rng)
+
+
+class Appliance(object):
+    """NetProfiler simulated at the requests transport adapter.
+
+    Recorded responses are replayed for the resources they cover, other
+    resources are served from the synthetic datasets, column catalog
+    and host group types.  Encoded responses are kept, so the time to
+    generate data is only spent once and not measured.
+    """
+
+    _SERVICES_ALIASES = {'/api/common/1.1/services': '/api/common/1.0/services'}
+
+    def __init__(self, directory=cassette_dir):
+        self.recorded = dict()
+        self.catalog = dict()
+        for interaction in load_cassettes(directory):
+            request = interaction['request']
+            response = interaction['response']
+            path = urlsplit(request['uri']).path
+            body = response['body']['string']
+
+            if path.endswith('/queries.json'):
+                for query in json.loads(body):
+                    for column in query['columns']:
+                        self.catalog[column['id']] = column
+            elif ((path.startswith('/api/common/') or
+                   path.endswith('/areas.json')) and
+                  response['status']['code'] < 400):
+                self.recorded.setdefault((request['method'], path),
+                                         (response['status']['code'], body))
+
+        for cid, strid, name in _SERVICE_LOCATION_COLUMNS:
+            self.catalog[cid] = _coldef(cid, strid, name)
+
+        self.datasets = dict()
+        self.reports = dict()
+        self.hostgroup_types = dict()
+        self._next_id = 1000
+        self._bodies = dict()
+
+    @contextlib.contextmanager
+    def installed(self):
+        """Route all requests to this appliance, with an empty data dir.
+
+        The SteelScript data directory holding the column and area
+        caches is redirected to a temporary directory, so the cache of
+        the user running the benchmarks is neither used nor modified.
+        """
+        def send(adapter, request, **kwargs):
+            return self.handle(request)
+
+        with tempfile.TemporaryDirectory() as home:
+            env = {'HOME': home, 'APPDATA': home}
+            with mock.patch.dict(os.environ, env), \
+                    mock.patch.object(requests.adapters.HTTPAdapter,
+                                      'send', send):
+                self.home = home
+                yield self
+
+    def clear_data_dir(self):
+        """Remove the cached column and area definitions."""
+        for filename in glob.glob(os.path.join(self.home, '.steelscript',
+                                               'NetProfiler', 'data', '*')):
+            os.remove(filename)
+
+    def _response(self, request, status, body=b'', headers=None):
+        response = requests.models.Response()
+        response.status_code = status
+        response.reason = 'OK' if status < 400 else 'Error'
+        if isinstance(body, str):
+            body = body.encode('utf8')
+        response._content = body
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict(
+            headers or {'Content-Type': 'application/json'})
+        response.url = request.url
+        response.request = request
+        return response
+
+    def _json(self, request, data, status=200):
+        return self._response(request, status, json.dumps(data))
+
+    def _error(self, request, status, error_id, text):
+        return self._json(request, {'error_id': error_id,
+                                    'error_text': text}, status)
+
+    def handle(self, request):
+        url = urlsplit(request.url)
+        path = self._SERVICES_ALIASES.get(url.path, url.path)
+        params = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        body = json.loads(request.body) if request.body else None
+
+        recorded = self.recorded.get((request.method, path))
+        if recorded is not None:
+            return self._response(request, *recorded)
+
+        if path.startswith('/api/profiler/1.0/reporting/'):
+            return self._reporting(request, path[28:], params, body)
+        if path.startswith('/api/profiler/1.2/host_group_types'):
+            return self._host_group_types(request, path[34:], body)
+        return self._error(request, 404, 'RESOURCE_NOT_FOUND',
+                           'No such resource: %s' % path)
+
+    #
+    # Reporting
+    #
+    def _reporting(self, request, path, params, body):
+        if path == 'columns.json':
+            if 'columns' not in self._bodies:
+                self._bodies['columns'] = json.dumps(
+                    [self.catalog[cid] for cid in sorted(self.catalog)])
+            return self._response(request, 200, self._bodies['columns'])
+
+        if path == 'reports' and request.method == 'POST':
+            report_id = self._next_id
+            self._next_id += 1
+            query = body['criteria'].get('query', {})
+            self.reports[report_id] = {
+                'dataset': query.get('realm'),
+                'time_frame': body['criteria']['time_frame']}
+            return self._json(request, self._status(report_id), 201)
+
+        m = re.match(r'reports/(\d+)(?:/queries(?:/(.+))?)?\.json$', path)
+        if m is None or int(m.group(1)) not in self.reports:
+            return self._error(request, 404, 'RESOURCE_NOT_FOUND',
+                               'No such report: %s' % path)
+
+        report_id = int(m.group(1))
+        report = self.reports[report_id]
+        if request.method == 'DELETE':
+            del self.reports[report_id]
+            return self._response(request, 204)
+        if path.endswith('/queries.json'):
+            return self._json(request, [self._query(report_id, report)])
+        if m.group(2) is not None:
+            return self._querydata(request, report, params)
+        return self._json(request, self._status(report_id))
+
+    @staticmethod
+    def _status(report_id):
+        return {'status': 'completed', 'percent': 100, 'id': report_id,
+                'remaining_seconds': 0, 'template_id': 184, 'saved': False,
+                'error_text': '', 'name': '', 'user_id': 1}
+
+    def _query(self, report_id, report):
+        dataset = self.datasets[report['dataset']]
+        time_frame = report['time_frame']
+        return {'id': '0:%s_%d' % (report['dataset'], report_id),
+                'group_by': dataset.group_by,
+                'actual_t0': time_frame['start'],
+                'actual_t1': time_frame['end'],
+                'columns': dataset.legend}
+
+    def _querydata(self, request, report, params):
+        key = (report['dataset'], params.get('columns'), params.get('limit'))
+        if key not in self._bodies:
+            dataset = self.datasets[report['dataset']]
+            ids = [c['id'] for c in dataset.legend]
+            if params.get('columns'):
+                positions = [ids.index(int(cid))
+                             for cid in params['columns'].split(',')]
+            else:
+                positions = list(range(len(ids)))
+            limit = params.get('limit')
+            rows = dataset.rows(int(limit) if limit else None)
+            self._bodies[key] = ''.join([
+                '{"data": [',
+                ', '.join(json.dumps([row[i] for i in positions])
+                          for row in rows),
+                ']}'])
+        return self._response(request, 200, self._bodies[key])
+
+    #
+    # Host group types
+    #
+    def _host_group_types(self, request, path, body):
+        parts = [p for p in path.split('/') if p]
+        if not parts:
+            if request.method == 'POST':
+                type_id = self._next_id
+                self._next_id += 1
+                self.hostgroup_types[type_id] = dict(body, id=type_id)
+                return self._json(request, {'id': type_id}, 201)
+            return self._json(request, [
+                dict((k, v) for k, v in t.items() if k != 'config')
+                for t in self.hostgroup_types.values()])
+
+        type_id = int(parts[0])
+        if type_id not in self.hostgroup_types:
+            return self._error(request, 404, 'RESOURCE_NOT_FOUND',
+                               'No such host group type: %s' % type_id)
+        hgt = self.hostgroup_types[type_id]
+
+        if len(parts) == 2 and parts[1] == 'config':
+            if request.method == 'PUT':
+                hgt['config'] = body
+                self._bodies.pop(('config', type_id), None)
+            if ('config', type_id) not in self._bodies:
+                self._bodies[('config', type_id)] = json.dumps(hgt['config'])
+            return self._response(request, 200,
+                                  self._bodies[('config', type_id)])
+
+        if request.method == 'PUT':
+            hgt.update(body)
+            self._bodies.pop(('config', type_id), None)
+        elif request.method == 'DELETE':
+            del self.hostgroup_types[type_id]
+            return self._response(request, 204)
+        return self._json(request, dict((k, v) for k, v in hgt.items()
+                                        if k != 'config'))
+
+
+#
+# Synthetic data
+#
+def _ip(i):
+    return '10.%d.%d.%d' % ((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+
+
+def flow_list_dataset(appliance, nrows):
+    """Flow list of `nrows` rows over ``FLOW_LIST_COLUMNS``."""
+    bykey = dict((c['strid'][3:].lower(), c)
+                 for c in appliance.catalog.values())
+    legend = [dict(bykey[key], available=True) for key in FLOW_LIST_COLUMNS]
+    start = 1549641600
+
+    def row(i, rng):
+        host = rng.randrange(1 << 20)
+        total_bytes = rng.randrange(40, 1 << 24)
+        total_pkts = total_bytes // rng.randrange(40, 1500) + 1
+        return [str(start + i // 300),
+                _ip(host),
+                '%s|desktop%d' % (_ip(host), host),
+                str(total_bytes),
+                str(total_pkts),
+                '%.3f' % (total_bytes / 60.0),
+                '%.3f' % (total_pkts / 60.0),
+                '%.6f' % rng.random(),
+                '%.6f' % rng.random(),
+                '%.6f' % rng.random()]
+
+    return Dataset(legend, nrows, row, seed=nrows)
+
+
+def time_series_dataset(appliance):
+    """Time series of ``TIME_SERIES_PORTS`` ephemeral avg_bytes columns."""
+    avg_bytes = appliance.catalog[33]
+    legend = [dict(appliance.catalog[98], available=True)]
+    for i in range(TIME_SERIES_PORTS):
+        legend.append(dict(avg_bytes, id=EPHEMERAL_COLID + i,
+                           name='tcp/%d' % (1024 + i), available=True))
+    start = 1549641600
+
+    def row(i, rng):
+        return [str(start + 60 * i)] + ['%.3f' % (rng.random() * 1e6)
+                                        for _ in range(TIME_SERIES_PORTS)]
+
+    return Dataset(legend, TIME_SERIES_POINTS, row, group_by='tim')
+
+
+def service_location_dataset(appliance):
+    """Service health of ``SERVICE_LOCATIONS`` locations.
+
+    Each location row is followed by one row per metric category, which
+    the report skips.
+    """
+    legend = [dict(appliance.catalog[cid], available=True)
+              for cid, _, _ in _SERVICE_LOCATION_COLUMNS]
+    for i in range(SERVICES):
+        legend.append(_coldef(EPHEMERAL_COLID + i, 'ID_SVC_HEALTH_CTXT',
+                              'Service %d' % i, category='data'))
+    per_location = 1 + SERVICE_METRIC_CATEGORIES
+
+    def row(i, rng):
+        location, cat = divmod(i, per_location)
+        loc_id = '1:%d' % location
+        health = str(rng.randrange(8))
+        if cat == 0:
+            res = [str(i), '', '691:%s|ByLocation:site%d' % (loc_id, location),
+                   loc_id, 'location',
+                   '%s[service_location_id=%s[svc_location_id=%s]'
+                   % (health, loc_id, loc_id)]
+            for svc in range(SERVICES):
+                res.append('%d[service_location_id=%s,service_id=%d'
+                           '[svc_location_id=%s]'
+                           % (rng.randrange(8), loc_id, svc, loc_id))
+        else:
+            parent = str(location * per_location)
+            res = [str(i), parent,
+                   '692:%s:%d|Category %d' % (loc_id, cat, cat),
+                   str(cat), 'metric_cat',
+                   '%s[service_location_id=%s,metric_cat_id=%d'
+                   '[svc_metric_cat_id=%d]' % (health, loc_id, cat, cat)]
+            for svc in range(SERVICES):
+                res.append('%d[service_location_id=%s,metric_cat_id=%d,'
+                           'service_id=%d[svc_metric_cat_id=%d]'
+                           % (rng.randrange(8), loc_id, cat, svc, cat))
+        return res
+
+    return Dataset(legend, SERVICE_LOCATIONS * per_location, row,
+                   group_by='slm')
+
+
+def hostgroup_config(groups=HOSTGROUP_GROUPS, cidrs=HOSTGROUP_CIDRS):
+    """Return a host group type config of `groups` x `cidrs` entries."""
+    return [{'name': 'group%04d' % (k // cidrs),
+             'cidr': '10.%d.%d.0/24' % (k // 256, k % 256)}
+            for k in range(groups * cidrs)]
+
+
+#
+# Benchmark runner
+#
+class Timer(object):
+    """Record the duration of each ``with`` block, in seconds.
+
+    If a block repeats the measured operation `number` times, the
+    recorded duration is divided accordingly.
+    """
+    def __init__(self, number=1):
+        self.number = number
+        self.samples = []
+
+    def __enter__(self):
+        gc.collect()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.samples.append((time.perf_counter() - self._start) /
+                            self.number)
+
+
+class Benchmark(object):
+    def __init__(self, name, func, number=1, arg=None):
+        self.name = name
+        self.func = func
+        self.number = number
+        self.arg = arg
+
+    def run(self, context, repeat=5, warmup=1):
+        timer = Timer(self.number)
+        args = () if self.arg is None else (self.arg,)
+        for _ in range(warmup):
+            self.func(context, timer, *args)
+        del timer.samples[:]
+        for _ in range(repeat):
+            self.func(context, timer, *args)
+        samples = timer.samples
+        return {'samples': samples,
+                'min': min(samples),
+                'median': statistics.median(samples),
+                'mean': statistics.mean(samples),
+                'stdev': statistics.stdev(samples) if len(samples) > 1 else 0}
+
+
+BENCHMARKS = []
+
+
+def benchmark(name, number=1, args=None):
+    """Register a benchmark.
+
+    The decorated function is called with the :class:`BenchmarkContext`
+    and a :class:`Timer`, and must time exactly one block per call.  If
+    `args` is given, one benchmark is registered per value, formatted
+    into `name` and passed as third argument.
+    """
+    def register(func):
+        for arg in (args or [None]):
+            BENCHMARKS.append(Benchmark(name.format(arg), func, number, arg))
+        return func
+    return register
+
+
+class BenchmarkContext(object):
+    """Simulated appliance and a connected NetProfiler shared by benchmarks."""
+    def __init__(self, appliance):
+        self.appliance = appliance
+        self._profiler = None
+
+    def connect(self, **kwargs):
+        return NetProfiler(HOST, auth=UserAuth(*CREDENTIALS), **kwargs)
+
+    @property
+    def profiler(self):
+        if self._profiler is None:
+            self._profiler = self.connect()
+        return self._profiler
+
+    def dataset(self, name, factory):
+        """Return the dataset served for realm `name`, creating it once."""
+        if name not in self.appliance.datasets:
+            self.appliance.datasets[name] = factory()
+        return self.appliance.datasets[name]
+
+    def flow_list_report(self, nrows):
+        """Run and return a flow list report returning `nrows` rows."""
+        dataset = flow_list_dataset(self.appliance, nrows)
+        self.appliance.datasets['traffic_flow_list'] = dataset
+        report = TrafficFlowListReport(self.profiler)
+        report.run(columns=FLOW_LIST_COLUMNS, limit=nrows)
+        return report
+
+    def hostgroup_type(self):
+        """Return a local host group type holding a copy of the config."""
+        hgt = HostGroupType.create(self.profiler, 'ByBenchmark')
+        hgt.config = hostgroup_config()
+        for name in sorted(set(entry['name'] for entry in hgt.config)):
+            HostGroup(hgt, name)
+        return hgt
+
+
+@benchmark('netprofiler.init[cold]')
+def bench_init_cold(context, timer):
+    # column and area definitions are all retrieved from the appliance
+    context.appliance.clear_data_dir()
+    with timer:
+        context.connect()
+
+
+@benchmark('netprofiler.init[warm]')
+def bench_init_warm(context, timer):
+    # connecting once fills the column and area caches
+    context.profiler
+    with timer:
+        context.connect()
+
+
+@benchmark('netprofiler.get_columns[names]', number=1000)
+def bench_get_columns_names(context, timer):
+    profiler = context.profiler
+    with timer:
+        for _ in range(timer.number):
+            profiler.get_columns(FLOW_LIST_COLUMNS, 'hos')
+
+
+@benchmark('netprofiler.get_columns[json]', number=100)
+def bench_get_columns_json(context, timer):
+    profiler = context.profiler
+    legend = context.dataset('traffic_time_series', lambda:
+                             time_series_dataset(context.appliance)).legend
+    with timer:
+        for _ in range(timer.number):
+            profiler.get_columns(legend)
+
+
+@benchmark('query.get_data[flowlist-{0}]', args=FLOW_LIST_ROWS)
+def bench_flow_list_get_data(context, timer, nrows):
+    report = context.flow_list_report(nrows)
+    with timer:
+        report.get_data()
+    report.delete()
+
+
+@benchmark('query.to_native[flowlist-10000]')
+def bench_to_native(context, timer):
+    report = context.flow_list_report(10000)
+    query = report.get_query_by_index(0)
+    rows = list(context.appliance.datasets['traffic_flow_list'].rows())
+    with timer:
+        for row in rows:
+            query._to_native(row)
+    report.delete()
+
+
+@benchmark('query.get_data[timeseries-%dx%d]'
+           % (TIME_SERIES_POINTS, TIME_SERIES_PORTS + 1))
+def bench_time_series_get_data(context, timer):
+    context.dataset('traffic_time_series',
+                    lambda: time_series_dataset(context.appliance))
+    report = TrafficTimeSeriesReport(context.profiler)
+    report.run(columns=['time', 'avg_bytes'],
+               query_columns_groupby='ports',
+               query_columns=[{'name': 'tcp/%d' % (1024 + i)}
+                              for i in range(TIME_SERIES_PORTS)])
+    with timer:
+        report.get_data()
+    report.delete()
+
+
+@benchmark('hostgroup.load[%d]' % (HOSTGROUP_GROUPS * HOSTGROUP_CIDRS))
+def bench_hostgroup_load(context, timer):
+    appliance = context.appliance
+    if not appliance.hostgroup_types:
+        appliance.hostgroup_types[4057] = {
+            'id': 4057, 'name': 'ByBenchmark', 'favorite': False,
+            'description': 'Benchmark host groups',
+            'config': hostgroup_config()}
+    with timer:
+        HostGroupType.find_by_name(context.profiler, 'ByBenchmark')
+
+
+@benchmark('hostgroup.save[{0}]', args=('unchanged', 'one-change'))
+def bench_hostgroup_save(context, timer, change):
+    context.appliance.hostgroup_types[4057] = {
+        'id': 4057, 'name': 'ByBenchmark', 'favorite': False,
+        'description': 'Benchmark host groups',
+        'config': hostgroup_config()}
+    hgt = HostGroupType.find_by_name(context.profiler, 'ByBenchmark')
+    if change == 'one-change':
+        hgt.groups['group0500'].add('172.16.0.0/24')
+    with timer:
+        hgt.save()
+
+
+@benchmark('hostgroup.add[%d]' % HOSTGROUP_OPERATIONS)
+def bench_hostgroup_add(context, timer):
+    hgt = context.hostgroup_type()
+    groups = [hgt.groups['group%04d' % (i * 7 % HOSTGROUP_GROUPS)]
+              for i in range(HOSTGROUP_OPERATIONS)]
+    with timer:
+        for i, group in enumerate(groups):
+            group.add('172.%d.%d.0/24' % (16 + i // 256, i % 256))
+        # edits are applied when the config is next read
+        hgt.config
+
+
+@benchmark('hostgroup.remove[%d]' % HOSTGROUP_OPERATIONS)
+def bench_hostgroup_remove(context, timer):
+    hgt = context.hostgroup_type()
+    step = len(hgt.config) // HOSTGROUP_OPERATIONS
+    entries = hgt.config[::step][:HOSTGROUP_OPERATIONS]
+    removals = [(hgt.groups[e['name']], e['cidr']) for e in entries]
+    with timer:
+        for group, cidr in removals:
+            group.remove(cidr)
+        hgt.config
+
+
+@benchmark('hostgroup.add_many[%d]' % (HOSTGROUP_GROUPS * HOSTGROUP_CIDRS))
+def bench_hostgroup_add_many(context, timer):
+    # doubles the config, one new cidr after each existing entry's group
+    hgt = context.hostgroup_type()
+    entries = [(e['name'], e['cidr'].replace('10.', '11.', 1))
+               for e in hgt.config]
+    with timer:
+        hgt.add_many(entries)
+        hgt.config
+
+
+@benchmark('hostgroup.remove_many[%d]'
+           % (HOSTGROUP_GROUPS * HOSTGROUP_CIDRS // 2))
+def bench_hostgroup_remove_many(context, timer):
+    hgt = context.hostgroup_type()
+    entries = hgt.config[::2]
+    with timer:
+        hgt.remove_many(entries)
+        hgt.config
+
+
+@benchmark('hostgroup.read_config[%d]'
+           % (HOSTGROUP_GROUPS * HOSTGROUP_CIDRS))
+def bench_hostgroup_read_config(context, timer):
+    text = 'subnet,SiteName\n' + ''.join('%s,%s\n' % (e['cidr'], e['name'])
+                                         for e in hostgroup_config())
+    with timer:
+        read_config(io.StringIO(text))
+
+
+@benchmark('hostgroup.resolve[1000000]')
+def bench_hostgroup_resolve(context, timer):
+    import numpy
+
+    hgt = context.hostgroup_type()
+    resolver = hgt.resolver()
+    # addresses spread over the networks of the config and beyond
+    rng = numpy.random.RandomState(0)
+    addresses = rng.randint(0x0a000000, 0x0a010000, size=1000000)
+    with timer:
+        resolver.resolve_many(addresses)
+
+
+@benchmark('services.location_parse[%dx%d]' % (SERVICE_LOCATIONS, SERVICES))
+def bench_service_location_parse(context, timer):
+    context.dataset('msq', lambda: service_location_dataset(context.appliance))
+    report = ServiceLocationReport(context.profiler)
+    report.run()
+    # retrieve the raw data first, only parsing is measured
+    report.get_legend()
+    super(ServiceLocationReport, report).get_data()
+    with timer:
+        report.get_data()
+    report.delete()
+
+
+def run(names=None, exclude=None, repeat=5, warmup=1, out=sys.stdout):
+    """Run the benchmarks whose name contains one of `names`, if given,
+    and none of `exclude`.
+
+    Returns the results as a JSON serializable dict.
+    """
+    results = dict()
+    appliance = Appliance()
+    with appliance.installed():
+        context = BenchmarkContext(appliance)
+        for bench in BENCHMARKS:
+            if names and not any(n in bench.name for n in names):
+                continue
+            if exclude and any(n in bench.name for n in exclude):
+                continue
+            result = bench.run(context, repeat, warmup)
+            results[bench.name] = result
+            out.write('%-45s %12.6f s\n' % (bench.name, result['median']))
+            out.flush()
+
+    return {'version': BENCHMARK_VERSION,
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': int(time.time()),
+            'repeat': repeat,
+            'results': results}
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=curdir,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, out=sys.stdout):
+    """Print the change of the median of each benchmark from `baseline`.
+
+    Returns a dict of the relative change by benchmark name, for the
+    benchmarks present in both.
+    """
+    if current['version'] != baseline['version']:
+        out.write('Warning: baseline was produced by benchmark version %s, '
+                  'results may not be comparable\n' % baseline['version'])
+
+    changes = dict()
+    out.write('%-45s %12s %12s %8s\n' % ('benchmark', 'baseline',
+                                         'current', 'change'))
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        base = baseline['results'][name]['median']
+        changes[name] = result['median'] / base - 1
+        out.write('%-45s %12.6f %12.6f %+7.1f%%\n'
+                  % (name, base, result['median'], 100 * changes[name]))
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the NetProfiler reporting hot path.')
+    parser.add_argument('-o', '--output', help='write results to this file')
+    parser.add_argument('--compare', help='results file to compare with')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='fail if a median is slower than the '
+                             'baseline by more than this fraction')
+    parser.add_argument('--filter', action='append',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--exclude', action='append',
+                        help='skip benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of samples per benchmark')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='number of unmeasured runs per benchmark')
+    parser.add_argument('--list', action='store_true',
+                        help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for bench in BENCHMARKS:
+            print(bench.name)
+        return 0
+
+    # profilers discarded by the construction benchmarks keep their
+    # column catalog file open until they are collected
+    warnings.simplefilter('ignore', ResourceWarning)
+    results = run(args.filter, args.exclude, args.repeat, args.warmup)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        changes = compare(results, baseline)
+        if (args.max_regression is not None and
+                any(c > args.max_regression for c in changes.values())):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
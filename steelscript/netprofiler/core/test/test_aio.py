@@ -0,0 +1,107 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+from steelscript.common.connection import Connection
+from steelscript.netprofiler.core.report import ChunkPolicy
+
+import asyncio
+import unittest
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+if web is not None:
+    from steelscript.netprofiler.core.aio import (
+        AsyncConnection, AsyncTrafficOverallTimeSeriesReport)
+
+
+class FakeProfiler(object):
+    """Stands in for the wrapped NetProfiler, logging in sets a cookie."""
+    def __init__(self, hostname, appliance):
+        self.conn = Connection(hostname, auth=None, verify=False)
+        self.appliance = appliance
+        self.logins = 0
+        self.reauthenticate()
+
+    def reauthenticate(self):
+        self.logins += 1
+        self.appliance.session = 's%d' % self.logins
+        self.conn.conn.cookies.set('session', self.appliance.session)
+
+
+class FakeAppliance(object):
+
+    def __init__(self):
+        self.session = None
+        self.paths = []
+
+    async def handle(self, request):
+        self.paths.append(request.path_qs)
+        if request.cookies.get('session') != self.session:
+            return web.json_response({'error_id': 'AUTH_INVALID_SESSION',
+                                      'error_text': 'expired'}, status=401)
+        limit = int(request.query.get('limit', 3))
+        return web.json_response({'data': [[i] for i in range(limit)]})
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class AsyncConnectionTests(unittest.TestCase):
+
+    def run_with_server(self, test):
+        async def main():
+            appliance = FakeAppliance()
+            app = web.Application()
+            app.router.add_route('*', '/{tail:.*}', appliance.handle)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            profiler = FakeProfiler('http://127.0.0.1:%d' % port, appliance)
+            conn = AsyncConnection(profiler)
+            try:
+                await test(profiler, appliance, conn)
+            finally:
+                await conn.close()
+                await runner.cleanup()
+        asyncio.run(main())
+
+    def test_request(self):
+        async def test(profiler, appliance, conn):
+            res = await conn.json_request(
+                'GET', '/api/profiler/1.0/reporting/reports/1.json',
+                params={'limit': 2})
+            self.assertEqual(res, {'data': [[0], [1]]})
+            self.assertEqual(appliance.paths,
+                             ['/api/profiler/1.0/reporting/reports/1.json'
+                              '?limit=2'])
+        self.run_with_server(test)
+
+    def test_reauthenticate(self):
+        async def test(profiler, appliance, conn):
+            await conn.json_request('GET', '/x')
+            # the session expires on the appliance
+            appliance.session = 'expired'
+            res = await asyncio.gather(*[conn.json_request('GET', '/x')
+                                         for _ in range(10)])
+            self.assertEqual(res, [{'data': [[0], [1], [2]]}] * 10)
+            # one login for all the requests that failed
+            self.assertEqual(profiler.logins, 2)
+        self.run_with_server(test)
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class AsyncReportTests(unittest.TestCase):
+
+    def test_chunked_rejected(self):
+        report = AsyncTrafficOverallTimeSeriesReport(object())
+        with self.assertRaises(ValueError):
+            report.run(['time', 'avg_bytes'], resolution='1min',
+                       chunk_policy=ChunkPolicy('1 hour'))
+        self.assertIsNone(report.id)
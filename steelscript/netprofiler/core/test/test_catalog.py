@@ -0,0 +1,201 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+from steelscript.netprofiler.core._catalog import (ColumnCatalogFile,
+                                                   CatalogData)
+from steelscript.netprofiler.core._types import Column
+from steelscript.netprofiler.core.netprofiler import (NetProfiler,
+                                                      _ColumnIndex,
+                                                      make_hash)
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+def column(cid, strid, ctype='float'):
+    return Column.from_json({'id': cid, 'strid': strid,
+                             'name': strid.lower(), 'type': ctype,
+                             'category': 'data', 'rate': '',
+                             'available': True, 'unit': 'bytes',
+                             'description': ''})
+
+
+HOST_IP = column(5, 'ID_HOST_IP', 'ip')
+AVG_BYTES = column(33, 'ID_AVG_BYTES')
+TIME = column(98, 'ID_TIME', 'time')
+PROTOPORT = column(18, 'ID_PROTOPORT', 'string')
+RTT = column(280, 'ID_NETWORK_RTT', 'int')
+
+# triplet -> columns, some columns are shared between triplets
+TRIPLETS = {
+    ('traffic_summary', 'hos', 'hos'): [HOST_IP, AVG_BYTES],
+    ('traffic_summary', 'hos', 'por'): [PROTOPORT, AVG_BYTES],
+    ('traffic_summary', 'int', 'hos'): [HOST_IP, RTT],
+    ('traffic_overall_time_series', 'hos', 'tim'): [TIME, AVG_BYTES],
+}
+
+
+class ColumnCatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'columns.cat')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_catalog(self):
+        catalog = ColumnCatalogFile(self.filename)
+        self.assertIsNone(catalog.data)
+        catalog.data = CatalogData()
+        for triplet, cols in TRIPLETS.items():
+            catalog.data[make_hash(*triplet)] = cols
+        catalog.version = 3
+        catalog.write()
+        catalog.close()
+
+    def test_round_trip(self):
+        self.write_catalog()
+        catalog = ColumnCatalogFile(self.filename)
+        try:
+            self.assertEqual(catalog.version, 3)
+            self.assertEqual(len(catalog.data), len(TRIPLETS))
+            for triplet, cols in TRIPLETS.items():
+                read = catalog.data[make_hash(*triplet)]
+                self.assertEqual([(c.id, c.key, c.label, c.type)
+                                  for c in read],
+                                 [(c.id, c.key, c.label, c.type)
+                                  for c in cols])
+                self.assertEqual([c.json for c in read],
+                                 [c.json for c in cols])
+        finally:
+            catalog.close()
+
+    def test_shared_columns(self):
+        self.write_catalog()
+        catalog = ColumnCatalogFile(self.filename)
+        try:
+            first = catalog.data[make_hash('traffic_summary', 'hos', 'hos')]
+            second = catalog.data[make_hash('traffic_summary', 'hos', 'por')]
+            self.assertIs(first[1], second[1])
+        finally:
+            catalog.close()
+
+    def test_rewrite(self):
+        self.write_catalog()
+        catalog = ColumnCatalogFile(self.filename)
+        catalog.data[make_hash('traffic_summary', 'int', 'por')] = [RTT]
+        catalog.write()
+        catalog.close()
+
+        catalog = ColumnCatalogFile(self.filename)
+        try:
+            self.assertEqual(len(catalog.data), len(TRIPLETS) + 1)
+            self.assertEqual(
+                [c.key for c in
+                 catalog.data[make_hash('traffic_summary', 'hos', 'hos')]],
+                ['host_ip', 'avg_bytes'])
+        finally:
+            catalog.close()
+
+    def test_unreadable(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'not a catalog')
+        catalog = ColumnCatalogFile(self.filename)
+        self.assertIsNone(catalog.data)
+        self.assertIsNone(catalog.version)
+
+
+class ColumnIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.data = dict((make_hash(*triplet), cols)
+                         for triplet, cols in TRIPLETS.items())
+        self.realms = ['traffic_summary', 'traffic_overall_time_series',
+                       'traffic_flow_list']
+        self.centricities = ['hos', 'int']
+        self.groupbys = ['hos', 'por', 'tim', 'app']
+        self.index = _ColumnIndex(self.data, self.realms,
+                                  self.centricities, self.groupbys)
+
+    def brute_force(self, realms, centricities, groupbys):
+        ids = set()
+        for (realm, centricity, groupby), cols in TRIPLETS.items():
+            if ((realms is None or realm in realms) and
+                    (centricities is None or centricity in centricities) and
+                    (groupbys is None or groupby in groupbys)):
+                ids.update(c.id for c in cols)
+        return ids
+
+    def test_search(self):
+        searches = [(None, None, None),
+                    (['traffic_summary'], None, None),
+                    (None, ['int'], None),
+                    (None, None, ['hos']),
+                    (['traffic_summary'], ['hos'], ['por']),
+                    (['traffic_summary', 'traffic_overall_time_series'],
+                     ['hos'], ['hos', 'tim']),
+                    (['traffic_flow_list'], None, None),
+                    (['unknown'], None, None),
+                    ([], None, None)]
+        for realms, centricities, groupbys in searches:
+            ids, keys = self.index.search(realms, centricities, groupbys)
+            expected = self.brute_force(realms, centricities, groupbys)
+            self.assertEqual(ids, expected)
+            self.assertEqual(keys, set(self.index.column(i).key
+                                       for i in expected))
+
+    def test_search_cached(self):
+        ids, keys = self.index.search(['traffic_summary'], None, ['hos'])
+        cached = self.index.search(('traffic_summary',), None, {'hos'})
+        self.assertIs(cached[0], ids)
+        self.assertIs(cached[1], keys)
+
+    def test_column(self):
+        self.index.search(None, None, None)
+        self.assertIs(self.index.column(33), AVG_BYTES)
+
+
+class EphemeralColumnTests(unittest.TestCase):
+
+    def setUp(self):
+        # a lazy NetProfiler that has only cached some triplets
+        self.directory = tempfile.mkdtemp()
+        catalog = ColumnCatalogFile(os.path.join(self.directory,
+                                                 'columns.cat'))
+        catalog.data = CatalogData()
+        catalog.data[make_hash('traffic_summary', 'hos', 'hos')] = [
+            HOST_IP, AVG_BYTES]
+
+        self.profiler = NetProfiler.__new__(NetProfiler)
+        self.profiler._columns_file = catalog
+        self.profiler._columns = None
+        self.profiler._known_columns = None
+        self.profiler._catalog_complete = False
+        self.profiler._columns_lock = threading.RLock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def ephemeral(self, strid):
+        return {'id': 200001, 'strid': strid, 'name': strid.lower(),
+                'type': 'float', 'category': 'data', 'rate': '',
+                'available': True}
+
+    def test_lazy_baseid(self):
+        col, = self.profiler._gencolumns([self.ephemeral('ID_AVG_BYTES')])
+        self.assertTrue(col.ephemeral)
+        self.assertEqual(col.baseid, AVG_BYTES.id)
+        # the complete catalog was not needed
+        self.assertIsNone(self.profiler._columns)
+
+    def test_unknown_baseid(self):
+        col, = self.profiler._gencolumns([self.ephemeral('ID_NETWORK_RTT')])
+        self.assertEqual(col.baseid, col.id)
@@ -0,0 +1,324 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+from steelscript.netprofiler.core.hostgroup import (HostGroup, HostGroupType,
+                                                    HostGroupResolver,
+                                                    read_config)
+
+import io
+import os
+import json
+import random
+import shutil
+import tempfile
+import unittest
+import ipaddress
+
+
+NAMES = ['boston', 'sanfran', 'newyork', 'paris', 'tokyo']
+
+
+def random_cidr(rng):
+    if rng.random() < 0.2:
+        prefixlen = rng.choice([32, 48, 64, 128])
+        network = ipaddress.IPv6Network(
+            (rng.getrandbits(16) << 112, prefixlen), strict=False)
+    else:
+        prefixlen = rng.choice([8, 16, 24, 28, 32])
+        # a small address space so networks overlap
+        network = ipaddress.IPv4Network(
+            ((10 << 24) | rng.getrandbits(16) << 8, prefixlen), strict=False)
+    return str(network)
+
+
+def random_config(rng, size):
+    return [{'name': rng.choice(NAMES), 'cidr': random_cidr(rng)}
+            for _ in range(size)]
+
+
+def host_group_type(config):
+    hgt = HostGroupType(None, None)
+    hgt.config = [dict(entry) for entry in config]
+    for entry in config:
+        if entry['name'] not in hgt.groups:
+            HostGroup(hgt, entry['name'])
+    return hgt
+
+
+class BatchedEditTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(0)
+
+    def test_add_many(self):
+        for prepend in (False, True):
+            for keep_together in (False, True):
+                for _ in range(20):
+                    config = random_config(self.rng, 30)
+                    entries = random_config(self.rng, 20)
+
+                    batched = host_group_type(config)
+                    batched.add_many(entries, prepend, keep_together)
+
+                    unbatched = host_group_type(config)
+                    groups = []
+                    for entry in entries:
+                        if entry['name'] not in groups:
+                            groups.append(entry['name'])
+                    for name in groups:
+                        if name not in unbatched.groups:
+                            HostGroup(unbatched, name)
+                        unbatched.groups[name].add(
+                            [e['cidr'] for e in entries
+                             if e['name'] == name], prepend, keep_together)
+                        # reading the config applies the edit on its own
+                        unbatched.config
+
+                    self.assertEqual(batched.config, unbatched.config)
+
+    def test_add_many_pairs(self):
+        hgt = host_group_type([{'name': 'boston', 'cidr': '10.0.0.0/24'}])
+        hgt.add_many([('paris', '10.0.1.0/24'), ('boston', '10.0.2.0/24')])
+        self.assertEqual(hgt.config,
+                         [{'name': 'boston', 'cidr': '10.0.0.0/24'},
+                          {'cidr': '10.0.2.0/24', 'name': 'boston'},
+                          {'cidr': '10.0.1.0/24', 'name': 'paris'}])
+        self.assertIn('paris', hgt.groups)
+
+    def test_remove_many(self):
+        for _ in range(20):
+            config = random_config(self.rng, 40)
+            entries = self.rng.sample(config, 10) + random_config(self.rng, 3)
+
+            batched = host_group_type(config)
+            batched.remove_many(entries)
+
+            unbatched = host_group_type(config)
+            for entry in entries:
+                if entry['name'] in unbatched.groups:
+                    unbatched.groups[entry['name']].remove(entry['cidr'])
+                    unbatched.config
+
+            self.assertEqual(batched.config, unbatched.config)
+
+    def test_mixed_edits(self):
+        for _ in range(20):
+            config = random_config(self.rng, 30)
+            edits = []
+            for _ in range(15):
+                entry = self.rng.choice(config + random_config(self.rng, 1))
+                edits.append((self.rng.random() < 0.6, entry,
+                              self.rng.random() < 0.5,
+                              self.rng.random() < 0.5))
+
+            queued = host_group_type(config)
+            applied = host_group_type(config)
+            for hgt, flush in ((queued, False), (applied, True)):
+                for add, entry, prepend, keep_together in edits:
+                    if entry['name'] not in hgt.groups:
+                        HostGroup(hgt, entry['name'])
+                    group = hgt.groups[entry['name']]
+                    if add:
+                        group.add(entry['cidr'], prepend, keep_together)
+                    else:
+                        group.remove(entry['cidr'])
+                    if flush:
+                        hgt.config
+
+            self.assertEqual(queued.config, applied.config)
+
+    def test_config_changed_in_place(self):
+        hgt = host_group_type([{'name': 'boston', 'cidr': '10.0.0.0/24'},
+                               {'name': 'paris', 'cidr': '10.1.0.0/24'}])
+        boston, paris = hgt.groups['boston'], hgt.groups['paris']
+        config = hgt.config
+        self.assertEqual(boston.get(), ['10.0.0.0/24'])
+
+        config.append({'name': 'boston', 'cidr': '10.2.0.0/24'})
+        self.assertEqual(boston.get(), ['10.0.0.0/24', '10.2.0.0/24'])
+        del config[0]
+        self.assertEqual(boston.get(), ['10.2.0.0/24'])
+        config[0] = {'name': 'boston', 'cidr': '10.3.0.0/24'}
+        self.assertEqual(boston.get(), ['10.3.0.0/24', '10.2.0.0/24'])
+        self.assertEqual(paris.get(), [])
+
+        # edits are checked against the changed config
+        boston.add('10.3.0.0/24')
+        paris.add('10.1.0.0/24', keep_together=True)
+        config.append({'name': 'paris', 'cidr': '10.4.0.0/24'})
+        paris.remove('10.4.0.0/24')
+        boston.remove('10.3.0.0/24')
+        self.assertEqual(hgt.config,
+                         [{'name': 'boston', 'cidr': '10.2.0.0/24'},
+                          {'name': 'paris', 'cidr': '10.1.0.0/24'}])
+
+    def test_config_set_changed_in_place(self):
+        hgt = host_group_type([])
+        boston = HostGroup(hgt, 'boston')
+        config = [{'name': 'boston', 'cidr': '10.0.0.0/24'}]
+        hgt.config = config
+        self.assertEqual(boston.get(), ['10.0.0.0/24'])
+        config.append({'name': 'boston', 'cidr': '10.2.0.0/24'})
+        self.assertEqual(boston.get(), ['10.0.0.0/24', '10.2.0.0/24'])
+        boston.remove('10.2.0.0/24')
+        self.assertEqual(boston.get(), ['10.0.0.0/24'])
+
+
+class HostGroupResolverTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(1)
+
+    @staticmethod
+    def brute_force(config, address, longest_prefix):
+        address = ipaddress.ip_address(address)
+        best = None
+        for entry in config:
+            network = ipaddress.ip_network(entry['cidr'], strict=False)
+            if network.version != address.version or address not in network:
+                continue
+            if best is None:
+                best = (network.prefixlen, entry['name'])
+                if not longest_prefix:
+                    break
+            elif network.prefixlen > best[0]:
+                best = (network.prefixlen, entry['name'])
+        return None if best is None else best[1]
+
+    def random_address(self, config):
+        if self.rng.random() < 0.5:
+            # an address inside one of the networks
+            network = ipaddress.ip_network(self.rng.choice(config)['cidr'])
+            offset = self.rng.randrange(network.num_addresses)
+            return str(network.network_address + offset)
+        if self.rng.random() < 0.2:
+            return str(ipaddress.IPv6Address(self.rng.getrandbits(16) << 112))
+        return str(ipaddress.IPv4Address((10 << 24) |
+                                         self.rng.getrandbits(24)))
+
+    def test_resolve(self):
+        for longest_prefix in (False, True):
+            for _ in range(10):
+                config = random_config(self.rng, 50)
+                resolver = HostGroupResolver(config, longest_prefix)
+                addresses = [self.random_address(config)
+                             for _ in range(200)]
+                expected = [self.brute_force(config, a, longest_prefix)
+                            for a in addresses]
+                self.assertEqual([resolver.resolve(a) for a in addresses],
+                                 expected)
+                self.assertEqual(list(resolver.resolve_many(addresses)),
+                                 expected)
+
+    def test_resolve_ipv4_integers(self):
+        config = random_config(self.rng, 50)
+        resolver = HostGroupResolver(config)
+        addresses = [self.random_address(config) for _ in range(200)]
+        addresses = [a for a in addresses if ':' not in a]
+        values = [int(ipaddress.IPv4Address(a)) for a in addresses]
+        expected = [self.brute_force(config, a, False) for a in addresses]
+        self.assertEqual(resolver.resolve_many(values), expected)
+        self.assertEqual([resolver.resolve(v) for v in values], expected)
+
+    def test_abbreviated_cidr(self):
+        resolver = HostGroupResolver([{'name': 'sanfran',
+                                       'cidr': '10.99.1/24'}])
+        self.assertEqual(resolver.resolve('10.99.1.20'), 'sanfran')
+        self.assertIsNone(resolver.resolve('10.99.2.20'))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            HostGroupResolver([{'name': 'sanfran', 'cidr': '10.999.1.0/24'}])
+        resolver = HostGroupResolver([])
+        with self.assertRaises(ValueError):
+            resolver.resolve('not an address')
+
+
+class ReadConfigTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def test_csv(self):
+        filename = self.write('groups.csv',
+                              '10.99.1/24,sanfran\n'
+                              '# comment\n'
+                              '\n'
+                              '10.99.2.7/24,boston\n'
+                              '10.99.1.0/24,sanfran\n'
+                              '10.99.1.128/25,sanfran\n'
+                              'bogus,boston\n'
+                              '10.99.3.0/24,bad name\n'
+                              '2001:db8::/32,paris\n')
+        result = read_config(filename)
+        self.assertEqual(result.config,
+                         [{'cidr': '10.99.1.0/24', 'name': 'sanfran'},
+                          {'cidr': '10.99.2.0/24', 'name': 'boston'},
+                          {'cidr': '2001:db8::/32', 'name': 'paris'}])
+        self.assertEqual([line for line, _ in result.errors], [7, 8])
+        self.assertEqual(result.duplicates, 1)
+        self.assertEqual(result.collapsed, 1)
+
+    def test_csv_no_collapse(self):
+        result = read_config(io.StringIO('10.99.1.0/24,sanfran\n'
+                                         '10.99.1.128/25,sanfran\n'),
+                             collapse=False)
+        self.assertEqual([e['cidr'] for e in result.config],
+                         ['10.99.1.0/24', '10.99.1.128/25'])
+
+    def test_csv_header(self):
+        result = read_config(io.StringIO('SiteName;Subnet\n'
+                                         'sanfran;10.99.1.0/24\n'
+                                         'boston;10.99.2.0/24\n'),
+                             format='csv')
+        self.assertEqual(result.config,
+                         [{'cidr': '10.99.1.0/24', 'name': 'sanfran'},
+                          {'cidr': '10.99.2.0/24', 'name': 'boston'}])
+        self.assertEqual(result.errors, [])
+
+    def test_json(self):
+        config = [{'cidr': '10.99.1/24', 'name': 'sanfran'},
+                  {'cidr': '10.99.2.0/24', 'name': 'boston'},
+                  {'cidr': '10.99.2.0/24', 'name': 'boston'},
+                  {'name': 'missing'},
+                  {'cidr': '10.99.3.0/24', 'name': 'newyork'}]
+        filename = self.write('groups.json', json.dumps(config))
+        result = read_config(filename)
+        self.assertEqual(result.config,
+                         [{'cidr': '10.99.1.0/24', 'name': 'sanfran'},
+                          {'cidr': '10.99.2.0/24', 'name': 'boston'},
+                          {'cidr': '10.99.3.0/24', 'name': 'newyork'}])
+        self.assertEqual([line for line, _ in result.errors], [4])
+        self.assertEqual(result.duplicates, 1)
+
+    def test_json_invalid(self):
+        result = read_config(io.BytesIO(b'[{"cidr": "10.99.1.0/24", '
+                                        b'"name": "sanfran"}, {"cidr"'),
+                             format='json')
+        self.assertEqual(len(result.config), 1)
+        self.assertEqual(result.errors, [(2, 'Invalid JSON')])
+
+    def test_csv_json_equivalent(self):
+        rng = random.Random(2)
+        config = random_config(rng, 200)
+        csv_result = read_config(io.StringIO(
+            ''.join('{0},{1}\n'.format(e['cidr'], e['name'])
+                    for e in config)))
+        json_result = read_config(io.BytesIO(json.dumps(config).encode()),
+                                  format='json')
+        self.assertEqual(csv_result.config, json_result.config)
+        self.assertEqual(csv_result.duplicates, json_result.duplicates)
+        self.assertEqual(csv_result.collapsed, json_result.collapsed)
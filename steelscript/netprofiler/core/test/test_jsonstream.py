@@ -0,0 +1,105 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+from steelscript.netprofiler.core._jsonstream import (iter_array,
+                                                      iter_array_member)
+
+import json
+import random
+import unittest
+
+
+def split(data, sizes):
+    """Split `data` into chunks of the given sizes, the rest last."""
+    chunks = []
+    pos = 0
+    for size in sizes:
+        chunks.append(data[pos:pos + size])
+        pos += size
+    chunks.append(data[pos:])
+    return chunks
+
+
+def random_chunks(data, rng):
+    """Split `data` at random boundaries, including empty chunks."""
+    sizes = []
+    left = len(data)
+    while left > 0:
+        size = rng.randint(0, min(left, 7))
+        sizes.append(size)
+        left -= size
+    return split(data, sizes)
+
+
+class JSONStreamTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [[1, 2.5, 'abc', None],
+                     [-10, 1e-05, 'café ☃', True],
+                     [12345678901234, 0.0, 'a "quoted", [bracket]', False],
+                     [{'nested': [1, {'x': '}'}]}, [], {}, '']]
+        self.obj = {'columns': [1, 2, 3],
+                    'data': self.rows,
+                    'totals': [10, 20],
+                    'meta': {'count': 4}}
+
+    def test_array_every_boundary(self):
+        data = json.dumps(self.rows).encode('utf8')
+        for i in range(len(data) + 1):
+            for j in range(i, len(data) + 1):
+                chunks = [data[:i], data[i:j], data[j:]]
+                self.assertEqual(list(iter_array(chunks)), self.rows)
+
+    def test_array_random_boundaries(self):
+        rng = random.Random(0)
+        data = json.dumps(self.rows, indent=2).encode('utf8')
+        for _ in range(200):
+            chunks = random_chunks(data, rng)
+            self.assertEqual(list(iter_array(chunks)), self.rows)
+
+    def test_array_single_bytes(self):
+        data = json.dumps([1234567, 89, 'xy']).encode('utf8')
+        chunks = [data[i:i + 1] for i in range(len(data))]
+        self.assertEqual(list(iter_array(chunks)), [1234567, 89, 'xy'])
+
+    def test_array_empty(self):
+        self.assertEqual(list(iter_array([b' [', b' ] '])), [])
+
+    def test_array_invalid(self):
+        with self.assertRaises(ValueError):
+            list(iter_array([b'[1, 2', b' 3]']))
+        with self.assertRaises(ValueError):
+            list(iter_array([b'[1, 2]', b' 3']))
+        with self.assertRaises(ValueError):
+            list(iter_array([b'[1, 2']))
+
+    def test_member_random_boundaries(self):
+        rng = random.Random(1)
+        data = json.dumps(self.obj).encode('utf8')
+        for _ in range(200):
+            members = {}
+            chunks = random_chunks(data, rng)
+            rows = list(iter_array_member(chunks, 'data', members))
+            self.assertEqual(rows, self.rows)
+            self.assertEqual(members, {'columns': [1, 2, 3],
+                                       'totals': [10, 20],
+                                       'meta': {'count': 4}})
+
+    def test_member_missing(self):
+        members = {}
+        data = json.dumps({'totals': [1]}).encode('utf8')
+        self.assertEqual(list(iter_array_member([data], 'data', members)),
+                         [])
+        self.assertEqual(members, {'totals': [1]})
+        self.assertEqual(list(iter_array_member([b'{}'], 'data')), [])
+
+    def test_member_not_array(self):
+        members = {}
+        data = json.dumps({'data': 'text', 'x': 1}).encode('utf8')
+        self.assertEqual(list(iter_array_member([data], 'data', members)),
+                         [])
+        self.assertEqual(members, {'data': 'text', 'x': 1})
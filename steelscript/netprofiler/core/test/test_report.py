@@ -0,0 +1,293 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+from steelscript.netprofiler.core.report import (Query, PollBackoff,
+                                                 ChunkPolicy, ReportBatch,
+                                                 TrafficSummaryReport)
+from steelscript.netprofiler.core._types import Column
+from steelscript.netprofiler.core.filters import TimeFilter
+from steelscript.common.timeutils import datetime_to_seconds
+
+import random
+import datetime
+import unittest
+
+
+class PollBackoffTests(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+
+    def test_growth(self):
+        backoff = PollBackoff(initial=0.5, maximum=4, factor=2, jitter=0)
+        self.assertEqual([backoff.next_delay() for _ in range(6)],
+                         [0.5, 1, 2, 4, 4, 4])
+        backoff.reset()
+        self.assertEqual(backoff.next_delay(), 0.5)
+
+    def test_remaining_seconds(self):
+        backoff = PollBackoff(initial=0.5, maximum=10, jitter=0)
+        self.assertEqual(backoff.next_delay({'remaining_seconds': 3}), 3)
+        # the estimate is capped at the maximum delay
+        self.assertEqual(backoff.next_delay({'remaining_seconds': 60}), 10)
+        self.assertEqual(backoff.next_delay({'remaining_seconds': 0}),
+                         0.5 * 1.5 * 1.5)
+
+    def test_jitter_bounds(self):
+        backoff = PollBackoff(initial=1, maximum=1, jitter=0.25)
+        delays = [backoff.next_delay() for _ in range(1000)]
+        self.assertTrue(all(0.75 <= d <= 1.25 for d in delays))
+        # delays are actually spread out
+        self.assertLess(min(delays), 0.8)
+        self.assertGreater(max(delays), 1.2)
+
+    def test_deadline(self):
+        # the total wait of a run of polls follows the capped schedule
+        backoff = PollBackoff(initial=0.2, maximum=10, factor=1.5,
+                              jitter=0.1)
+        expected = 0.0
+        delay = 0.2
+        total = 0.0
+        for _ in range(30):
+            d = backoff.next_delay()
+            self.assertLessEqual(d, 10 * 1.1)
+            total += d
+            expected += delay
+            delay = min(delay * 1.5, 10)
+        self.assertGreaterEqual(total, expected * 0.9)
+        self.assertLessEqual(total, expected * 1.1)
+
+
+class ChunkPolicyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base = datetime.datetime(2024, 1, 1,
+                                      tzinfo=datetime.timezone.utc)
+
+    def timefilter(self, start, end):
+        return TimeFilter(self.base + datetime.timedelta(seconds=start),
+                          self.base + datetime.timedelta(seconds=end))
+
+    def seconds(self, timefilters):
+        base = datetime_to_seconds(self.base)
+        return [(datetime_to_seconds(tf.start) - base,
+                 datetime_to_seconds(tf.end) - base) for tf in timefilters]
+
+    def test_split(self):
+        policy = ChunkPolicy('1 hour')
+        self.assertEqual(
+            self.seconds(policy.split(self.timefilter(0, 3 * 3600))),
+            [(0, 3600), (3600, 7200), (7200, 10800)])
+
+    def test_split_partial(self):
+        policy = ChunkPolicy('1 hour')
+        # rounded down to whole minutes, the last chunk is shorter
+        self.assertEqual(
+            self.seconds(policy.split(self.timefilter(30, 7000))),
+            [(0, 3600), (3600, 6960)])
+
+    def test_split_resolution(self):
+        # chunks are whole numbers of the step
+        policy = ChunkPolicy('100 min')
+        self.assertEqual(
+            self.seconds(policy.split(self.timefilter(0, 4 * 3600), 3600)),
+            [(0, 3600), (3600, 7200), (7200, 10800), (10800, 14400)])
+
+    def test_split_short(self):
+        policy = ChunkPolicy('1 day')
+        self.assertEqual(
+            self.seconds(policy.split(self.timefilter(70, 100))),
+            [(60, 120)])
+
+    def test_split_covers_range(self):
+        policy = ChunkPolicy('7 min')
+        chunks = self.seconds(policy.split(self.timefilter(0, 86400)))
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], 86400)
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ChunkPolicy(datetime.timedelta(0))
+        with self.assertRaises(ValueError):
+            ChunkPolicy('1 hour', max_workers=0)
+
+
+COLUMNS = [{'id': 5, 'strid': 'ID_HOST_IP', 'name': 'Host IP',
+            'category': 'key', 'type': 'ipaddr', 'rate': '',
+            'available': True},
+           {'id': 33, 'strid': 'ID_AVG_BYTES', 'name': 'Avg Bytes',
+            'category': 'data', 'type': 'float', 'rate': 'opt',
+            'available': True},
+           {'id': 280, 'strid': 'ID_NETWORK_RTT', 'name': 'Network RTT',
+            'category': 'data', 'type': 'int', 'rate': '',
+            'available': True}]
+
+
+class ShufflingAppliance(object):
+    """Returns the query rows in a different order on every request."""
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.requests = []
+        self.rng = random.Random(0)
+
+    def queries(self, report_id, query_id, params=None):
+        ids = [int(i) for i in params['columns'].split(',')]
+        self.requests.append(ids)
+        rows = []
+        for i, host in enumerate(self.hosts):
+            values = {5: host, 33: '%d.5' % i, 280: str(i)}
+            rows.append([values[cid] for cid in ids])
+        self.rng.shuffle(rows)
+        return {'data': rows, 'totals': [''] * len(ids)}
+
+
+class FakeProfiler(object):
+
+    def __init__(self, appliance):
+        self.api = self
+        self.report = appliance
+
+    def get_columns(self, columns, groupby=None, strict=True):
+        return [Column.from_json(col) for col in columns]
+
+
+class FakeQueryReport(object):
+
+    def __init__(self, appliance):
+        self.profiler = FakeProfiler(appliance)
+        self.strict_columns = True
+        self.id = 1
+
+    def _cached_querydata(self, query, params):
+        return None
+
+    def _cache_querydata(self, query, params, querydata):
+        pass
+
+    def _phase_fields(self):
+        return {}
+
+
+class QueryColumnStoreTests(unittest.TestCase):
+
+    def make_query(self, hosts):
+        self.appliance = ShufflingAppliance(hosts)
+        query = Query(FakeQueryReport(self.appliance),
+                      {'id': 'q1', 'actual_t0': 0, 'actual_t1': 60,
+                       'group_by': 'hos', 'columns': COLUMNS}, None)
+        self.host_ip, self.avg_bytes, self.rtt = query.available_columns
+        return query
+
+    def expected(self, hosts):
+        return dict((host, (float('%d.5' % i), i))
+                    for i, host in enumerate(hosts))
+
+    def test_rows_joined_on_keys(self):
+        hosts = ['10.0.0.%d' % i for i in range(50)]
+        query = self.make_query(hosts)
+        query.get_data(columns=[self.host_ip, self.avg_bytes])
+        rows = query.get_data(columns=[self.rtt, self.avg_bytes,
+                                       self.host_ip])
+
+        expected = self.expected(hosts)
+        self.assertEqual(len(rows), len(hosts))
+        for rtt, avg_bytes, host in rows:
+            self.assertEqual((avg_bytes, rtt), expected[host])
+        # only the new column was retrieved, along with the key column
+        self.assertEqual(self.appliance.requests, [[5, 33], [280, 5]])
+
+    def test_changed_rows_fetch_selection(self):
+        hosts = ['10.0.0.%d' % i for i in range(20)]
+        query = self.make_query(hosts)
+        query.get_data(columns=[self.avg_bytes])
+        self.appliance.hosts = hosts[:10] + ['10.0.1.%d' % i
+                                             for i in range(10)]
+        rows = query.get_data(columns=[self.host_ip, self.avg_bytes,
+                                       self.rtt])
+
+        expected = self.expected(self.appliance.hosts)
+        for host, avg_bytes, rtt in rows:
+            self.assertEqual((avg_bytes, rtt), expected[host])
+        self.assertEqual(self.appliance.requests,
+                         [[33, 5], [280, 5], [5, 33, 280]])
+
+
+class RowDecoderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.legend = [Column.from_json(col) for col in COLUMNS]
+
+    def test_decode(self):
+        decode = Query._row_decoder(self.legend)
+        self.assertEqual(decode(['10.0.0.1', '1.5', '7']),
+                         ['10.0.0.1', 1.5, 7])
+        # values that do not convert are kept as returned
+        self.assertEqual(decode(['10.0.0.1', '1.5', '123:10']),
+                         ['10.0.0.1', 1.5, '123:10'])
+
+    def test_short_row(self):
+        decode = Query._row_decoder(self.legend)
+        self.assertEqual(decode(['10.0.0.1', '1.5']), ['10.0.0.1', 1.5])
+        self.assertEqual(decode([]), [])
+
+
+class InvalidColumnsProfiler(object):
+    """Rejects every column, so reports fail before being created."""
+    def get_columns(self, columns, *args, **kwargs):
+        raise ValueError('Invalid column: %s' % columns)
+
+
+class FakeReport(object):
+    """Report completing after `polls` status checks."""
+    def __init__(self, report_id, polls=1):
+        self.report_id = report_id
+        self.polls = polls
+        self.deleted = False
+
+    def run(self, sync=True):
+        self.id = self.report_id
+
+    def status(self):
+        self.polls -= 1
+        if self.polls > 0:
+            return {'status': 'running', 'percent': 50,
+                    'remaining_seconds': 0}
+        return {'status': 'completed', 'percent': 100}
+
+    def delete(self):
+        self.deleted = True
+
+
+class ReportBatchTests(unittest.TestCase):
+
+    def test_fail_before_created(self):
+        batch = ReportBatch(max_concurrent=2,
+                            backoff=PollBackoff(initial=0, jitter=0))
+        first = FakeReport(1, polls=2)
+        invalid = TrafficSummaryReport(InvalidColumnsProfiler())
+        last = FakeReport(2)
+        futures = [batch.add(first),
+                   batch.add(invalid, groupby='hos', columns=['bogus']),
+                   batch.add(last)]
+        batch.run()
+
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertIs(futures[0].result(), first)
+        self.assertIsInstance(futures[1].exception(), ValueError)
+        self.assertIsNone(invalid.id)
+        self.assertIs(futures[2].result(), last)
+
+    def test_fail_deletes(self):
+        batch = ReportBatch(timeout=0,
+                            backoff=PollBackoff(initial=0, jitter=0))
+        report = FakeReport(1, polls=10)
+        future = batch.add(report)
+        batch.run()
+        self.assertIsInstance(future.exception(), Exception)
+        self.assertTrue(report.deleted)
@@ -0,0 +1,99 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+from steelscript.netprofiler.core.resultcache import (ResultCache,
+                                                      MemoryResultCache,
+                                                      FileResultCache)
+
+import shutil
+import tempfile
+import unittest
+
+
+def report(start=3600, end=7200, resolution=None, expr='host 10.0.0.1',
+           columns=(5, 33)):
+    time_frame = {'start': start, 'end': end}
+    if resolution is not None:
+        time_frame['resolution'] = resolution
+    return {'template_id': 184,
+            'criteria': {'time_frame': time_frame,
+                         'traffic_expression': expr,
+                         'query': {'realm': 'traffic_summary',
+                                   'group_by': 'hos',
+                                   'columns': list(columns)}}}
+
+
+class MakeKeyTests(unittest.TestCase):
+
+    def key(self, to_post, host='np1', port=443):
+        return ResultCache.make_key(to_post, host, port)
+
+    def test_same_criteria(self):
+        self.assertEqual(self.key(report()), self.key(report()))
+
+    def test_hosts(self):
+        self.assertNotEqual(self.key(report(), host='np1'),
+                            self.key(report(), host='np2'))
+        self.assertNotEqual(self.key(report(), port=443),
+                            self.key(report(), port=8443))
+
+    def test_time_frame_rounding(self):
+        self.assertEqual(self.key(report(3600, 7200)),
+                         self.key(report(3610, 7259)))
+        self.assertNotEqual(self.key(report(3600, 7200)),
+                            self.key(report(3600, 7260)))
+        self.assertEqual(self.key(report(3600, 7200, 'hour')),
+                         self.key(report(3600, 10799, 'hour')))
+
+    def test_traffic_expression(self):
+        self.assertEqual(self.key(report(expr='host 10.0.0.1')),
+                         self.key(report(expr=' host 10.0.0.1 ')))
+        self.assertNotEqual(self.key(report(expr='host 10.0.0.1')),
+                            self.key(report(expr='host 10.0.0.2')))
+
+    def test_columns(self):
+        self.assertNotEqual(self.key(report(columns=(5, 33))),
+                            self.key(report(columns=(33, 5))))
+
+    def test_cacheable(self):
+        self.assertTrue(ResultCache.cacheable(report(end=7200), now=7260))
+        self.assertFalse(ResultCache.cacheable(report(end=7200), now=7259))
+        self.assertFalse(ResultCache.cacheable(
+            report(end=7200, resolution='hour'), now=7260))
+        self.assertFalse(ResultCache.cacheable({'criteria': {}}))
+
+
+class ResultCacheTests(unittest.TestCase):
+
+    def check_cache(self, cache):
+        entry = {'id': 1, 'queries': [], 'data': []}
+        cache.put('a', entry)
+        cache.put('b', dict(entry, id=2))
+        self.assertEqual(cache.get('a'), entry)
+        cache.put('c', dict(entry, id=3))
+        # the least recently used entry is evicted
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c')['id'], 3)
+        cache.remove('a')
+        self.assertIsNone(cache.get('a'))
+        cache.clear()
+        self.assertIsNone(cache.get('c'))
+
+    def test_memory(self):
+        self.check_cache(MemoryResultCache(maxsize=2))
+
+    def test_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.check_cache(FileResultCache(directory, maxsize=2))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_ttl(self):
+        cache = MemoryResultCache(ttl=-1)
+        cache.put('a', {'id': 1})
+        self.assertIsNone(cache.get('a'))
@@ -0,0 +1,74 @@
+# Copyright (c) 2019 Riverbed Technology, Inc.
+#
+# This software is licensed under the terms and conditions of the MIT License
+# accompanying the software ("License").  This software is distributed "AS IS"
+# as set forth in the License.
+
+
+from steelscript.netprofiler.core import NetProfiler
+from steelscript.netprofiler.core.sessioncache import SessionCache
+from steelscript.common.connection import Connection
+from steelscript.common.service import UserAuth
+
+import base64
+import shutil
+import tempfile
+import unittest
+
+
+class SaveSessionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SessionCache(self.directory)
+        self.auth = UserAuth('admin', 'secret')
+
+        # a NetProfiler that is connected, without talking to one
+        self.profiler = NetProfiler.__new__(NetProfiler)
+        self.profiler.host = 'np1.example.com'
+        self.profiler.conn = Connection(self.profiler.host)
+        self.profiler.supported_versions = None
+        self.profiler._session_cache = self.cache
+        self.profiler._session_key = self.cache.make_key(
+            'profiler', self.profiler.host, 443, self.auth)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def stored_files(self):
+        res = []
+        for filename in self.cache._files():
+            with open(filename) as f:
+                res.append(f.read())
+        return res
+
+    def test_basic_auth_not_cached(self):
+        credentials = base64.b64encode(b'admin:secret').decode()
+        self.profiler.conn.conn.headers['Authorization'] = (
+            'Basic ' + credentials)
+        self.profiler.conn.conn.cookies.set('session', 'abc')
+        self.profiler._save_session()
+
+        self.assertIsNone(self.cache.get(self.profiler._session_key))
+        for text in self.stored_files():
+            self.assertNotIn(credentials, text)
+            self.assertNotIn('secret', text)
+
+    def test_basic_auth_replaces_entry(self):
+        self.cache.put(self.profiler._session_key,
+                       {'headers': {}, 'cookies': {}, 'basic': False,
+                        'supported_versions': None})
+        self.profiler.conn.conn.headers['Authorization'] = 'basic eA=='
+        self.profiler._save_session()
+        self.assertIsNone(self.cache.get(self.profiler._session_key))
+
+    def test_token_cached(self):
+        self.profiler.conn.conn.headers['Authorization'] = 'Bearer token'
+        self.profiler.conn.conn.cookies.set('session', 'abc')
+        self.profiler._save_session()
+
+        entry = self.cache.get(self.profiler._session_key)
+        self.assertEqual(entry['headers'], {'Authorization': 'Bearer token'})
+        self.assertEqual(entry['cookies'], {'session': 'abc'})
+        for text in self.stored_files():
+            self.assertNotIn('secret', text)